@@ -0,0 +1,118 @@
+"""Two-tier cache of symptom analyses: an in-process LRU in front of MongoDB.
+
+Many users describe the same thing ("headache and fever, 2 days, moderate"),
+so the LLM answer is cached under a key built from the normalized request
+(case, whitespace and the order of the listed symptoms do not matter) plus
+the model name and prompt version. The Mongo tier is shared by every worker
+and expires entries with a TTL index; the LRU tier saves the round trip for
+the hottest keys.
+"""
+import hashlib
+import json
+import logging
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+TERM_SPLIT_RE = re.compile(r"\s*(?:[,;/+&\n]|\band\b|\bwith\b)\s*")
+PUNCTUATION_RE = re.compile(r"[^\w\s'-]")
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: Optional[str]) -> str:
+    if not text:
+        return ""
+    return WHITESPACE_RE.sub(" ", PUNCTUATION_RE.sub(" ", text.lower())).strip()
+
+
+def normalize_symptoms(symptoms: str) -> str:
+    """Lower-cased, de-duplicated, sorted list of the symptoms mentioned."""
+    terms = {normalize_text(term) for term in TERM_SPLIT_RE.split(symptoms.lower())}
+    return ", ".join(sorted(term for term in terms if term))
+
+
+def analysis_key(symptoms: str, duration: Optional[str], severity: Optional[str], model: str, prompt_version: str) -> str:
+    normalized = {
+        "symptoms": normalize_symptoms(symptoms),
+        "duration": normalize_text(duration),
+        "severity": normalize_text(severity),
+        "model": model,
+        "prompt": prompt_version,
+    }
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class AnalysisCache:
+    def __init__(self, collection, ttl: timedelta = timedelta(days=7),
+                 memory_size: int = 1000, memory_ttl: float = 3600.0, report_every: int = 1000):
+        self.collection = collection
+        self.ttl = ttl
+        self.memory = TTLCache(maxsize=memory_size, ttl=memory_ttl)
+        self.report_every = report_every
+        self.memory_hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    async def get(self, key: str) -> Optional[str]:
+        analysis = self.memory.get(key)
+        if analysis is not None:
+            self.memory_hits += 1
+            self._maybe_report()
+            return analysis
+
+        now = datetime.now(timezone.utc)
+        # The TTL monitor only runs once a minute, so filter on expiry as well
+        doc = await self.collection.find_one({"_id": key, "expires_at": {"$gt": now}}, {"analysis": 1, "expires_at": 1})
+        if doc is None:
+            self.misses += 1
+            self._maybe_report()
+            return None
+
+        self.store_hits += 1
+        self.memory.set(key, doc["analysis"], ttl=(doc["expires_at"] - now).total_seconds())
+        self._maybe_report()
+        return doc["analysis"]
+
+    async def set(self, key: str, analysis: str, model: str) -> None:
+        if not analysis:
+            return
+        now = datetime.now(timezone.utc)
+        self.memory.set(key, analysis, ttl=self.ttl.total_seconds())
+        await self.collection.update_one(
+            {"_id": key},
+            {"$set": {"analysis": analysis, "model": model, "created_at": now, "expires_at": now + self.ttl}},
+            upsert=True,
+        )
+
+    def bypass(self) -> None:
+        self.bypassed += 1
+
+    def _maybe_report(self):
+        lookups = self.memory_hits + self.store_hits + self.misses
+        if self.report_every and lookups % self.report_every == 0:
+            stats = self.stats()
+            logger.info("Symptom analysis cache: %d lookups, hit ratio %.1f%% (memory %.1f%%, mongo %.1f%%)",
+                        lookups, stats["hit_ratio"] * 100, stats["memory_hit_ratio"] * 100, stats["store_hit_ratio"] * 100)
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.store_hits + self.misses
+
+        def ratio(n: int) -> float:
+            return n / lookups if lookups else 0.0
+
+        return {
+            "lookups": lookups,
+            "memory_hits": self.memory_hits,
+            "store_hits": self.store_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_ratio": ratio(self.memory_hits + self.store_hits),
+            "memory_hit_ratio": ratio(self.memory_hits),
+            "store_hit_ratio": ratio(self.store_hits),
+            "memory_size": len(self.memory),
+        }
@@ -0,0 +1,421 @@
+"""Retention tiers for chat and symptom history.
+
+Hot documents stay in chat_messages and symptom_reports. With
+ARCHIVE_AFTER_DAYS set, a background compactor moves those older than that
+into ``history_archive``. Each archive document holds one user's documents
+for one collection and month, at most ``docs_per_archive`` per part. They
+are stored as one BSON array compressed with gzip or zstd. The hot
+collections, and their indexes, then hold only recent history, and a
+month of old messages costs one document and a few index keys.
+
+Archived documents stay readable:
+
+- the history routes merge them into their pages with ``?archived=true``
+  (``merge_page``);
+- /api/export always includes them (``iter_docs``).
+
+Both read archive parts in (created_at, id) order and decompress one at a
+time. Full-text search only covers the hot collections.
+
+Each month is moved in chunks. A chunk is written to its archive part
+first, and only then deleted from the hot collection. A crash in between
+leaves documents in both places. The next pass archives them again, and
+readers drop duplicate ids. Parts are replaced with a version check, and
+passes hold a lease in the ``leases`` collection, so two workers never
+overwrite each other's parts.
+
+With ARCHIVE_EXPIRE_DAYS, each part gets an ``expires_at`` that long after
+the end of its month, and the TTL index deletes it: the last tier.
+
+    python archive.py            # run one pass now and print what it saved
+"""
+import asyncio
+import gzip
+import logging
+import os
+import sys
+import time
+import uuid
+from contextlib import aclosing
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+import bson
+from bson.codec_options import CodecOptions
+from pymongo.errors import DuplicateKeyError
+
+from pagination import after_position, decode_cursor, encode_cursor
+from storage import to_utc
+
+logger = logging.getLogger(__name__)
+
+ARCHIVED_COLLECTIONS = ("chat_messages", "symptom_reports")
+LEASE_ID = "history_archive"
+_DECODE_OPTIONS = CodecOptions(tz_aware=True)
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return _zstandard().ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        zstandard = _zstandard()
+        if zstandard is None:
+            raise RuntimeError("This archive is zstd-compressed; install zstandard to read it")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def month_start(when: datetime) -> datetime:
+    when = when.astimezone(timezone.utc)
+    return datetime(when.year, when.month, 1, tzinfo=timezone.utc)
+
+
+def next_month(start: datetime) -> datetime:
+    return datetime(start.year + start.month // 12, start.month % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def _key(doc: dict) -> Tuple[datetime, str]:
+    return doc["created_at"], doc["id"]
+
+
+class ArchiveConflict(Exception):
+    """Another writer changed the archive part first."""
+
+
+class HistoryArchive:
+    def __init__(self, db, older_than: timedelta = timedelta(days=365), codec: str = "gzip",
+                 docs_per_archive: int = 2000, interval: float = 3600.0,
+                 expire_after: Optional[timedelta] = None, scan_size: int = 1000, enabled: bool = True):
+        if codec not in ("gzip", "zstd"):
+            raise ValueError(f"Unknown archive codec {codec!r}")
+        if codec == "zstd" and _zstandard() is None:
+            logger.warning("ARCHIVE_CODEC=zstd needs the zstandard package; compressing with gzip")
+            codec = "gzip"
+        self.db = db
+        self.collection = db.history_archive
+        self.leases = db.leases
+        self.older_than = older_than
+        self.codec = codec
+        self.docs_per_archive = docs_per_archive
+        self.interval = interval
+        self.expire_after = expire_after
+        self.scan_size = scan_size
+        self.enabled = enabled
+        self.worker_id = uuid.uuid4().hex
+        self._listeners: List[Callable[[str, List[dict]], Awaitable[None]]] = []
+        self._task: Optional[asyncio.Task] = None
+        self.passes = 0
+        self.failed_passes = 0
+        self.conflicts = 0
+        self.archived_documents = 0
+        self.hot_bytes_freed = 0
+        self.archive_bytes_written = 0
+        self.last_pass_seconds = 0.0
+
+    @classmethod
+    def from_env(cls, db) -> "HistoryArchive":
+        after_days = float(os.environ.get('ARCHIVE_AFTER_DAYS', '0'))
+        expire_days = float(os.environ.get('ARCHIVE_EXPIRE_DAYS', '0'))
+        return cls(
+            db,
+            older_than=timedelta(days=after_days or 365),
+            codec=os.environ.get('ARCHIVE_CODEC', 'gzip').lower(),
+            docs_per_archive=int(os.environ.get('ARCHIVE_DOCS_PER_PART', '2000')),
+            interval=float(os.environ.get('ARCHIVE_INTERVAL', '3600')),
+            expire_after=timedelta(days=expire_days) if expire_days > 0 else None,
+            enabled=after_days > 0,
+        )
+
+    def subscribe(self, listener: Callable[[str, List[dict]], Awaitable[None]]):
+        """Register an async callback that receives (collection, documents) once they left the hot collection."""
+        self._listeners.append(listener)
+
+    def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run(), name="history-archive")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                if await self._acquire_lease():
+                    await self.compact()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.failed_passes += 1
+                logger.exception("History archive pass failed")
+            await asyncio.sleep(self.interval)
+
+    async def _acquire_lease(self) -> bool:
+        """Hold the compactor lease for one interval; False while another worker holds it."""
+        now = datetime.now(timezone.utc)
+        try:
+            await self.leases.update_one(
+                {"_id": LEASE_ID, "$or": [{"until": {"$lt": now}}, {"owner": self.worker_id}]},
+                {"$set": {"owner": self.worker_id, "until": now + timedelta(seconds=self.interval)}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            return False
+        return True
+
+    async def compact(self) -> dict:
+        """Move every document older than ``older_than`` into the archive; returns what this pass saved."""
+        started = time.perf_counter()
+        cutoff = datetime.now(timezone.utc) - self.older_than
+        report = {"documents": 0, "months": 0, "hot_bytes": 0, "archive_bytes": 0, "conflicts": 0}
+        for collection in ARCHIVED_COLLECTIONS:
+            done, position = set(), None
+            while True:
+                # Scans on after the last document seen, past months skipped after a conflict
+                query = {"created_at": {"$lt": cutoff}}
+                if position is not None:
+                    query = after_position(query, "created_at", 1, *position)
+                oldest = await self.db[collection] \
+                    .find(query, {"_id": 0, "user_id": 1, "created_at": 1, "id": 1}) \
+                    .sort([("created_at", 1), ("id", 1)]) \
+                    .limit(self.scan_size) \
+                    .to_list(self.scan_size)
+                if not oldest:
+                    break
+                position = oldest[-1]["created_at"], oldest[-1]["id"]
+                months = {(doc["user_id"], month_start(doc["created_at"])) for doc in oldest} - done
+                for user_id, month in sorted(months, key=lambda item: (item[1], item[0])):
+                    done.add((user_id, month))
+                    try:
+                        await self._archive_month(collection, user_id, month, cutoff, report)
+                    except ArchiveConflict:
+                        self.conflicts += 1
+                        report["conflicts"] += 1  # the next pass picks the month up again
+                    report["months"] += 1
+
+        self.passes += 1
+        self.last_pass_seconds = time.perf_counter() - started
+        if report["documents"]:
+            logger.info(
+                "Archived %d documents from %d user-months: %.1f MiB of hot documents in %.1f MiB of archive",
+                report["documents"], report["months"], report["hot_bytes"] / 2**20, report["archive_bytes"] / 2**20,
+            )
+        return report
+
+    async def _archive_month(self, collection: str, user_id: str, month: datetime, cutoff: datetime, report: dict):
+        query = {"user_id": user_id, "created_at": {"$gte": month, "$lt": min(next_month(month), cutoff)}}
+        while True:
+            docs = await self.db[collection].find(query, {"_id": 0}) \
+                .sort([("created_at", 1), ("id", 1)]) \
+                .limit(self.docs_per_archive) \
+                .to_list(self.docs_per_archive)
+            if not docs:
+                return
+            archive_bytes = await self._store(collection, user_id, month, docs)
+            await self.db[collection].delete_many({"user_id": user_id, "id": {"$in": [doc["id"] for doc in docs]}})
+
+            hot_bytes = sum(len(bson.encode(doc)) for doc in docs)
+            report["documents"] += len(docs)
+            report["hot_bytes"] += hot_bytes
+            report["archive_bytes"] += archive_bytes
+            self.archived_documents += len(docs)
+            self.hot_bytes_freed += hot_bytes
+            self.archive_bytes_written += archive_bytes
+            for listener in self._listeners:
+                try:
+                    await listener(collection, docs)
+                except Exception:
+                    logger.exception("History archive listener failed for %s", collection)
+
+    async def _store(self, collection: str, user_id: str, month: datetime, docs: List[dict]) -> int:
+        """Add ``docs`` to the month's last part, or start a new one; returns the archive bytes added."""
+        label = f"{month:%Y-%m}"
+        latest = await self.collection.find_one(
+            {"user_id": user_id, "collection": collection, "month": label}, sort=[("part", -1)],
+        )
+        if latest is not None and latest["count"] + len(docs) <= self.docs_per_archive:
+            merged = {doc["id"]: doc for doc in self.unpack(latest)}
+            part, version, previous_bytes = latest["part"], latest["version"], len(latest["data"])
+        else:
+            merged = {}
+            part, version, previous_bytes = (latest["part"] + 1 if latest else 0), None, 0
+        merged.update((doc["id"], doc) for doc in docs)
+        ordered = sorted(merged.values(), key=_key)
+
+        raw = bson.encode({"docs": ordered})
+        data = compress(raw, self.codec)
+        part_doc = {
+            "_id": f"{collection}:{user_id}:{label}:{part}",
+            "user_id": user_id,
+            "collection": collection,
+            "month": label,
+            "part": part,
+            "first": ordered[0]["created_at"],
+            "last": ordered[-1]["created_at"],
+            "count": len(ordered),
+            "codec": self.codec,
+            "data": bson.Binary(data),
+            "raw_bytes": len(raw),
+            "version": (version or 0) + 1,
+            "updated_at": datetime.now(timezone.utc),
+        }
+        if collection == "chat_messages":
+            part_doc["session_ids"] = sorted({doc["session_id"] for doc in ordered})
+        if self.expire_after is not None:
+            part_doc["expires_at"] = next_month(month) + self.expire_after
+
+        try:
+            if version is None:
+                await self.collection.insert_one(part_doc)
+            else:
+                result = await self.collection.replace_one({"_id": part_doc["_id"], "version": version}, part_doc)
+                if result.matched_count == 0:
+                    raise ArchiveConflict(part_doc["_id"])
+        except DuplicateKeyError:
+            raise ArchiveConflict(part_doc["_id"])
+        return len(data) - previous_bytes
+
+    @staticmethod
+    def unpack(part_doc: dict) -> List[dict]:
+        return bson.decode(decompress(part_doc["data"], part_doc["codec"]), codec_options=_DECODE_OPTIONS)["docs"]
+
+    async def iter_docs(self, user_id: str, collection: str, direction: int = 1,
+                        after: Optional[Tuple[datetime, str]] = None,
+                        session_id: Optional[str] = None) -> AsyncIterator[dict]:
+        """The user's archived documents in (created_at, id) order (``direction`` 1 or -1), after ``after``."""
+        ascending = direction == 1
+        edge = "first" if ascending else "last"
+        query = {"user_id": user_id, "collection": collection}
+        if session_id:
+            query["session_ids"] = session_id
+        if after is not None:
+            after = (to_utc(after[0]), after[1])
+            query["last" if ascending else "first"] = {"$gte" if ascending else "$lte": after[0]}
+
+        def is_next(doc: dict, bound) -> bool:
+            return _key(doc) > bound if ascending else _key(doc) < bound
+
+        # Parts of one month can overlap after a crash, so a document is only
+        # final once the next part starts strictly after it
+        buffer: List[dict] = []
+        previous = None
+        cursor = self.collection.find(query).sort(edge, direction)
+        try:
+            async for part_doc in cursor:
+                while buffer and (buffer[0]["created_at"] < part_doc[edge] if ascending
+                                  else buffer[0]["created_at"] > part_doc[edge]):
+                    doc = buffer.pop(0)
+                    if previous is None or is_next(doc, previous):
+                        previous = _key(doc)
+                        yield doc
+                for doc in self.unpack(part_doc):
+                    if session_id and doc.get("session_id") != session_id:
+                        continue
+                    if after is None or is_next(doc, after):
+                        buffer.append(doc)
+                buffer.sort(key=_key, reverse=not ascending)
+        finally:
+            await cursor.close()
+        for doc in buffer:
+            if previous is None or is_next(doc, previous):
+                previous = _key(doc)
+                yield doc
+
+    async def merge_page(self, hot_docs: List[dict], hot_next: Optional[str], user_id: str, collection: str,
+                         direction: int, cursor: Optional[str], limit: int,
+                         session_id: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+        """One page of hot and archived documents together, from a hot ``keyset_page`` of the same request."""
+        after = decode_cursor(cursor, (datetime,)) if cursor else None
+        archived = []
+        async with aclosing(self.iter_docs(user_id, collection, direction, after, session_id)) as docs:
+            async for doc in docs:
+                archived.append(doc)
+                if len(archived) > limit:
+                    break
+        if not archived:
+            return hot_docs, hot_next
+
+        # A document caught between archive write and hot delete is in both
+        merged = {doc["id"]: doc for doc in archived}
+        merged.update((doc["id"], doc) for doc in hot_docs)
+        docs = sorted(merged.values(), key=_key, reverse=direction == -1)
+        next_cursor = None
+        if hot_next is not None or len(docs) > limit:
+            docs = docs[:limit]
+            next_cursor = encode_cursor(docs[-1]["created_at"], docs[-1]["id"])
+        return docs, next_cursor
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "codec": self.codec,
+            "passes": self.passes,
+            "failed_passes": self.failed_passes,
+            "conflicts": self.conflicts,
+            "archived_documents": self.archived_documents,
+            "hot_bytes_freed": self.hot_bytes_freed,
+            "archive_bytes_written": self.archive_bytes_written,
+            "compression_ratio": round(self.hot_bytes_freed / self.archive_bytes_written, 2)
+            if self.archive_bytes_written > 0 else None,
+            "last_pass_seconds": round(self.last_pass_seconds, 3),
+        }
+
+
+async def _collection_sizes(db) -> dict:
+    sizes = {}
+    for name in (*ARCHIVED_COLLECTIONS, "history_archive"):
+        try:
+            result = await db.command("collStats", name)
+        except Exception:
+            continue  # not supported by every server (or by mongomock)
+        sizes[name] = (result.get("size", 0), result.get("storageSize", 0), result.get("totalIndexSize", 0))
+    return sizes
+
+
+async def _main() -> int:
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from pathlib import Path
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True)
+    db = client[os.environ['DB_NAME']]
+    archive = HistoryArchive.from_env(db)
+    if not archive.enabled:
+        print("Set ARCHIVE_AFTER_DAYS to the age at which history is archived")
+        return 2
+    try:
+        before = await _collection_sizes(db)
+        report = await archive.compact()
+        after = await _collection_sizes(db)
+    finally:
+        client.close()
+
+    print(f"archived {report['documents']} documents from {report['months']} user-months "
+          f"({report['conflicts']} skipped after conflicts)")
+    print(f"hot documents: {report['hot_bytes'] / 2**20:.2f} MiB -> archive: {report['archive_bytes'] / 2**20:.2f} MiB")
+    for name, (size, storage, indexes) in after.items():
+        old_size, old_storage, old_indexes = before.get(name, (0, 0, 0))
+        print(f"{name}: data {old_size / 2**20:.2f} -> {size / 2**20:.2f} MiB, "
+              f"indexes {old_indexes / 2**20:.2f} -> {indexes / 2**20:.2f} MiB "
+              f"(storage is reused by later writes, not returned to the OS)")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    sys.exit(asyncio.run(_main()))
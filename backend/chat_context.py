@@ -0,0 +1,229 @@
+"""Token-budgeted conversation context for chat sessions.
+
+Each chat turn is sent with as many of the session's recent turns as fit in
+``budget`` tokens (counted with tiktoken). When the unsummarized history
+outgrows the budget, the oldest turns are folded into a rolling summary by
+the model, in the background, and the summary is persisted in
+``chat_sessions`` so it survives restarts and is shared by every worker.
+
+Assembled contexts are cached per session in memory. A new turn only reads
+the messages written since the cached state (normally none, or the few a
+different worker stored), so the history is never re-read or re-tokenized.
+"""
+import asyncio
+import logging
+from functools import lru_cache
+from typing import List, NamedTuple, Optional
+
+import tiktoken
+from pymongo.errors import DuplicateKeyError
+
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Per-message framing tokens in the chat format, and the priming of the reply
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_PRIMING_TOKENS = 3
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You maintain a running summary of a conversation between a user and an AI health assistant. "
+    "Merge the new turns into the existing summary. Keep symptoms, conditions, medications, "
+    "measurements, dates and advice already given; drop small talk. Reply with the updated summary "
+    "only, in at most {words} words."
+)
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # The BPE file is downloaded on first use; fall back to an estimate when offline
+        logger.warning("tiktoken encoding for %s unavailable (%s); estimating tokens from length", model, e)
+        return None
+
+
+def count_tokens(text: str, model: str) -> int:
+    encoding = _encoding(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+class Turn(NamedTuple):
+    id: str
+    created_at: object
+    message: str
+    response: str
+    tokens: int
+
+
+class SessionContext:
+    def __init__(self, summary: str = "", summary_tokens: int = 0, summarized_until: Optional[dict] = None):
+        self.summary = summary
+        self.summary_tokens = summary_tokens
+        self.summarized_until = summarized_until  # {"created_at", "id"} of the last folded turn
+        self.turns: List[Turn] = []
+        self.folding = False
+
+    @property
+    def turn_tokens(self) -> int:
+        return sum(turn.tokens for turn in self.turns)
+
+    def position(self) -> Optional[dict]:
+        if self.turns:
+            return {"created_at": self.turns[-1].created_at, "id": self.turns[-1].id}
+        return self.summarized_until
+
+
+class ChatContextBuilder:
+    def __init__(self, db, governor, model: str, budget: int = 3000, summary_words: int = 200,
+                 cache_size: int = 1000, cache_ttl: float = 1800.0):
+        self.db = db
+        self.governor = governor
+        self.model = model
+        self.budget = budget
+        self.summary_words = summary_words
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self.folds = 0
+        self._tasks = set()
+
+    def _turn(self, doc: dict) -> Turn:
+        tokens = count_tokens(doc["message"], self.model) + count_tokens(doc["response"], self.model)
+        return Turn(doc["id"], doc["created_at"], doc["message"], doc["response"], tokens + 2 * MESSAGE_OVERHEAD_TOKENS)
+
+    async def load(self, user_id: str, session_id: str, new: bool = False) -> SessionContext:
+        key = (user_id, session_id)
+        context = self.cache.get(key)
+        if context is None:
+            if new:
+                context = SessionContext()
+            else:
+                doc = await self.db.chat_sessions.find_one(
+                    {"user_id": user_id, "session_id": session_id},
+                    {"_id": 0, "summary": 1, "summary_tokens": 1, "summarized_until": 1},
+                )
+                context = SessionContext(**doc) if doc else SessionContext()
+            self.cache.set(key, context)
+        if not new:
+            await self._catch_up(user_id, session_id, context)
+        return context
+
+    async def _catch_up(self, user_id: str, session_id: str, context: SessionContext):
+        """Append turns stored after the cached position (e.g. by another worker)."""
+        query = {"user_id": user_id, "session_id": session_id}
+        position = context.position()
+        if position:
+            query["$or"] = [
+                {"created_at": {"$gt": position["created_at"]}},
+                {"created_at": position["created_at"], "id": {"$gt": position["id"]}},
+            ]
+        cursor = self.db.chat_messages.find(query, {"_id": 0, "id": 1, "created_at": 1, "message": 1, "response": 1}) \
+            .sort([("created_at", 1), ("id", 1)])
+        async for doc in cursor:
+            context.turns.append(self._turn(doc))
+
+    def messages(self, context: SessionContext, system_prompt: str, message: str) -> List[dict]:
+        """System prompt, summary, then the most recent turns that fit the budget, then ``message``."""
+        used = count_tokens(system_prompt, self.model) + count_tokens(message, self.model) \
+            + 2 * MESSAGE_OVERHEAD_TOKENS + REPLY_PRIMING_TOKENS
+        messages = [{"role": "system", "content": system_prompt}]
+        if context.summary:
+            used += context.summary_tokens + MESSAGE_OVERHEAD_TOKENS
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation: {context.summary}"})
+
+        recent = []
+        for turn in reversed(context.turns):
+            if used + turn.tokens > self.budget:
+                break
+            used += turn.tokens
+            recent.append(turn)
+        for turn in reversed(recent):
+            messages.append({"role": "user", "content": turn.message})
+            messages.append({"role": "assistant", "content": turn.response})
+        messages.append({"role": "user", "content": message})
+        return messages
+
+    def record(self, context: SessionContext, user_id: str, session_id: str, doc: dict):
+        """Add a stored turn; starts a background fold once the history outgrows the budget."""
+        if not context.turns or context.turns[-1].id != doc["id"]:
+            context.turns.append(self._turn(doc))
+        if context.turn_tokens > self.budget and not context.folding:
+            context.folding = True
+            task = asyncio.create_task(self._fold(context, user_id, session_id))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _fold(self, context: SessionContext, user_id: str, session_id: str):
+        try:
+            # Fold down to half the budget so this does not run on every turn
+            folding, remaining = [], context.turn_tokens
+            for turn in context.turns:
+                if remaining <= self.budget // 2:
+                    break
+                folding.append(turn)
+                remaining -= turn.tokens
+            if not folding:
+                return
+
+            transcript = "\n".join(f"User: {t.message}\nAssistant: {t.response}" for t in folding)
+            summary = await self.governor.complete(
+                [
+                    {"role": "system", "content": SUMMARY_SYSTEM_PROMPT.format(words=self.summary_words)},
+                    {"role": "user", "content": f"Existing summary:\n{context.summary or '(none)'}\n\nNew turns:\n{transcript}"},
+                ],
+                user_id,
+            )
+            last = folding[-1]
+            context.summary = summary.strip()
+            context.summary_tokens = count_tokens(context.summary, self.model)
+            context.summarized_until = {"created_at": last.created_at, "id": last.id}
+            del context.turns[:len(folding)]
+            self.folds += 1
+            await self._save(context, user_id, session_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # The recent turns are still trimmed to the budget; the next turn tries again
+            logger.exception("Folding chat session %s into its summary failed", session_id)
+        finally:
+            context.folding = False
+
+    async def _save(self, context: SessionContext, user_id: str, session_id: str):
+        until = context.summarized_until
+        try:
+            # Never overwrite a summary that already covers more of the session
+            await self.db.chat_sessions.update_one(
+                {
+                    "user_id": user_id,
+                    "session_id": session_id,
+                    "$or": [
+                        {"summarized_until": None},
+                        {"summarized_until.created_at": {"$lt": until["created_at"]}},
+                    ],
+                },
+                {"$set": {
+                    "summary": context.summary,
+                    "summary_tokens": context.summary_tokens,
+                    "summarized_until": until,
+                }},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            pass  # another worker stored a newer summary first
+
+    async def close(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self.cache),
+            "folds": self.folds,
+            "folding": len(self._tasks),
+            "cache_hit_ratio": self.cache.stats()["hit_ratio"],
+        }
@@ -0,0 +1,129 @@
+"""Streaming export of everything a user has stored, as gzip-compressed NDJSON.
+
+Each collection is read with one Motor cursor in (sort field, id) order,
+``batch_size`` documents per round trip. Every batch is encoded, compressed
+and flushed to the client before the next one is fetched, so memory stays
+at one batch whatever the account size.
+
+The stream is a series of events, one JSON object per line:
+
+    {"type": "record", "collection": "health_metrics", "document": {...}}
+    {"type": "checkpoint", "resume": "health_metrics.WyJ7..."}
+    {"type": "done", "counts": {"chat_messages": 120, ...}}
+
+Chat messages and symptom reports moved to the history archive (see
+archive.py) are merged back into their collection's order.
+
+A checkpoint follows every batch. A client whose download breaks passes the
+last checkpoint it saw back as ``?resume=``. The export then continues right
+after that document, in a new gzip stream.
+"""
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+import orjson
+from fastapi import HTTPException
+
+from archive import ARCHIVED_COLLECTIONS
+from pagination import after_position, decode_cursor, encode_cursor
+
+# (collection, sort field), exported in this order
+EXPORT_COLLECTIONS = (
+    ("chat_messages", "created_at"),
+    ("symptom_reports", "created_at"),
+    ("health_metrics", "created_at"),
+    ("reminders", "scheduled_time"),
+)
+_POSITIONS = {name: index for index, (name, _) in enumerate(EXPORT_COLLECTIONS)}
+
+
+def resume_token(collection: str, sort_value, doc_id: str) -> str:
+    return f"{collection}.{encode_cursor(sort_value, doc_id)}"
+
+
+def parse_resume(token: str) -> Tuple[int, object, str]:
+    """(index into EXPORT_COLLECTIONS, last sort value, last id) of a checkpoint."""
+    collection, _, cursor = token.partition(".")
+    if collection not in _POSITIONS or not cursor:
+        raise HTTPException(status_code=400, detail="Invalid resume token")
+    last_value, last_id = decode_cursor(cursor, (datetime,))
+    return _POSITIONS[collection], last_value, last_id
+
+
+def _event(event_type: str, **fields) -> bytes:
+    return orjson.dumps({"type": event_type, **fields}, option=orjson.OPT_UTC_Z) + b"\n"
+
+
+async def _merged(first: AsyncIterator[dict], second: AsyncIterator[dict], sort_field: str) -> AsyncIterator[dict]:
+    """Two iterators sorted by (sort_field, id) as one; an id in both is yielded once."""
+    def key(doc):
+        return doc[sort_field], doc["id"]
+
+    a = await anext(first, None)
+    b = await anext(second, None)
+    while a is not None or b is not None:
+        if b is None or (a is not None and key(a) < key(b)):
+            yield a
+            a = await anext(first, None)
+        else:
+            if a is not None and a["id"] == b["id"]:
+                a = await anext(first, None)
+            yield b
+            b = await anext(second, None)
+
+
+async def export_events(db, user_id: str, resume: Optional[str] = None, batch_size: int = 500,
+                        archive=None) -> AsyncIterator[bytes]:
+    """NDJSON for the user's documents, one chunk per batch; ``resume`` is a checkpoint token.
+
+    ``archive`` is the HistoryArchive whose documents are exported with the hot ones.
+    """
+    start, position = 0, None
+    if resume:
+        start, *position = parse_resume(resume)
+
+    counts: Dict[str, int] = {}
+    for index, (collection, sort_field) in enumerate(EXPORT_COLLECTIONS):
+        if index < start:
+            continue
+        query = {"user_id": user_id}
+        if position and index == start:
+            query = after_position(query, sort_field, 1, *position)
+
+        cursor = db[collection].find(query, {"_id": 0}) \
+            .sort([(sort_field, 1), ("id", 1)]) \
+            .batch_size(batch_size)
+        docs = cursor
+        if archive is not None and collection in ARCHIVED_COLLECTIONS:
+            after = tuple(position) if position and index == start else None
+            docs = _merged(archive.iter_docs(user_id, collection, 1, after), cursor, sort_field)
+        counts[collection] = 0
+        chunk, last = [], None
+        try:
+            async for doc in docs:
+                chunk.append(_event("record", collection=collection, document=doc))
+                last = doc
+                if len(chunk) >= batch_size:
+                    chunk.append(_event("checkpoint", resume=resume_token(collection, last[sort_field], last["id"])))
+                    counts[collection] += batch_size
+                    yield b"".join(chunk)
+                    chunk = []
+        finally:
+            if docs is not cursor:
+                await docs.aclose()
+            await cursor.close()
+        if chunk:
+            chunk.append(_event("checkpoint", resume=resume_token(collection, last[sort_field], last["id"])))
+            counts[collection] += len(chunk) - 1
+            yield b"".join(chunk)
+
+    yield _event("done", counts=counts)
+
+
+async def gzip_stream(chunks: AsyncIterator[bytes], level: int = 6) -> AsyncIterator[bytes]:
+    """Compress ``chunks`` as one gzip member, flushing after each so clients see every checkpoint."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip header and trailer
+    async for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
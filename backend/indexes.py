@@ -0,0 +1,283 @@
+"""MongoDB index provisioning for every query shape server.py issues.
+
+Runs idempotently at startup. It can also be run by hand as a migration
+and plan check against a real database:
+
+    python indexes.py            # create indexes, then explain every route query
+"""
+import asyncio
+import logging
+import os
+import sys
+import time
+
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+SLOW_INDEX_BUILD_SECONDS = 5.0
+
+INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "chat_messages": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("user_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)], name="user_created_id"),
+        IndexModel([("user_id", ASCENDING), ("session_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)], name="user_session_created_id"),
+        # The archive compactor's scan for the oldest documents of any user
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)], name="created_id"),
+        # /api/search; the user_id prefix keeps each search to that user's keys
+        IndexModel(
+            [("user_id", ASCENDING), ("message", TEXT), ("response", TEXT)],
+            name="user_text",
+            weights={"message": 3, "response": 1},
+            default_language="english",
+        ),
+    ],
+    "chat_sessions": [
+        IndexModel([("user_id", ASCENDING), ("session_id", ASCENDING)], name="user_session_unique", unique=True),
+    ],
+    "symptom_reports": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="user_created_id"),
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)], name="created_id"),
+        IndexModel(
+            [("user_id", ASCENDING), ("symptoms", TEXT), ("analysis", TEXT)],
+            name="user_text",
+            weights={"symptoms": 3, "analysis": 1},
+            default_language="english",
+        ),
+    ],
+    "health_metrics": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="user_created_id"),
+        IndexModel([("user_id", ASCENDING), ("metric_type", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="user_type_created_id"),
+        IndexModel(
+            [("user_id", ASCENDING), ("idempotency_key", ASCENDING)],
+            name="user_idempotency_key_unique",
+            unique=True,
+            partialFilterExpression={"idempotency_key": {"$type": "string"}},
+        ),
+    ],
+    "reminders": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("user_id", ASCENDING), ("scheduled_time", ASCENDING), ("id", ASCENDING)], name="user_scheduled_id"),
+        IndexModel(
+            [("user_id", ASCENDING), ("completed", ASCENDING), ("scheduled_time", ASCENDING), ("id", ASCENDING)],
+            name="user_completed_scheduled_id",
+        ),
+        IndexModel([("completed", ASCENDING), ("fired_at", ASCENDING), ("scheduled_time", ASCENDING)], name="due_scheduled"),
+    ],
+    "analysis_cache": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "jobs": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("status", ASCENDING), ("priority", DESCENDING), ("available_at", ASCENDING)], name="status_priority_available"),
+        IndexModel([("status", ASCENDING), ("lease_until", ASCENDING)], name="status_lease"),
+        # Finished jobs are kept for JOB_RETENTION_DAYS
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "history_archive": [
+        IndexModel([("user_id", ASCENDING), ("collection", ASCENDING), ("first", ASCENDING)], name="user_collection_first"),
+        IndexModel([("user_id", ASCENDING), ("collection", ASCENDING), ("last", DESCENDING)], name="user_collection_last"),
+        IndexModel(
+            [("user_id", ASCENDING), ("collection", ASCENDING), ("month", ASCENDING), ("part", DESCENDING)],
+            name="user_collection_month_part",
+        ),
+        # Only set with ARCHIVE_EXPIRE_DAYS
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "rate_limits": [
+        # Only written with RATE_LIMIT_STORE=mongo; an idle bucket is full again after its period
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "llm_usage": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "revoked_tokens": [
+        # Entries are only needed until the revoked token would have expired
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+}
+
+# Superseded indexes dropped on startup
+OBSOLETE_INDEXES = {
+    "chat_messages": ["user_created", "user_session_created"],
+    "symptom_reports": ["user_created"],
+    "health_metrics": ["user_created", "user_type_created"],
+    "reminders": ["user_scheduled"],
+}
+
+# (description, collection, filter, sort) for every query a route runs; an
+# aggregation gives its pipeline in place of the filter, and no sort.
+# Values are placeholders; only the shape matters to the planner.
+ROUTE_QUERIES = [
+    ("register/login: user by email", "users", {"email": "x@example.com"}, None),
+    ("get_profile: user by id", "users", {"id": "x"}, None),
+    ("get_current_user: revoked token lookup", "revoked_tokens", {"_id": "x"}, None),
+    ("get_chat_history", "chat_messages", {"user_id": "x"}, [("created_at", 1), ("id", 1)]),
+    ("get_chat_history by session", "chat_messages", {"user_id": "x", "session_id": "x"}, [("created_at", 1), ("id", 1)]),
+    ("get_chat_history next page", "chat_messages",
+     {"user_id": "x", "$or": [{"created_at": {"$gt": "x"}}, {"created_at": "x", "id": {"$gt": "x"}}]},
+     [("created_at", 1), ("id", 1)]),
+    ("analyze_symptoms: cached analysis", "analysis_cache", {"_id": "x", "expires_at": {"$gt": "x"}}, None),
+    ("chat context: session summary", "chat_sessions", {"user_id": "x", "session_id": "x"}, None),
+    ("get_symptom_history", "symptom_reports", {"user_id": "x"}, [("created_at", -1), ("id", -1)]),
+    ("get_health_metrics", "health_metrics", {"user_id": "x"}, [("created_at", -1), ("id", -1)]),
+    ("get_health_metrics by type", "health_metrics", {"user_id": "x", "metric_type": "x"}, [("created_at", -1), ("id", -1)]),
+    ("get_metric_series", "health_metrics",
+     {"user_id": "x", "metric_type": "x", "value_num": {"$ne": None}, "created_at": {"$gte": "x"}}, [("created_at", 1)]),
+    ("add_health_metric retry lookup", "health_metrics", {"user_id": "x", "idempotency_key": "x"}, None),
+    ("delete_health_metric", "health_metrics", {"id": "x", "user_id": "x"}, None),
+    ("get_reminders", "reminders", {"user_id": "x"}, [("scheduled_time", 1), ("id", 1)]),
+    ("dashboard: upcoming reminders", "reminders", {"user_id": "x", "completed": False}, [("scheduled_time", 1), ("id", 1)]),
+    ("dashboard: latest metric per type", "health_metrics", [
+        {"$match": {"user_id": "x"}},
+        {"$sort": {"user_id": 1, "metric_type": 1, "created_at": -1}},
+        {"$group": {"_id": "$metric_type", "doc": {"$first": "$$ROOT"}}},
+        {"$replaceRoot": {"newRoot": "$doc"}},
+        {"$sort": {"created_at": -1}},
+    ], None),
+    ("dashboard: metrics today", "health_metrics", [
+        {"$match": {"user_id": "x", "created_at": {"$gte": "x"}}},
+        {"$group": {"_id": "$metric_type", "count": {"$sum": 1}}},
+    ], None),
+    ("dashboard: latest symptom report", "symptom_reports", {"user_id": "x"}, [("created_at", -1), ("id", -1)]),
+    ("get_metric_series buckets", "health_metrics", [
+        {"$match": {"user_id": "x", "metric_type": "x", "value_num": {"$ne": None}, "created_at": {"$gte": "x"}}},
+        {"$group": {"_id": {"$dateTrunc": {"date": "$created_at", "unit": "day"}}, "avg": {"$avg": "$value_num"}}},
+        {"$sort": {"_id": 1}},
+    ], None),
+    ("chat context: turns after the cached position", "chat_messages",
+     {"user_id": "x", "session_id": "x", "$or": [{"created_at": {"$gt": "x"}}, {"created_at": "x", "id": {"$gt": "x"}}]},
+     [("created_at", 1), ("id", 1)]),
+    ("chat job: stored reply of a re-run", "chat_messages", {"id": "x"}, None),
+    ("symptoms job: stored report of a re-run", "symptom_reports", {"id": "x"}, None),
+    ("reminder scheduler: due window", "reminders", {"completed": False, "fired_at": None, "scheduled_time": {"$lte": "x"}}, [("scheduled_time", 1)]),
+    ("job workers: claim next job", "jobs", {"status": "queued", "available_at": {"$lte": "x"}}, [("priority", -1), ("available_at", 1)]),
+    ("job workers: expired leases", "jobs", {"status": "running", "lease_until": {"$lt": "x"}}, None),
+    ("get_job", "jobs", {"id": "x", "user_id": "x"}, None),
+    ("ai_limits: shared rate limit bucket", "rate_limits", {"_id": "x"}, None),
+    ("ai_limits: daily token usage", "llm_usage", {"_id": "x"}, None),
+    ("if_none_match: collection versions", "collection_versions", {"_id": "x"}, None),
+    ("complete/delete_reminder", "reminders", {"id": "x", "user_id": "x"}, None),
+    ("export: chat_messages", "chat_messages", {"user_id": "x"}, [("created_at", 1), ("id", 1)]),
+    ("export: symptom_reports", "symptom_reports", {"user_id": "x"}, [("created_at", 1), ("id", 1)]),
+    ("export: health_metrics", "health_metrics", {"user_id": "x"}, [("created_at", 1), ("id", 1)]),
+    ("export: reminders", "reminders", {"user_id": "x"}, [("scheduled_time", 1), ("id", 1)]),
+    ("search: chat_messages", "chat_messages", {"user_id": "x", "$text": {"$search": "x"}}, None),
+    ("search: symptom_reports", "symptom_reports", {"user_id": "x", "$text": {"$search": "x"}}, None),
+    ("search: chat hits by id", "chat_messages", {"id": {"$in": ["x"]}, "user_id": "x"}, None),
+    ("search: symptom hits by id", "symptom_reports", {"id": {"$in": ["x"]}, "user_id": "x"}, None),
+    ("archive compactor: oldest chat_messages", "chat_messages", {"created_at": {"$lt": "x"}}, [("created_at", 1), ("id", 1)]),
+    ("archive compactor: oldest symptom_reports", "symptom_reports", {"created_at": {"$lt": "x"}}, [("created_at", 1), ("id", 1)]),
+    ("archive compactor: next scan page", "chat_messages",
+     {"created_at": {"$lt": "x"}, "$or": [{"created_at": {"$gt": "x"}}, {"created_at": "x", "id": {"$gt": "x"}}]},
+     [("created_at", 1), ("id", 1)]),
+    ("archive compactor: month to move", "chat_messages",
+     {"user_id": "x", "created_at": {"$gte": "x", "$lt": "x"}}, [("created_at", 1), ("id", 1)]),
+    ("archive compactor: last part of a month", "history_archive",
+     {"user_id": "x", "collection": "x", "month": "x"}, [("part", -1)]),
+    ("archived history, oldest first", "history_archive",
+     {"user_id": "x", "collection": "x", "last": {"$gte": "x"}}, [("first", 1)]),
+    ("archived history, newest first", "history_archive",
+     {"user_id": "x", "collection": "x", "first": {"$lte": "x"}}, [("last", -1)]),
+]
+
+
+async def ensure_indexes(db) -> dict:
+    """Create any missing indexes and report which expected ones are absent."""
+    # Collections are independent, so their round trips overlap; this runs in every worker's startup
+    results = await asyncio.gather(*(
+        _ensure_collection(db, collection, models) for collection, models in INDEXES.items()
+    ))
+    return {collection: absent for collection, absent in zip(INDEXES, results) if absent}
+
+
+async def _ensure_collection(db, collection: str, models: list) -> list:
+    obsolete = OBSOLETE_INDEXES.get(collection)
+    if obsolete:
+        existing = [index["name"] async for index in db[collection].list_indexes()]
+        for name in set(obsolete) & set(existing):
+            logger.info("Dropping superseded index %s.%s", collection, name)
+            await db[collection].drop_index(name)
+
+    started = time.perf_counter()
+    try:
+        await db[collection].create_indexes(models)
+    except OperationFailure as e:
+        # Usually an existing index with the same name but different options
+        logger.error("Index creation failed on %s: %s", collection, e)
+    elapsed = time.perf_counter() - started
+    if elapsed > SLOW_INDEX_BUILD_SECONDS:
+        logger.warning("Index build on %s took %.1fs", collection, elapsed)
+
+    existing = {index["name"] async for index in db[collection].list_indexes()}
+    absent = [m.document["name"] for m in models if m.document["name"] not in existing]
+    if absent:
+        logger.warning("Missing indexes on %s: %s", collection, ", ".join(absent))
+    return absent
+
+
+def _winning_plan(result: dict) -> dict:
+    # A find explains at the top; an aggregation nests the pushed-down query under its first stage
+    planner = result.get("queryPlanner") or result["stages"][0]["$cursor"]["queryPlanner"]
+    winning = planner["winningPlan"]
+    return winning.get("queryPlan", winning)
+
+
+def _plan_stages(plan: dict):
+    yield plan.get("stage")
+    if "inputStage" in plan:
+        yield from _plan_stages(plan["inputStage"])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+
+async def explain_route_queries(db) -> list:
+    """Explain every route query; returns those whose winning plan scans the collection."""
+    unindexed = []
+    for description, collection, query, sort in ROUTE_QUERIES:
+        if isinstance(query, list):
+            command = {"aggregate": collection, "pipeline": query, "cursor": {}}
+        else:
+            command = {"find": collection, "filter": query}
+            if sort:
+                command["sort"] = dict(sort)
+        result = await db.command({"explain": command, "verbosity": "queryPlanner"})
+        stages = set(_plan_stages(_winning_plan(result)))
+        if "COLLSCAN" in stages or not stages & {"IXSCAN", "IDHACK", "DISTINCT_SCAN", "EXPRESS_IXSCAN", "EXPRESS_IDHACK"}:
+            logger.warning("Query %r on %s does not use an index: %s", description, collection, sorted(filter(None, stages)))
+            unindexed.append(description)
+        elif "SORT" in stages:
+            logger.warning("Query %r on %s sorts in memory", description, collection)
+    return unindexed
+
+
+async def _main() -> int:
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from pathlib import Path
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        missing = await ensure_indexes(db)
+        unindexed = await explain_route_queries(db)
+    finally:
+        client.close()
+
+    for description in unindexed:
+        print(f"UNINDEXED: {description}")
+    print(f"{len(ROUTE_QUERIES) - len(unindexed)}/{len(ROUTE_QUERIES)} route queries use an index")
+    return 1 if missing or unindexed else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    sys.exit(asyncio.run(_main()))
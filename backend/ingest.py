@@ -0,0 +1,124 @@
+"""Batched bulk ingestion of health metrics (JSON array or NDJSON bodies)."""
+import json
+import uuid
+from datetime import datetime, timezone
+from typing import AsyncIterator, List, Tuple
+
+from pydantic import BaseModel, ValidationError
+from pymongo.errors import BulkWriteError
+
+from storage import parse_metric_value, to_utc
+
+BULK_BATCH_SIZE = 500
+BULK_MAX_RECORDS = 50000
+DUPLICATE_KEY = 11000
+
+
+class BulkItemError(BaseModel):
+    index: int
+    error: str
+
+
+class BulkIngestResult(BaseModel):
+    received: int = 0
+    inserted: int = 0
+    duplicates: List[int] = []  # indexes skipped because their idempotency_key was already stored
+    errors: List[BulkItemError] = []
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Split a streamed body into non-empty lines without buffering it whole."""
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if pending.strip():
+        yield pending
+
+
+async def iter_json_array(body: bytes) -> AsyncIterator[object]:
+    records = json.loads(body)
+    if not isinstance(records, list):
+        raise ValueError("Expected a JSON array of metrics")
+    for record in records:
+        yield record
+
+
+def _validation_message(e: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(p) for p in err['loc']) or 'record'}: {err['msg']}" for err in e.errors())
+
+
+class MetricIngestor:
+    """Validates records in batches and writes each batch with one unordered insert_many."""
+
+    def __init__(self, collection, user_id: str, model, batch_size: int = BULK_BATCH_SIZE):
+        self.collection = collection
+        self.user_id = user_id
+        self.model = model
+        self.batch_size = batch_size
+        self.result = BulkIngestResult()
+        self._batch: List[Tuple[int, dict]] = []
+
+    def _document(self, record) -> dict:
+        data = record.model_dump()
+        created_at = to_utc(data.pop("created_at", None)) or datetime.now(timezone.utc)
+        if data.get("idempotency_key") is None:
+            data.pop("idempotency_key", None)  # keyless readings stay out of user_idempotency_key_unique
+        return {
+            "id": str(uuid.uuid4()),
+            "user_id": self.user_id,
+            **data,
+            **parse_metric_value(record.metric_type, record.value),
+            "created_at": created_at,
+        }
+
+    async def add(self, raw) -> None:
+        index = self.result.received
+        self.result.received += 1
+        if index >= BULK_MAX_RECORDS:
+            self.result.errors.append(BulkItemError(index=index, error=f"More than {BULK_MAX_RECORDS} records in one request"))
+            return
+        try:
+            if isinstance(raw, (bytes, str)):
+                record = self.model.model_validate_json(raw)
+            else:
+                record = self.model.model_validate(raw)
+        except ValidationError as e:
+            self.result.errors.append(BulkItemError(index=index, error=_validation_message(e)))
+            return
+
+        self._batch.append((index, self._document(record)))
+        if len(self._batch) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self) -> None:
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, []
+        try:
+            result = await self.collection.insert_many([doc for _, doc in batch], ordered=False)
+            self.result.inserted += len(result.inserted_ids)
+        except BulkWriteError as e:
+            details = e.details
+            self.result.inserted += details.get("nInserted", 0)
+            for write_error in details.get("writeErrors", []):
+                index = batch[write_error["index"]][0]
+                if write_error.get("code") == DUPLICATE_KEY:
+                    self.result.duplicates.append(index)
+                else:
+                    self.result.errors.append(BulkItemError(index=index, error=write_error.get("errmsg", "Write failed")))
+
+    async def finish(self) -> BulkIngestResult:
+        await self.flush()
+        self.result.duplicates.sort()
+        self.result.errors.sort(key=lambda e: e.index)
+        return self.result
+
+
+async def ingest(records: AsyncIterator, ingestor: MetricIngestor) -> BulkIngestResult:
+    async for raw in records:
+        await ingestor.add(raw)
+    return await ingestor.finish()
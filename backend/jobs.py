@@ -0,0 +1,282 @@
+"""MongoDB-backed job queue for AI work that should not hold a request open.
+
+Jobs live in the ``jobs`` collection. Each process runs a bounded pool of
+async workers that claim the highest-priority queued job with
+find_one_and_update, taking a lease that is extended while the handler
+runs. Transient failures are retried with backoff; jobs that keep failing
+(or fail permanently) are dead-lettered with ``status: "dead"``. A crashed
+worker's jobs are re-queued once their lease expires.
+
+Clients poll ``GET /api/jobs/{id}``, optionally long-polling with ``wait``;
+listeners registered with ``subscribe`` are told about every finished job.
+"""
+import asyncio
+import logging
+import os
+import random
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pydantic import BaseModel, ConfigDict, Field
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+FINISHED = ("succeeded", "dead")
+
+
+class Job(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_id: str
+    kind: str
+    status: str = "queued"  # queued, running, succeeded, dead
+    priority: int = 0
+    attempts: int = 0
+    max_attempts: int = 3
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    finished_at: Optional[datetime] = None
+
+
+class RetryableJobError(Exception):
+    """Raised (or wrapped) by handlers for failures worth another attempt."""
+
+
+class JobQueue:
+    def __init__(self, collection, workers: int = 4, lease: timedelta = timedelta(seconds=60),
+                 max_attempts: int = 3, poll_interval: float = 1.0, retention: Optional[timedelta] = timedelta(days=7)):
+        self.collection = collection
+        self.workers = workers
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.retention = retention  # finished jobs are removed by the expires_at TTL index after this
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._handlers: Dict[str, Callable[[dict], Awaitable[dict]]] = {}
+        self._retryable: Dict[str, tuple] = {}
+        self._listeners: List[Callable[[dict], Awaitable[None]]] = []
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+        self._wake = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self.running = 0
+        self.succeeded = 0
+        self.retried = 0
+        self.dead = 0
+        self.recovered = 0
+
+    @classmethod
+    def from_env(cls, collection) -> "JobQueue":
+        retention_days = float(os.environ.get('JOB_RETENTION_DAYS', '7'))
+        return cls(
+            collection,
+            workers=int(os.environ.get('JOB_WORKERS', '4')),
+            lease=timedelta(seconds=float(os.environ.get('JOB_LEASE_SECONDS', '60'))),
+            max_attempts=int(os.environ.get('JOB_MAX_ATTEMPTS', '3')),
+            retention=timedelta(days=retention_days) if retention_days > 0 else None,
+        )
+
+    def register(self, kind: str, handler: Callable[[dict], Awaitable[dict]], retry_on: tuple = ()):
+        """``handler`` gets the job document and returns the result dict.
+
+        Exceptions in ``retry_on`` (and RetryableJobError) are retried with
+        backoff; anything else dead-letters the job immediately.
+        """
+        self._handlers[kind] = handler
+        self._retryable[kind] = (RetryableJobError, *retry_on)
+
+    def subscribe(self, listener: Callable[[dict], Awaitable[None]]):
+        """Register an async callback that receives every job this process finishes."""
+        self._listeners.append(listener)
+
+    async def enqueue(self, user_id: str, kind: str, payload: dict, priority: int = 0) -> Job:
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job = Job(user_id=user_id, kind=kind, priority=priority, max_attempts=self.max_attempts)
+        await self.collection.insert_one({**job.model_dump(), "payload": payload, "available_at": job.created_at})
+        self._wake.set()
+        return job
+
+    async def get(self, job_id: str, user_id: str) -> Optional[dict]:
+        return await self.collection.find_one({"id": job_id, "user_id": user_id}, {"_id": 0, "payload": 0})
+
+    async def wait(self, job_id: str, user_id: str, timeout: float) -> Optional[dict]:
+        """Long-poll: return the job once it finishes, or as it is when ``timeout`` runs out."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            job = await self.get(job_id, user_id)
+            remaining = deadline - loop.time()
+            if job is None or job["status"] in FINISHED or remaining <= 0:
+                return job
+            # Woken at once if this process runs the job; polled otherwise
+            future = loop.create_future()
+            self._waiters.setdefault(job_id, []).append(future)
+            try:
+                await asyncio.wait_for(asyncio.shield(future), timeout=min(remaining, self.poll_interval))
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                waiters = self._waiters.get(job_id, [])
+                if future in waiters:
+                    waiters.remove(future)
+                if not waiters:
+                    self._waiters.pop(job_id, None)
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker(), name=f"job-worker-{i}") for i in range(self.workers)]
+            self._tasks.append(asyncio.create_task(self._recover_loop(), name="job-recovery"))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _claim(self) -> Optional[dict]:
+        now = datetime.now(timezone.utc)
+        queued = {"status": "queued", "available_at": {"$lte": now}}
+        # Pick the next job, then claim it by id; the status condition makes the
+        # claim atomic and a worker that loses the race just picks again.
+        for _ in range(3):
+            candidate = await self.collection.find_one(queued, {"_id": 0, "id": 1}, sort=[("priority", -1), ("available_at", 1)])
+            if candidate is None:
+                return None
+            job = await self.collection.find_one_and_update(
+                {**queued, "id": candidate["id"]},
+                {
+                    "$set": {"status": "running", "lease_owner": self.worker_id, "lease_until": now + self.lease, "started_at": now},
+                    "$inc": {"attempts": 1},
+                },
+                projection={"_id": 0},
+                return_document=ReturnDocument.BEFORE,
+            )
+            if job is not None:
+                job["attempts"] += 1
+                return job
+        return None
+
+    async def _worker(self):
+        while True:
+            try:
+                job = await self._claim()
+                if job is None:
+                    self._wake.clear()
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Job worker iteration failed")
+                await asyncio.sleep(self.poll_interval)
+
+    async def _heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(self.lease.total_seconds() / 3)
+            await self.collection.update_one(
+                {"id": job_id, "lease_owner": self.worker_id},
+                {"$set": {"lease_until": datetime.now(timezone.utc) + self.lease}},
+            )
+
+    async def _run(self, job: dict):
+        self.running += 1
+        heartbeat = asyncio.create_task(self._heartbeat(job["id"]))
+        try:
+            result = await self._handlers[job["kind"]](job)
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back instead of waiting for the lease to expire
+            await self._release(job, "queued", {"available_at": datetime.now(timezone.utc)}, inc_attempts=-1)
+            raise
+        except Exception as e:
+            if isinstance(e, self._retryable.get(job["kind"], ())) and job["attempts"] < job["max_attempts"]:
+                self.retried += 1
+                delay = min(2 ** job["attempts"], 60) * random.uniform(0.5, 1.5)
+                logger.warning("Job %s (%s) failed, retrying in %.0fs: %s", job["id"], job["kind"], delay, e)
+                await self._release(job, "queued", {
+                    "error": str(e),
+                    "available_at": datetime.now(timezone.utc) + timedelta(seconds=delay),
+                })
+            else:
+                self.dead += 1
+                logger.error("Job %s (%s) dead-lettered after %d attempt(s): %s", job["id"], job["kind"], job["attempts"], e)
+                await self._finish(job, "dead", {"error": str(e)})
+        else:
+            self.succeeded += 1
+            await self._finish(job, "succeeded", {"result": result, "error": None})
+        finally:
+            heartbeat.cancel()
+            self.running -= 1
+
+    async def _release(self, job: dict, status: str, fields: dict, inc_attempts: int = 0):
+        update = {"$set": {"status": status, **fields}, "$unset": {"lease_owner": "", "lease_until": ""}}
+        if inc_attempts:
+            update["$inc"] = {"attempts": inc_attempts}
+        await self.collection.update_one({"id": job["id"], "lease_owner": self.worker_id}, update)
+
+    async def _finish(self, job: dict, status: str, fields: dict):
+        fields["finished_at"] = datetime.now(timezone.utc)
+        if self.retention is not None:
+            fields["expires_at"] = fields["finished_at"] + self.retention
+        await self._release(job, status, fields)
+        finished = await self.get(job["id"], job["user_id"])
+        for future in self._waiters.pop(job["id"], []):
+            if not future.done():
+                future.set_result(None)
+        for listener in self._listeners:
+            try:
+                await listener(finished)
+            except Exception:
+                logger.exception("Job listener failed for %s", job["id"])
+
+    async def recover(self) -> int:
+        """Re-queue running jobs whose lease expired; dead-letter those out of attempts."""
+        now = datetime.now(timezone.utc)
+        expired = {"status": "running", "lease_until": {"$lt": now}}
+        unset = {"lease_owner": "", "lease_until": ""}
+        dead_fields = {"status": "dead", "error": "Lease expired too many times", "finished_at": now}
+        if self.retention is not None:
+            dead_fields["expires_at"] = now + self.retention
+        dead = await self.collection.update_many(
+            {**expired, "$expr": {"$gte": ["$attempts", "$max_attempts"]}},
+            {"$set": dead_fields, "$unset": unset},
+        )
+        requeued = await self.collection.update_many(
+            expired,
+            {"$set": {"status": "queued", "available_at": now}, "$unset": unset},
+        )
+        if dead.modified_count or requeued.modified_count:
+            logger.warning("Recovered %d job(s) with expired leases, dead-lettered %d",
+                           requeued.modified_count, dead.modified_count)
+            self._wake.set()
+        self.recovered += requeued.modified_count
+        self.dead += dead.modified_count
+        return requeued.modified_count
+
+    async def _recover_loop(self):
+        while True:
+            try:
+                await self.recover()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Job lease recovery failed")
+            await asyncio.sleep(self.lease.total_seconds() / 2)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "succeeded": self.succeeded,
+            "retried": self.retried,
+            "dead": self.dead,
+            "recovered": self.recovered,
+            "worker_id": self.worker_id,
+        }
@@ -0,0 +1,404 @@
+"""Governor around the AsyncOpenAI client.
+
+Every model call goes through LLMGovernor, which
+
+* caps concurrent calls globally and per user, with a bounded wait queue
+  that rejects immediately (LLMBusy) once full;
+* gives each request one deadline that covers queueing, every attempt and
+  the backoff between them;
+* retries transient upstream failures (timeouts, connection errors, 429s,
+  5xx) with jittered exponential backoff;
+* merges identical prompts that are already in flight into a single call;
+* opens a circuit breaker after consecutive upstream failures, so callers
+  fail fast (LLMUnavailable) instead of piling up behind a dead upstream.
+
+Exceptions derive from LLMError and carry the HTTP status and Retry-After
+value the route should answer with.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+from telemetry import observe_llm
+
+logger = logging.getLogger(__name__)
+
+
+class LLMError(Exception):
+    status_code = 502
+    outcome = "error"  # telemetry label
+    retry_after: Optional[int] = None
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        if retry_after is not None:
+            self.retry_after = max(1, int(retry_after + 0.999))
+
+
+class LLMBusy(LLMError):
+    """Too many calls already waiting for a slot."""
+    status_code = 503
+    outcome = "busy"
+    retry_after = 1
+
+
+class LLMUnavailable(LLMError):
+    """The circuit breaker is open after repeated upstream failures."""
+    status_code = 503
+    outcome = "unavailable"
+
+
+class LLMTimeout(LLMError):
+    """The request's deadline passed before the model answered."""
+    status_code = 504
+    outcome = "timeout"
+
+
+class LLMUpstreamError(LLMError):
+    """The upstream kept failing (or failed permanently) within the deadline."""
+    status_code = 502
+
+
+# openai is imported in these two instead of at module level: it is the slowest
+# import in the backend, and the client that needs it is only built at startup
+def _is_retryable(e: BaseException) -> bool:
+    import openai
+
+    return isinstance(e, (
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+        openai.RateLimitError,
+        openai.InternalServerError,
+        asyncio.TimeoutError,
+    ))
+
+
+def _is_bad_request(e: BaseException) -> bool:
+    import openai
+
+    return isinstance(e, openai.BadRequestError)
+
+
+class CircuitBreaker:
+    """Closed -> open after ``failure_threshold`` consecutive failures; one probe after ``reset_timeout``."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def before_call(self):
+        state = self.state
+        if state == "open" or (state == "half_open" and self.probing):
+            remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+            raise LLMUnavailable("AI service temporarily unavailable", retry_after=max(remaining, 1))
+        if state == "half_open":
+            self.probing = True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.probing or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self.probing:
+                self.trips += 1
+                logger.warning("LLM circuit breaker opened after %d consecutive failures", self.failures)
+            self.opened_at = time.monotonic()
+            self.probing = False
+
+    def release_probe(self):
+        """A probe ended without an upstream verdict (e.g. the caller went away)."""
+        self.probing = False
+
+
+class LLMGovernor:
+    def __init__(self, client, model: str, max_concurrency: int = 32, max_per_user: int = 2,
+                 max_queue: int = 100, timeout: float = 60.0, attempt_timeout: float = 30.0,
+                 max_attempts: int = 3, breaker: Optional[CircuitBreaker] = None):
+        self.client = client
+        self.model = model
+        self.max_per_user = max_per_user
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.attempt_timeout = attempt_timeout
+        self.max_attempts = max_attempts
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._user_slots: Dict[str, List] = {}  # user_id -> [semaphore, holders + waiters]
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._usage_listeners: List[Callable[[str, object], None]] = []
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.queued = 0
+        self.rejected = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.completed = 0
+
+    @classmethod
+    def from_env(cls, client, model: str) -> "LLMGovernor":
+        return cls(
+            client,
+            model,
+            max_concurrency=int(os.environ.get('LLM_MAX_CONCURRENCY', '32')),
+            max_per_user=int(os.environ.get('LLM_MAX_PER_USER', '2')),
+            max_queue=int(os.environ.get('LLM_MAX_QUEUE', '100')),
+            timeout=float(os.environ.get('LLM_TIMEOUT', '60')),
+            attempt_timeout=float(os.environ.get('LLM_ATTEMPT_TIMEOUT', '30')),
+            max_attempts=int(os.environ.get('LLM_MAX_ATTEMPTS', '3')),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.environ.get('LLM_BREAKER_FAILURES', '5')),
+                reset_timeout=float(os.environ.get('LLM_BREAKER_RESET', '30')),
+            ),
+        )
+
+    def subscribe(self, listener: Callable[[str, object], None]):
+        """Register a callback that gets ``(user_id, usage)`` for every call the API reported usage for.
+
+        Coalesced calls are reported once, for the user whose call went upstream.
+        """
+        self._usage_listeners.append(listener)
+
+    def _report_usage(self, user_id: str, usage):
+        if usage is None:
+            return
+        for listener in self._usage_listeners:
+            try:
+                listener(user_id, usage)
+            except Exception:
+                logger.exception("LLM usage listener failed")
+
+    @asynccontextmanager
+    async def _slot(self, user_id: str, deadline: float):
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise LLMBusy("AI service busy, please retry")
+
+        entry = self._user_slots.setdefault(user_id, [asyncio.Semaphore(self.max_per_user), 0])
+        entry[1] += 1
+        acquired = []
+        self.queued += 1
+        try:
+            loop = asyncio.get_running_loop()
+            for semaphore in (entry[0], self._slots):
+                if semaphore.locked():
+                    await asyncio.wait_for(semaphore.acquire(), timeout=max(deadline - loop.time(), 0))
+                else:
+                    await semaphore.acquire()  # free slot, returns without waiting
+                acquired.append(semaphore)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise LLMBusy("AI service busy, please retry")
+        finally:
+            self.queued -= 1
+            if len(acquired) < 2:
+                for semaphore in acquired:
+                    semaphore.release()
+                self._drop_user(user_id, entry)
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            for semaphore in acquired:
+                semaphore.release()
+            self._drop_user(user_id, entry)
+
+    def _drop_user(self, user_id: str, entry: List):
+        entry[1] -= 1
+        if entry[1] == 0:
+            self._user_slots.pop(user_id, None)
+
+    def _retrying(self, deadline: float) -> AsyncRetrying:
+        loop = asyncio.get_running_loop()
+
+        def out_of_time(retry_state) -> bool:
+            return deadline - loop.time() < 1.0
+
+        def count_retry(retry_state):
+            self.retries += 1
+            logger.warning("Retrying LLM call after %r", retry_state.outcome.exception())
+
+        return AsyncRetrying(
+            stop=stop_after_attempt(self.max_attempts) | out_of_time,
+            wait=wait_random_exponential(multiplier=0.5, max=4),
+            retry=retry_if_exception(_is_retryable),
+            before_sleep=count_retry,
+            reraise=True,
+        )
+
+    def _attempt_timeout(self, deadline: float) -> float:
+        return max(min(self.attempt_timeout, deadline - asyncio.get_running_loop().time()), 0.1)
+
+    def _fail(self, e: BaseException) -> LLMError:
+        if isinstance(e, asyncio.TimeoutError):
+            self.timeouts += 1
+            return LLMTimeout("AI service timed out")
+        self.failures += 1
+        return LLMUpstreamError(f"AI service error: {e}")
+
+    async def _call(self, messages: List[dict], user_id: str) -> str:
+        started = time.perf_counter()
+        try:
+            response = await self._request(messages, user_id)
+        except LLMError as e:
+            observe_llm("complete", e.outcome, time.perf_counter() - started)
+            raise
+        usage = getattr(response, "usage", None)
+        observe_llm("complete", "ok", time.perf_counter() - started, usage)
+        self._report_usage(user_id, usage)
+        return response.choices[0].message.content
+
+    async def _request(self, messages: List[dict], user_id: str):
+        deadline = asyncio.get_running_loop().time() + self.timeout
+        self.breaker.before_call()
+        try:
+            async with self._slot(user_id, deadline):
+                async for attempt in self._retrying(deadline):
+                    with attempt:
+                        response = await asyncio.wait_for(
+                            self.client.chat.completions.create(model=self.model, messages=messages),
+                            timeout=self._attempt_timeout(deadline),
+                        )
+        except (LLMBusy, LLMTimeout):
+            self.breaker.release_probe()
+            raise
+        except asyncio.CancelledError:
+            self.breaker.release_probe()
+            raise
+        except Exception as e:
+            if _is_bad_request(e):
+                self.breaker.release_probe()  # our request, not the upstream's health
+            else:
+                self.breaker.record_failure()
+            raise self._fail(e) from e
+
+        self.breaker.record_success()
+        self.completed += 1
+        return response
+
+    async def complete(self, messages: List[dict], user_id: str) -> str:
+        """Run one chat completion, sharing the result with identical calls already in flight."""
+        key = hashlib.sha256(json.dumps([self.model, messages], sort_keys=True).encode("utf-8")).hexdigest()
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(self._call(messages, user_id))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finished(key, t))
+        # Shielded so a disconnecting caller does not cancel the call for the others
+        return await asyncio.shield(task)
+
+    def _finished(self, key: str, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # mark retrieved even if every waiter went away
+
+    async def stream(self, messages: List[dict], user_id: str) -> AsyncIterator[str]:
+        """Stream content deltas. Retries only until the first delta has been sent."""
+        started = time.perf_counter()
+        usage = []
+        deltas = self._stream(messages, user_id, usage)
+        try:
+            async for delta in deltas:
+                yield delta
+        except LLMError as e:
+            observe_llm("stream", e.outcome, time.perf_counter() - started)
+            raise
+        finally:
+            await deltas.aclose()  # release the slot now if the consumer went away
+        observe_llm("stream", "ok", time.perf_counter() - started, usage[-1] if usage else None)
+        self._report_usage(user_id, usage[-1] if usage else None)
+
+    async def _stream(self, messages: List[dict], user_id: str, usage: list) -> AsyncIterator[str]:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        self.breaker.before_call()
+        sent = False
+        try:
+            async with self._slot(user_id, deadline):
+                async for attempt in self._retrying(deadline):
+                    with attempt:
+                        stream = await asyncio.wait_for(
+                            self.client.chat.completions.create(
+                                model=self.model, messages=messages, stream=True,
+                                stream_options={"include_usage": True},
+                            ),
+                            timeout=self._attempt_timeout(deadline),
+                        )
+                        chunks = stream.__aiter__()
+                        while True:
+                            try:
+                                # Idle timeout between chunks; the deadline bounds the wait for the first one
+                                timeout = self.attempt_timeout if sent else self._attempt_timeout(deadline)
+                                chunk = await asyncio.wait_for(chunks.__anext__(), timeout=timeout)
+                            except StopAsyncIteration:
+                                break
+                            except Exception as e:
+                                if sent:
+                                    raise LLMUpstreamError(f"AI service error: {e}") from e
+                                raise
+                            if getattr(chunk, "usage", None):
+                                usage.append(chunk.usage)  # final chunk, no choices
+                            if chunk.choices and chunk.choices[0].delta.content:
+                                sent = True
+                                yield chunk.choices[0].delta.content
+        except (LLMBusy, LLMTimeout):
+            self.breaker.release_probe()
+            raise
+        except (asyncio.CancelledError, GeneratorExit):
+            self.breaker.release_probe()
+            raise
+        except LLMUpstreamError:
+            self.failures += 1
+            self.breaker.record_failure()
+            raise
+        except Exception as e:
+            if _is_bad_request(e):
+                self.breaker.release_probe()
+            else:
+                self.breaker.record_failure()
+            raise self._fail(e) from e
+
+        self.breaker.record_success()
+        self.completed += 1
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_concurrency": self.max_concurrency,
+            "rejected": self.rejected,
+            "coalesced": self.coalesced,
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "completed": self.completed,
+            "breaker_state": self.breaker.state,
+            "breaker_trips": self.breaker.trips,
+        }
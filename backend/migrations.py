@@ -0,0 +1,116 @@
+"""One-shot data migrations.
+
+native_types converts ISO-string timestamps to BSON datetimes and adds the
+parsed numeric fields to health metrics. It works in batches ordered by
+_id and records a checkpoint after each batch in the ``migrations``
+collection, so an interrupted run resumes where it stopped:
+
+    python migrations.py                 # run (or resume) the migration
+    python migrations.py --restart       # ignore the checkpoint and rescan
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+
+from pymongo import UpdateOne
+
+from storage import parse_metric_value, to_utc
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_ID = "native_types"
+
+DATETIME_FIELDS = {
+    "users": ["created_at"],
+    "chat_messages": ["created_at"],
+    "symptom_reports": ["created_at"],
+    "health_metrics": ["created_at"],
+    "reminders": ["created_at", "scheduled_time"],
+}
+
+
+def _convert(collection: str, doc: dict) -> dict:
+    changes = {}
+    for field in DATETIME_FIELDS[collection]:
+        if isinstance(doc.get(field), str):
+            try:
+                changes[field] = to_utc(doc[field])
+            except ValueError:
+                logger.warning("Unparseable %s.%s on %s: %r", collection, field, doc["_id"], doc[field])
+    if collection == "health_metrics" and "value_num" not in doc:
+        changes.update(parse_metric_value(doc.get("metric_type", ""), doc.get("value", "")))
+    return changes
+
+
+def _pending_filter(collection: str) -> dict:
+    clauses = [{field: {"$type": "string"}} for field in DATETIME_FIELDS[collection]]
+    if collection == "health_metrics":
+        clauses.append({"value_num": {"$exists": False}})
+    return {"$or": clauses}
+
+
+async def migrate_native_types(db, batch_size: int = 1000, restart: bool = False) -> dict:
+    """Run the migration; returns the number of documents updated per collection."""
+    state = await db.migrations.find_one({"_id": MIGRATION_ID}) or {}
+    checkpoints = {} if restart else state.get("checkpoints", {})
+    updated = {}
+
+    for collection in DATETIME_FIELDS:
+        updated[collection] = 0
+        while True:
+            query = _pending_filter(collection)
+            if collection in checkpoints:
+                query = {"$and": [query, {"_id": {"$gt": checkpoints[collection]}}]}
+            batch = await db[collection].find(query).sort("_id", 1).limit(batch_size).to_list(batch_size)
+            if not batch:
+                break
+
+            ops = []
+            for doc in batch:
+                changes = _convert(collection, doc)
+                if changes:
+                    ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": changes}))
+            if ops:
+                result = await db[collection].bulk_write(ops, ordered=False)
+                updated[collection] += result.modified_count
+
+            checkpoints[collection] = batch[-1]["_id"]
+            await db.migrations.update_one(
+                {"_id": MIGRATION_ID},
+                {"$set": {"checkpoints": checkpoints, "updated_at": datetime.now(timezone.utc)}},
+                upsert=True,
+            )
+        logger.info("Migrated %d %s documents", updated[collection], collection)
+
+    await db.migrations.update_one(
+        {"_id": MIGRATION_ID},
+        {"$set": {"completed_at": datetime.now(timezone.utc)}},
+        upsert=True,
+    )
+    return updated
+
+
+async def _main(args) -> int:
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from pathlib import Path
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True)
+    try:
+        updated = await migrate_native_types(client[os.environ['DB_NAME']], args.batch_size, args.restart)
+    finally:
+        client.close()
+    print(f"Updated {sum(updated.values())} documents: {updated}")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--restart", action="store_true")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
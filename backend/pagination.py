@@ -0,0 +1,84 @@
+"""Keyset pagination over (sort field, id).
+
+Each page is a range scan that starts right after the last document of the
+previous page, so deep pages cost the same as the first one. Cursors are
+opaque base64url tokens carrying the last (sort value, id) pair as
+Extended JSON, so datetime sort keys round-trip as BSON dates.
+"""
+import base64
+from datetime import datetime
+from typing import Generic, List, Optional, Tuple, TypeVar
+
+from bson import json_util
+from bson.errors import BSONError
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+T = TypeVar("T")
+
+MAX_PAGE_SIZE = 200
+# What the routes sort on: created_at / scheduled_time, search scores
+SORT_TYPES = (datetime, int, float)
+_JSON_OPTIONS = json_util.JSONOptions(tz_aware=True)
+
+
+class Page(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None
+
+
+def encode_cursor(sort_value, doc_id: str) -> str:
+    raw = json_util.dumps([sort_value, doc_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_types: tuple = SORT_TYPES) -> Tuple[object, str]:
+    """(sort value, id) from a cursor; 400 unless the sort value is one of ``sort_types``.
+
+    Cursors come back from clients, so anything but a plain scalar (an
+    operator document, an ObjectId that does not parse) is rejected here
+    instead of reaching the query.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, doc_id = json_util.loads(base64.urlsafe_b64decode(padded), json_options=_JSON_OPTIONS)
+    except (ValueError, TypeError, BSONError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if isinstance(sort_value, bool) or not isinstance(sort_value, sort_types) or not isinstance(doc_id, str):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return sort_value, doc_id
+
+
+def after_position(query: dict, sort_field: str, direction: int, last_value, last_id: str) -> dict:
+    """``query`` narrowed to documents after (last_value, last_id) in (sort_field, id) order."""
+    op = "$gt" if direction == 1 else "$lt"
+    return {
+        **query,
+        "$or": [
+            {sort_field: {op: last_value}},
+            {sort_field: last_value, "id": {op: last_id}},
+        ],
+    }
+
+
+async def keyset_page(collection, query: dict, sort_field: str, direction: int,
+                      cursor: Optional[str], limit: int, projection: Optional[dict] = None) -> Tuple[list, Optional[str]]:
+    """Fetch one page sorted by (sort_field, id) in ``direction`` (1 or -1).
+
+    A ``projection`` must keep ``sort_field`` and ``id``, which the cursor is built from.
+    """
+    if cursor:
+        last_value, last_id = decode_cursor(cursor)
+        query = after_position(query, sort_field, direction, last_value, last_id)
+
+    # One extra row tells us whether another page exists
+    docs = await collection.find(query, projection or {"_id": 0}) \
+        .sort([(sort_field, direction), ("id", direction)]) \
+        .limit(limit + 1) \
+        .to_list(limit + 1)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1][sort_field], docs[-1]["id"])
+    return docs, next_cursor
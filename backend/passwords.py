@@ -0,0 +1,108 @@
+import asyncio
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+import bcrypt
+
+
+class PasswordServiceBusy(Exception):
+    """Raised when the hashing queue is full; callers should answer 503."""
+
+
+# Module-level so they can be pickled into a process pool
+def _hash(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _verify(password: str, hashed: str) -> bool:
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+
+class PasswordHasher:
+    """Runs bcrypt on a bounded worker pool so it never blocks the event loop.
+
+    At most ``workers`` hashes run at once; up to ``max_queue`` more wait their
+    turn, and anything beyond that is rejected with PasswordServiceBusy.
+    """
+
+    def __init__(self, mode: str = "thread", workers: int = 4, max_queue: int = 100, rounds: int = 12):
+        self.mode = mode
+        self.workers = workers
+        self.max_queue = max_queue
+        self.rounds = rounds
+        self._executor: Optional[Executor] = None
+        self._slots = asyncio.Semaphore(workers)
+        self.in_flight = 0
+        self.queued = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.run_seconds_total = 0.0
+
+    @classmethod
+    def from_env(cls) -> "PasswordHasher":
+        return cls(
+            mode=os.environ.get('PASSWORD_HASH_EXECUTOR', 'thread'),
+            workers=int(os.environ.get('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1))),
+            max_queue=int(os.environ.get('PASSWORD_HASH_MAX_QUEUE', '100')),
+            rounds=int(os.environ.get('PASSWORD_HASH_ROUNDS', '12')),
+        )
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.mode == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                # bcrypt releases the GIL, so threads scale across cores
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _run(self, fn, *args):
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise PasswordServiceBusy("Password hashing queue is full")
+
+        enqueued_at = time.perf_counter()
+        self.queued += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queued -= 1
+
+        started_at = time.perf_counter()
+        self.wait_seconds_total += started_at - enqueued_at
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self.run_seconds_total += time.perf_counter() - started_at
+            self._slots.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password, self.rounds)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(_verify, password, hashed)
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "wait_seconds_total": self.wait_seconds_total,
+            "run_seconds_total": self.run_seconds_total,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
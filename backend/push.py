@@ -0,0 +1,316 @@
+"""WebSocket push channel: one connection per browser tab, carrying everything
+the server wants to tell a user without being asked.
+
+Frames are JSON text, each with a ``type``. The client's first frame must be
+``{"type": "auth", "token": "<JWT>"}`` (browsers cannot set headers on a
+WebSocket), sent within ``auth_timeout`` seconds. The server answers
+``{"type": "ready"}`` and from then on may send:
+
+    {"type": "ping"}                                   answer with {"type": "pong"}
+    {"type": "reminder", "reminder": {...}}            a reminder went off
+    {"type": "job", "job": {...}}                      an ?async=true job finished
+    {"type": "changed", "collections": ["reminders"]}  refetch (revalidate) these lists
+    {"type": "delta" | "done" | "error", "request_id": ...}
+                                                       a chat reply the client asked for with
+                                                       {"type": "chat", "request_id": ..., "message": ...}
+
+Each connection has a bounded send queue drained by its own task. Broadcast
+events never wait for space. If a queue is full, the client is not reading,
+and the connection is closed with 1013 so it reconnects and revalidates.
+Chat replies do wait for space, which slows the model stream to the
+client's pace.
+
+One sweep every ``heartbeat`` seconds pings every connection. It closes
+those silent for ``idle_timeout`` (4408) and those whose token has expired
+(4401), so a connection needs no timer of its own.
+
+Connections live in the worker that accepted them. Without a relay,
+``publish`` reaches only this worker's connections. With MongoRelay
+(PUSH_RELAY=mongo), every worker tails a capped collection and delivers to
+its own connections, so a reminder fired by one worker reaches the user's
+tabs on all of them.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+import orjson
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid
+from starlette.websockets import WebSocket, WebSocketDisconnect, WebSocketState
+
+logger = logging.getLogger(__name__)
+
+CLOSE_GOING_AWAY = 1001
+CLOSE_UNSUPPORTED = 1003
+CLOSE_TRY_AGAIN = 1013  # send queue full
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_IDLE = 4408
+
+
+class Connection:
+    __slots__ = ("websocket", "user_id", "expires_at", "last_seen", "queue", "sender", "tasks", "close_code")
+
+    def __init__(self, websocket: WebSocket, user_id: str, expires_at: Optional[float], queue_size: int):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.expires_at = expires_at
+        self.last_seen = time.monotonic()
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.sender: Optional[asyncio.Task] = None
+        self.tasks: Set[asyncio.Task] = set()
+        self.close_code: Optional[int] = None
+
+    def offer(self, event: dict) -> bool:
+        """Queue ``event`` without waiting; False if the queue is full."""
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def send(self, event: dict):
+        """Queue ``event``, waiting for space (backpressure for request streams)."""
+        await self.queue.put(event)
+
+    def spawn(self, coro: Awaitable):
+        """Run a request handler for as long as the connection lives."""
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def close(self, code: int):
+        # The sender closes the socket when it is cancelled with a close code
+        if self.close_code is None:
+            self.close_code = code
+            self.sender.cancel()
+
+
+class PushHub:
+    def __init__(self, queue_size: int = 256, heartbeat: float = 25.0, idle_timeout: float = 75.0,
+                 auth_timeout: float = 10.0, relay: Optional["MongoRelay"] = None):
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self.idle_timeout = idle_timeout
+        self.auth_timeout = auth_timeout
+        self.relay = relay
+        self._connections: Dict[str, Set[Connection]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.accepted = 0
+        self.rejected = 0
+        self.published = 0
+        self.evicted_slow = 0
+        self.evicted_idle = 0
+        self.expired = 0
+
+    @classmethod
+    def from_env(cls, db) -> "PushHub":
+        return cls(
+            queue_size=int(os.environ.get('PUSH_QUEUE_SIZE', '256')),
+            heartbeat=float(os.environ.get('PUSH_HEARTBEAT', '25')),
+            idle_timeout=float(os.environ.get('PUSH_IDLE_TIMEOUT', '75')),
+            relay=MongoRelay(db) if os.environ.get('PUSH_RELAY', 'local').lower() == 'mongo' else None,
+        )
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._sweep(), name="push-heartbeat")
+            if self.relay is not None:
+                self.relay.start(self.deliver)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.relay is not None:
+            await self.relay.stop()
+        for connection in self._all():
+            connection.close(CLOSE_GOING_AWAY)
+
+    def _all(self):
+        return [connection for connections in self._connections.values() for connection in connections]
+
+    async def serve(self, websocket: WebSocket, authenticate: Callable[[str], Awaitable[dict]],
+                    handle: Callable[[Connection, dict], Awaitable[None]]):
+        """Run one connection: authenticate it, then pass its client frames to ``handle``."""
+        await websocket.accept()
+        try:
+            first = await asyncio.wait_for(websocket.receive_json(), self.auth_timeout)
+            if not isinstance(first, dict) or first.get("type") != "auth":
+                raise ValueError("expected an auth frame")
+            claims = await authenticate(str(first.get("token", "")))
+        except WebSocketDisconnect:
+            return
+        except Exception:
+            # Timeout, bad JSON, or a token that does not verify
+            self.rejected += 1
+            await websocket.close(code=CLOSE_UNAUTHORIZED)
+            return
+
+        connection = Connection(websocket, claims["user_id"], claims.get("exp"), self.queue_size)
+        connection.sender = asyncio.create_task(self._send(connection))
+        self._connections.setdefault(connection.user_id, set()).add(connection)
+        self.accepted += 1
+        connection.offer({"type": "ready", "user_id": connection.user_id, "heartbeat": self.heartbeat})
+        try:
+            while True:
+                message = await websocket.receive_json()
+                connection.last_seen = time.monotonic()
+                if not isinstance(message, dict) or message.get("type") == "pong":
+                    continue
+                if message.get("type") == "ping":
+                    connection.offer({"type": "pong"})
+                    continue
+                await handle(connection, message)
+        except WebSocketDisconnect:
+            pass
+        except (ValueError, KeyError):
+            connection.close(CLOSE_UNSUPPORTED)  # not JSON, or a binary frame
+        finally:
+            connections = self._connections.get(connection.user_id)
+            if connections is not None:
+                connections.discard(connection)
+                if not connections:
+                    del self._connections[connection.user_id]
+            for task in connection.tasks:
+                task.cancel()
+            connection.close(CLOSE_GOING_AWAY)
+            await asyncio.gather(connection.sender, *connection.tasks, return_exceptions=True)
+
+    async def _send(self, connection: Connection):
+        websocket = connection.websocket
+        try:
+            while True:
+                event = await connection.queue.get()
+                await websocket.send_text(orjson.dumps(event, option=orjson.OPT_UTC_Z).decode("utf-8"))
+        except asyncio.CancelledError:
+            if websocket.application_state == WebSocketState.CONNECTED and websocket.client_state == WebSocketState.CONNECTED:
+                try:
+                    await websocket.close(code=connection.close_code or CLOSE_GOING_AWAY)
+                except Exception:
+                    pass  # the client went away first
+        except Exception:
+            pass  # the client went away; the receive loop cleans up
+
+    def publish(self, user_id: str, event: dict):
+        """Send ``event`` to every connection of the user, through the relay when there is one."""
+        self.published += 1
+        if self.relay is not None:
+            self.relay.publish(user_id, event)
+        else:
+            self.deliver(user_id, event)
+
+    def deliver(self, user_id: str, event: dict):
+        """Send ``event`` to the user's connections on this worker."""
+        for connection in list(self._connections.get(user_id, ())):
+            if connection.close_code is None and not connection.offer(event):
+                self.evicted_slow += 1
+                connection.close(CLOSE_TRY_AGAIN)
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            silent_since = time.monotonic() - self.idle_timeout
+            now = time.time()
+            for connection in self._all():
+                if connection.close_code is not None:
+                    continue  # closing; the receive loop unregisters it
+                if connection.last_seen < silent_since:
+                    self.evicted_idle += 1
+                    connection.close(CLOSE_IDLE)
+                elif connection.expires_at is not None and connection.expires_at <= now:
+                    self.expired += 1
+                    connection.close(CLOSE_UNAUTHORIZED)
+                elif not connection.offer({"type": "ping"}):
+                    self.evicted_slow += 1
+                    connection.close(CLOSE_TRY_AGAIN)
+
+    def stats(self) -> dict:
+        return {
+            "connections": sum(len(connections) for connections in self._connections.values()),
+            "users": len(self._connections),
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "published": self.published,
+            "evicted_slow": self.evicted_slow,
+            "evicted_idle": self.evicted_idle,
+            "expired": self.expired,
+            **(self.relay.stats() if self.relay is not None else {}),
+        }
+
+
+class MongoRelay:
+    """Fans published events out to every worker through a capped collection."""
+
+    def __init__(self, db, name: str = "push_events", size: int = 16 * 1024 * 1024):
+        self.db = db
+        self.name = name
+        self.size = size
+        self._deliver: Optional[Callable[[str, dict], None]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._writes = set()
+        self._recent = deque(maxlen=1000)  # ids seen, to skip them when a cursor restarts
+        self.relayed = 0
+        self.relay_errors = 0
+
+    def start(self, deliver: Callable[[str, dict], None]):
+        self._deliver = deliver
+        self._task = asyncio.create_task(self._tail(), name="push-relay")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await asyncio.gather(*self._writes, return_exceptions=True)
+
+    def publish(self, user_id: str, event: dict):
+        task = asyncio.create_task(self._write(user_id, event))
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    async def _write(self, user_id: str, event: dict):
+        try:
+            await self.db[self.name].insert_one({"user_id": user_id, "event": event, "at": datetime.now(timezone.utc)})
+        except Exception:
+            self.relay_errors += 1
+            logger.exception("Relaying a push event failed")
+
+    async def _ensure_collection(self):
+        try:
+            await self.db.create_collection(self.name, capped=True, size=self.size)
+        except CollectionInvalid:
+            pass  # another worker created it
+        # A tailable cursor on an empty capped collection dies at once
+        await self.db[self.name].update_one({"_id": "origin"}, {"$setOnInsert": {"at": datetime.min}}, upsert=True)
+
+    async def _tail(self):
+        since, ready = datetime.now(timezone.utc), False
+        while True:
+            try:
+                if not ready:
+                    await self._ensure_collection()
+                    ready = True
+                cursor = self.db[self.name].find({"at": {"$gte": since}}, cursor_type=CursorType.TAILABLE_AWAIT)
+                async for doc in cursor:
+                    since = doc["at"]
+                    if doc["_id"] in self._recent:
+                        continue
+                    self._recent.append(doc["_id"])
+                    self.relayed += 1
+                    self._deliver(doc["user_id"], doc["event"])
+                await asyncio.sleep(0.1)  # the cursor died; resume after the last event seen
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.relay_errors += 1
+                logger.exception("Push relay cursor failed")
+                await asyncio.sleep(1)
+
+    def stats(self) -> dict:
+        return {"relayed": self.relayed, "relay_errors": self.relay_errors}
@@ -0,0 +1,246 @@
+"""Per-user request rate limits and daily model token quotas.
+
+RateLimiter keeps a token bucket per rule and user: ``capacity`` requests in
+a burst, refilled at ``capacity / period`` per second. Buckets live in
+process memory by default, where a check is a dict lookup and some
+arithmetic (a few microseconds). With a ``shared`` collection each check is
+one atomic find_one_and_update instead, so every worker draws from the same
+bucket at the cost of a round trip; it is meant for the model routes, which
+take seconds anyway.
+
+TokenQuota meters the prompt and completion tokens the model API reports for
+each user per UTC day (``llm_usage``) and refuses new model calls once the
+day's allowance is spent. Totals are cached for ``cache_ttl`` seconds, so
+other workers' usage is seen that late.
+"""
+import asyncio
+import logging
+import math
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, NamedTuple, Optional
+
+from pymongo import ReturnDocument
+
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimited(Exception):
+    """Raised when a request is over its limit; ``headers`` belong on the 429 response."""
+    status_code = 429
+
+    def __init__(self, message: str, headers: Dict[str, str]):
+        super().__init__(message)
+        self.headers = headers
+
+
+class QuotaExceeded(RateLimited):
+    """The user's daily model token allowance is spent."""
+
+
+class RateLimit(NamedTuple):
+    capacity: int
+    period: float  # seconds to refill an empty bucket
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+    @classmethod
+    def parse(cls, spec: str) -> "RateLimit":
+        """``"20/60"``: bursts of 20 requests, refilled over 60 seconds."""
+        capacity, _, period = spec.partition("/")
+        return cls(int(capacity), float(period or 60))
+
+
+class Decision(NamedTuple):
+    allowed: bool
+    limit: int
+    tokens: float  # left in the bucket after this request
+    rate: float
+
+    def headers(self) -> Dict[str, str]:
+        # RateLimit-* as in the IETF httpapi draft; Reset is when the bucket is full again
+        headers = {
+            "RateLimit-Limit": str(self.limit),
+            "RateLimit-Remaining": str(int(self.tokens)),
+            "RateLimit-Reset": str(math.ceil((self.limit - self.tokens) / self.rate)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil((1 - self.tokens) / self.rate)))
+        return headers
+
+
+class RateLimiter:
+    def __init__(self, rules: Dict[str, RateLimit], shared=None, max_buckets: int = 100000):
+        self.rules = rules
+        self.shared = shared
+        # An idle bucket is full again after ``period``, so expiring it then loses nothing
+        self._buckets = {name: TTLCache(maxsize=max_buckets, ttl=rule.period) for name, rule in rules.items()}
+        self.allowed = 0
+        self.limited = 0
+        self.shared_errors = 0
+
+    @classmethod
+    def from_env(cls, collection) -> "RateLimiter":
+        rules = {
+            "chat": RateLimit.parse(os.environ.get('RATE_LIMIT_CHAT', '20/60')),
+            "symptoms": RateLimit.parse(os.environ.get('RATE_LIMIT_SYMPTOMS', '10/60')),
+        }
+        shared = collection if os.environ.get('RATE_LIMIT_STORE', 'memory').lower() == 'mongo' else None
+        return cls({name: rule for name, rule in rules.items() if rule.capacity > 0}, shared)
+
+    async def check(self, name: str, user_id: str) -> Optional[Decision]:
+        """Take one token from the user's ``name`` bucket; raises RateLimited when it is empty.
+
+        Returns None for rules that are not configured.
+        """
+        rule = self.rules.get(name)
+        if rule is None:
+            return None
+        if self.shared is not None:
+            decision = await self._take_shared(name, rule, user_id)
+        else:
+            decision = self._take_local(name, rule, user_id)
+        if not decision.allowed:
+            self.limited += 1
+            raise RateLimited("Too many requests, please slow down", decision.headers())
+        self.allowed += 1
+        return decision
+
+    def _take_local(self, name: str, rule: RateLimit, user_id: str) -> Decision:
+        buckets = self._buckets[name]
+        now = time.monotonic()
+        bucket = buckets.get(user_id)
+        if bucket is None:
+            tokens = float(rule.capacity)
+        else:
+            tokens = min(rule.capacity, bucket[0] + (now - bucket[1]) * rule.rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        buckets.set(user_id, (tokens, now))
+        return Decision(allowed, rule.capacity, tokens, rule.rate)
+
+    async def _take_shared(self, name: str, rule: RateLimit, user_id: str) -> Decision:
+        now = datetime.now(timezone.utc)
+        elapsed_ms = {"$max": [0, {"$subtract": [now, {"$ifNull": ["$updated_at", now]}]}]}
+        try:
+            doc = await self.shared.find_one_and_update(
+                {"_id": f"{name}:{user_id}"},
+                [
+                    {"$set": {"tokens": {"$min": [
+                        rule.capacity,
+                        {"$add": [{"$ifNull": ["$tokens", rule.capacity]}, {"$multiply": [elapsed_ms, rule.rate / 1000]}]},
+                    ]}}},
+                    {"$set": {"allowed": {"$gte": ["$tokens", 1]}, "updated_at": now, "expires_at": now + timedelta(seconds=rule.period)}},
+                    {"$set": {"tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", 1]}, "$tokens"]}}},
+                ],
+                projection={"_id": 0, "tokens": 1, "allowed": 1},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except Exception:
+            # Fail open: a limiter outage should not take the routes down with it
+            self.shared_errors += 1
+            logger.exception("Shared rate limit check failed for %s", name)
+            return Decision(True, rule.capacity, rule.capacity - 1, rule.rate)
+        return Decision(doc["allowed"], rule.capacity, doc["tokens"], rule.rate)
+
+    def stats(self) -> dict:
+        return {
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "buckets": sum(len(buckets) for buckets in self._buckets.values()),
+            "shared": self.shared is not None,
+            "shared_errors": self.shared_errors,
+        }
+
+
+def _utc_day(now: datetime) -> str:
+    return now.strftime("%Y-%m-%d")
+
+
+class TokenQuota:
+    def __init__(self, collection, daily_limit: int, cache_size: int = 10000, cache_ttl: float = 10.0):
+        self.collection = collection
+        self.daily_limit = daily_limit
+        self._totals = TTLCache(maxsize=cache_size, ttl=cache_ttl)  # (user_id, day) -> [tokens]
+        self._tasks = set()
+        self.exceeded = 0
+        self.metered_tokens = 0
+
+    @classmethod
+    def from_env(cls, collection) -> "TokenQuota":
+        return cls(
+            collection,
+            daily_limit=int(os.environ.get('LLM_DAILY_TOKEN_QUOTA', '200000')),
+            cache_ttl=float(os.environ.get('LLM_QUOTA_CACHE_TTL', '10')),
+        )
+
+    async def used(self, user_id: str, day: str) -> int:
+        entry = self._totals.get((user_id, day))
+        if entry is None:
+            doc = await self.collection.find_one({"_id": f"{user_id}:{day}"}, {"_id": 0, "total_tokens": 1})
+            entry = [doc["total_tokens"] if doc else 0]
+            self._totals.set((user_id, day), entry)
+        return entry[0]
+
+    async def check(self, user_id: str) -> Dict[str, str]:
+        """Headers describing today's allowance; raises QuotaExceeded once it is spent."""
+        if self.daily_limit <= 0:
+            return {}
+        now = datetime.now(timezone.utc)
+        used = await self.used(user_id, _utc_day(now))
+        midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc)
+        reset = math.ceil((midnight - now).total_seconds())
+        headers = {
+            "X-Token-Quota-Limit": str(self.daily_limit),
+            "X-Token-Quota-Remaining": str(max(0, self.daily_limit - used)),
+            "X-Token-Quota-Reset": str(reset),
+        }
+        if used >= self.daily_limit:
+            self.exceeded += 1
+            raise QuotaExceeded("Daily AI usage limit reached, try again tomorrow", {**headers, "Retry-After": str(reset)})
+        return headers
+
+    def record(self, user_id: str, usage):
+        """LLMGovernor usage listener: counts the call's tokens against the user's day."""
+        prompt, completion = usage.prompt_tokens or 0, usage.completion_tokens or 0
+        now = datetime.now(timezone.utc)
+        day = _utc_day(now)
+        entry = self._totals.get((user_id, day))
+        if entry is not None:
+            entry[0] += prompt + completion
+        self.metered_tokens += prompt + completion
+        task = asyncio.create_task(self._store(user_id, day, prompt, completion, now))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _store(self, user_id: str, day: str, prompt: int, completion: int, now: datetime):
+        try:
+            await self.collection.update_one(
+                {"_id": f"{user_id}:{day}"},
+                {
+                    "$inc": {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion, "calls": 1},
+                    "$setOnInsert": {"user_id": user_id, "day": day, "expires_at": now + timedelta(days=35)},
+                },
+                upsert=True,
+            )
+        except Exception:
+            logger.exception("Recording token usage for %s failed", user_id)
+
+    async def close(self):
+        # Let pending usage writes land rather than dropping them
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "daily_limit": self.daily_limit,
+            "exceeded": self.exceeded,
+            "metered_tokens": self.metered_tokens,
+            "pending_writes": len(self._tasks),
+        }
@@ -0,0 +1,199 @@
+"""In-process scheduler that fires due reminders and rolls recurring ones forward.
+
+Each worker keeps a min-heap of reminders due within a short look-ahead
+window, refilled from the ``due_scheduled`` index rather than by scanning
+the collection. Before firing, a worker claims a lease on the reminder
+with find_one_and_update, so when several uvicorn workers run the same
+scheduler each occurrence fires exactly once; a lease left behind by a
+crashed worker expires and the reminder is picked up again. Occurrences
+missed by more than ``grace`` (e.g. while no worker was running) are
+skipped rather than delivered late.
+"""
+import asyncio
+import heapq
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+REPEAT_INTERVALS = {
+    "daily": timedelta(days=1),
+    "weekly": timedelta(weeks=1),
+}
+
+
+def next_occurrence(scheduled_time: datetime, repeat: str, now: datetime) -> Optional[datetime]:
+    """First occurrence strictly after ``now``; missed occurrences are skipped, not replayed."""
+    interval = REPEAT_INTERVALS.get(repeat)
+    if interval is None:
+        return None
+    if scheduled_time > now:
+        return scheduled_time + interval
+    missed = (now - scheduled_time) // interval + 1
+    return scheduled_time + interval * missed
+
+
+def due_filter(until: datetime) -> dict:
+    return {"completed": False, "fired_at": None, "scheduled_time": {"$lte": until}}
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class ReminderScheduler:
+    def __init__(self, collection, lookahead: timedelta = timedelta(minutes=5),
+                 refill_interval: float = 60.0, batch_limit: int = 10000,
+                 lease: timedelta = timedelta(seconds=60), grace: timedelta = timedelta(hours=1),
+                 clock: Callable[[], datetime] = utc_now):
+        self.collection = collection
+        self.lookahead = lookahead
+        self.refill_interval = refill_interval
+        self.batch_limit = batch_limit
+        self.lease = lease
+        self.grace = grace
+        self.clock = clock  # the time reminders are due against; tests pass their own
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.fired = 0
+        self.skipped = 0
+        self._heap: List[tuple] = []
+        self._queued: Dict[str, datetime] = {}
+        self._listeners: List[Callable[[dict], Awaitable[None]]] = []
+        self._stored_listeners: List[Callable[[dict], Awaitable[None]]] = []
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._horizon = datetime.min.replace(tzinfo=timezone.utc)
+
+    def subscribe(self, listener: Callable[[dict], Awaitable[None]]):
+        """Register an async callback that receives each fired reminder document."""
+        self._listeners.append(listener)
+
+    def subscribe_stored(self, listener: Callable[[dict], Awaitable[None]]):
+        """Register an async callback that receives each fired reminder once its new state is saved."""
+        self._stored_listeners.append(listener)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="reminder-scheduler")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def notify(self, reminder: dict):
+        """Tell the scheduler about a created or rescheduled reminder."""
+        scheduled_time = reminder["scheduled_time"]
+        if scheduled_time.tzinfo is None:
+            scheduled_time = scheduled_time.replace(tzinfo=timezone.utc)
+        if scheduled_time <= self._horizon:
+            self._push(reminder["id"], scheduled_time)
+            self._wake.set()
+
+    def _push(self, reminder_id: str, scheduled_time: datetime):
+        if self._queued.get(reminder_id) == scheduled_time:
+            return
+        self._queued[reminder_id] = scheduled_time
+        heapq.heappush(self._heap, (scheduled_time, reminder_id))
+
+    async def _refill(self):
+        now = self.clock()
+        self._horizon = now + self.lookahead
+        cursor = self.collection.find(due_filter(self._horizon), {"_id": 0, "id": 1, "scheduled_time": 1}) \
+            .sort("scheduled_time", 1).limit(self.batch_limit)
+        async for doc in cursor:
+            self._push(doc["id"], doc["scheduled_time"])
+
+    async def _run(self):
+        next_refill = 0.0
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                if loop.time() >= next_refill or not self._heap:
+                    await self._refill()
+                    next_refill = loop.time() + self.refill_interval
+                await self._fire_due()
+
+                timeout = max(0.0, next_refill - loop.time())
+                if self._heap:
+                    timeout = min(timeout, (self._heap[0][0] - self.clock()).total_seconds())
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=max(timeout, 0.0))
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Reminder scheduler iteration failed")
+                await asyncio.sleep(5)
+
+    async def run_once(self):
+        """Refill from the collection and fire whatever is due, as the loop does on each refill."""
+        await self._refill()
+        await self._fire_due()
+
+    async def _fire_due(self):
+        now = self.clock()
+        while self._heap and self._heap[0][0] <= now:
+            scheduled_time, reminder_id = heapq.heappop(self._heap)
+            if self._queued.get(reminder_id) != scheduled_time:
+                continue  # superseded by a newer entry
+            del self._queued[reminder_id]
+            await self._fire(reminder_id, scheduled_time)
+
+    async def _fire(self, reminder_id: str, scheduled_time: datetime):
+        now = self.clock()
+        reminder = await self.collection.find_one_and_update(
+            {
+                "id": reminder_id,
+                "scheduled_time": scheduled_time,
+                "completed": False,
+                "fired_at": None,
+                "$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}],
+            },
+            {"$set": {"lease_owner": self.worker_id, "lease_until": now + self.lease}},
+            projection={"_id": 0, "lease_owner": 0, "lease_until": 0},
+            return_document=ReturnDocument.BEFORE,
+        )
+        if reminder is None:
+            return  # completed, deleted, rescheduled, or claimed by another worker
+
+        late = now - scheduled_time > self.grace
+        for listener in [] if late else self._listeners:
+            try:
+                await listener(reminder)
+            except Exception:
+                logger.exception("Reminder listener failed for %s", reminder_id)
+
+        update = {"$unset": {"lease_owner": "", "lease_until": ""}, "$set": {"last_fired_at": now}}
+        following = next_occurrence(scheduled_time, reminder.get("repeat", "none"), now)
+        if following is not None:
+            update["$set"]["scheduled_time"] = following
+        else:
+            update["$set"]["fired_at"] = now
+        await self.collection.update_one({"id": reminder_id, "lease_owner": self.worker_id}, update)
+        for listener in self._stored_listeners:
+            try:
+                await listener(reminder)
+            except Exception:
+                logger.exception("Reminder listener failed for %s", reminder_id)
+        if late:
+            self.skipped += 1
+            logger.info("Skipped reminder %s missed since %s", reminder_id, scheduled_time.isoformat())
+        else:
+            self.fired += 1
+            logger.info("Fired reminder %s for user %s", reminder_id, reminder.get("user_id"))
+
+    def stats(self) -> dict:
+        return {"queued": len(self._queued), "fired": self.fired, "skipped": self.skipped, "worker_id": self.worker_id}
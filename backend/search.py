@@ -0,0 +1,181 @@
+"""Full-text search over a user's chat messages and symptom reports.
+
+Each collection has one MongoDB text index, prefixed with ``user_id``
+(``user_text`` in indexes.py). With that prefix a search reads only the
+index keys of the user's own documents that contain the query's terms,
+whatever the total collection size. Scoring and sorting happen in the
+database and return only (id, score) pairs. Text fields are then fetched by
+id for the page being returned, and snippets are cut from them here.
+
+Results are ranked by (text score, id), highest first, across both
+collections. Pages are keyset pages over that order, like the list routes
+(see pagination.py). Each query therefore skips the hits already returned
+instead of counting past them. Scores from the two collections come from
+different weightings, so mixing them is only approximate.
+"""
+import asyncio
+import re
+from datetime import datetime
+from typing import Dict, Iterable, List, Literal, Optional, Pattern, Tuple
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+from pymongo.errors import OperationFailure
+
+from pagination import after_position, decode_cursor, encode_cursor
+
+# kind -> (collection, searchable fields in index weight order, extra fields for hits)
+SEARCH_SOURCES = {
+    "chat": ("chat_messages", ("message", "response"), ("session_id",)),
+    "symptoms": ("symptom_reports", ("symptoms", "analysis"), ()),
+}
+SEARCH_KINDS = tuple(SEARCH_SOURCES)
+
+MAX_QUERY_LENGTH = 200
+SNIPPET_CHARS = 160
+INDEX_NOT_FOUND = 27
+
+# A subset of the stop words the english text index ignores; they are not highlighted either
+STOP_WORDS = frozenset(
+    "a an and are as at be but by for from has have i in is it my of on or so that the this to was were with".split()
+)
+_QUERY_TERM = re.compile(r'"([^"]*)"|(\S+)')
+_WORD = re.compile(r"\w+")
+
+
+class SearchHit(BaseModel):
+    kind: Literal["chat", "symptoms"]
+    id: str
+    session_id: Optional[str] = None  # chat hits: the conversation to open
+    created_at: datetime
+    score: float
+    field: str  # the field the snippet was cut from
+    snippet: str
+    highlights: List[Tuple[int, int]] = []  # [start, end) character offsets of matched words in snippet
+
+
+def query_terms(q: str) -> List[str]:
+    """Lower-cased words the query asks for, from quoted phrases too; negated words are left out."""
+    terms = []
+    for phrase, word in _QUERY_TERM.findall(q):
+        if word.startswith("-"):
+            continue
+        for term in _WORD.findall((phrase or word).lower()):
+            if term not in STOP_WORDS and term not in terms:
+                terms.append(term)
+    return terms
+
+
+def _stem(term: str) -> str:
+    # The index matches stems (headache, headaches, ...). A rough suffix strip is
+    # enough to find the words it matched; the ranking itself is Mongo's.
+    for suffix in ("ing", "ed", "es", "s"):
+        if term.endswith(suffix) and len(term) - len(suffix) >= 3:
+            return term[:-len(suffix)]
+    return term
+
+
+def highlighter(terms: Iterable[str]) -> Optional[Pattern]:
+    stems = sorted({_stem(term) for term in terms}, key=len, reverse=True)
+    if not stems:
+        return None
+    return re.compile(r"\b(?:" + "|".join(map(re.escape, stems)) + r")\w*", re.IGNORECASE)
+
+
+def make_snippet(text: str, pattern: Optional[Pattern], width: int = SNIPPET_CHARS) -> Tuple[str, List[Tuple[int, int]]]:
+    """About ``width`` characters of ``text`` around its first match, with the offsets of the matches in it."""
+    matches = list(pattern.finditer(text)) if pattern else []
+    first = matches[0].start() if matches else 0
+    start = max(0, first - width // 4)
+    if start > 0:
+        # Begin on a word, unless that would cut off the match
+        space = text.find(" ", start, first)
+        start = space + 1 if space != -1 else start
+    end = min(len(text), start + width)
+    if end < len(text):
+        space = text.rfind(" ", matches[0].end() if matches else start, end)
+        end = space if space > start else end
+
+    prefix = "…" if start > 0 else ""
+    suffix = "…" if end < len(text) else ""
+    offset = len(prefix) - start
+    highlights = [(m.start() + offset, m.end() + offset) for m in matches if m.start() >= start and m.end() <= end]
+    return prefix + text[start:end] + suffix, highlights
+
+
+def _best_field(doc: dict, fields: Tuple[str, ...], pattern: Optional[Pattern]) -> str:
+    # Most matches wins; ties go to the earlier (more heavily weighted) field
+    counts = [len(pattern.findall(doc.get(field) or "")) if pattern else 0 for field in fields]
+    best = max(range(len(fields)), key=lambda i: (counts[i], -i))
+    if counts[best] == 0:
+        return next((field for field in fields if doc.get(field)), fields[0])
+    return fields[best]
+
+
+async def _ranked(collection, user_id: str, q: str, position: Optional[tuple], limit: int) -> List[dict]:
+    pipeline = [
+        {"$match": {"user_id": user_id, "$text": {"$search": q}}},
+        {"$project": {"_id": 0, "id": 1, "score": {"$meta": "textScore"}}},
+    ]
+    if position:
+        pipeline.append({"$match": after_position({}, "score", -1, *position)})
+    pipeline += [{"$sort": {"score": -1, "id": -1}}, {"$limit": limit}]
+    try:
+        return await collection.aggregate(pipeline).to_list(limit)
+    except OperationFailure as e:
+        if e.code == INDEX_NOT_FOUND:
+            raise HTTPException(status_code=503, detail="Search is unavailable until the search index is built")
+        raise
+
+
+async def search(db, user_id: str, q: str, kinds: Iterable[str] = SEARCH_KINDS,
+                 cursor: Optional[str] = None, limit: int = 20) -> Tuple[List[SearchHit], Optional[str]]:
+    """One page of the user's documents matching ``q`` (MongoDB $search syntax), best first."""
+    kinds = list(kinds)
+    position = decode_cursor(cursor) if cursor else None
+    # One extra row from each source tells us whether another page exists
+    ranked = await asyncio.gather(*(
+        _ranked(db[SEARCH_SOURCES[kind][0]], user_id, q, position, limit + 1) for kind in kinds
+    ))
+    merged = sorted(
+        ((row["score"], row["id"], kind) for kind, rows in zip(kinds, ranked) for row in rows),
+        reverse=True,
+    )
+    next_cursor = None
+    if len(merged) > limit:
+        merged = merged[:limit]
+        next_cursor = encode_cursor(merged[-1][0], merged[-1][1])
+
+    ids: Dict[str, List[str]] = {kind: [] for kind in kinds}
+    for _, doc_id, kind in merged:
+        ids[kind].append(doc_id)
+
+    async def fetch(kind: str) -> Dict[str, dict]:
+        if not ids[kind]:
+            return {}
+        collection, fields, extra = SEARCH_SOURCES[kind]
+        projection = {"_id": 0, "id": 1, "created_at": 1, **{field: 1 for field in fields + extra}}
+        docs = await db[collection].find({"id": {"$in": ids[kind]}, "user_id": user_id}, projection).to_list(None)
+        return {doc["id"]: doc for doc in docs}
+
+    docs = dict(zip(kinds, await asyncio.gather(*(fetch(kind) for kind in kinds))))
+    pattern = highlighter(query_terms(q))
+    hits = []
+    for score, doc_id, kind in merged:
+        doc = docs[kind].get(doc_id)
+        if doc is None:
+            continue  # deleted since it was ranked
+        fields = SEARCH_SOURCES[kind][1]
+        field = _best_field(doc, fields, pattern)
+        snippet, highlights = make_snippet(doc.get(field) or "", pattern)
+        hits.append(SearchHit(
+            kind=kind,
+            id=doc_id,
+            session_id=doc.get("session_id"),
+            created_at=doc["created_at"],
+            score=score,
+            field=field,
+            snippet=snippet,
+            highlights=highlights,
+        ))
+    return hits, next_cursor
@@ -0,0 +1,118 @@
+"""Time-series helpers for health metrics: bucketed rollups and LTTB downsampling."""
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Tuple
+
+BUCKETS = ("day", "week", "month")
+
+# Numeric field charted for each metric type unless the caller picks one
+DEFAULT_FIELDS = {"blood_pressure": "systolic"}
+SERIES_FIELDS = ("value_num", "systolic", "diastolic")
+
+
+def series_match(user_id: str, metric_type: str, field: str,
+                 start: Optional[datetime], end: Optional[datetime]) -> dict:
+    match = {"user_id": user_id, "metric_type": metric_type, field: {"$ne": None}}
+    if start or end:
+        match["created_at"] = {}
+        if start:
+            match["created_at"]["$gte"] = start
+        if end:
+            match["created_at"]["$lt"] = end
+    return match
+
+
+def bucket_pipeline(match: dict, field: str, bucket: str, tz: str) -> list:
+    """min/max/avg/count per calendar bucket, computed by the server ($dateTrunc, MongoDB 5.0+)."""
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": {"$dateTrunc": {"date": "$created_at", "unit": bucket, "timezone": tz, "startOfWeek": "monday"}},
+            "count": {"$sum": 1},
+            "min": {"$min": f"${field}"},
+            "max": {"$max": f"${field}"},
+            "avg": {"$avg": f"${field}"},
+        }},
+        {"$sort": {"_id": 1}},
+        {"$project": {"_id": 0, "t": "$_id", "count": 1, "min": 1, "max": 1, "avg": 1}},
+    ]
+
+
+async def _aiter(items):
+    for item in items:
+        yield item
+
+
+async def lttb(rows: AsyncIterator[Tuple[datetime, float, dict]], total: int, threshold: int) -> List[dict]:
+    """Largest-Triangle-Three-Buckets downsampling of ``total`` time-ordered rows.
+
+    Rows are ``(t, y, payload)`` and are consumed in a single pass while only
+    the current and next bucket are held in memory, so a Motor cursor over
+    years of readings can be downsampled without loading it.
+    Returns the payloads of the selected rows.
+    """
+    if threshold < 3 or total <= threshold:
+        return [payload async for _, _, payload in rows]
+
+    iterator = rows.__aiter__()
+    buffer = []
+    buffer_start = 1
+    exhausted = False
+
+    async def fill(until: int):
+        nonlocal exhausted, last
+        while not exhausted and buffer_start + len(buffer) < until:
+            try:
+                last = await iterator.__anext__()
+                buffer.append(last)
+            except StopAsyncIteration:
+                exhausted = True
+
+    try:
+        first = await iterator.__anext__()
+    except StopAsyncIteration:
+        return []
+    sampled = [first[2]]
+    a_x, a_y = first[0].timestamp(), first[1]
+    last = first
+    every = (total - 2) / (threshold - 2)
+
+    for i in range(threshold - 2):
+        range_start = int(i * every) + 1
+        range_end = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, total)
+        await fill(avg_end)
+
+        candidates = buffer[range_start - buffer_start:range_end - buffer_start]
+        following = buffer[range_end - buffer_start:avg_end - buffer_start]
+        if not candidates:
+            break
+        if following:
+            avg_x = sum(row[0].timestamp() for row in following) / len(following)
+            avg_y = sum(row[1] for row in following) / len(following)
+        else:
+            avg_x, avg_y = candidates[-1][0].timestamp(), candidates[-1][1]
+
+        best, best_area = candidates[0], -1.0
+        for row in candidates:
+            x = row[0].timestamp()
+            area = abs((a_x - avg_x) * (row[1] - a_y) - (a_x - x) * (avg_y - a_y))
+            if area > best_area:
+                best, best_area = row, area
+        sampled.append(best[2])
+        a_x, a_y = best[0].timestamp(), best[1]
+
+        del buffer[:range_end - buffer_start]
+        buffer_start = range_end
+
+    # Drain whatever is left; the final row is always kept
+    if not exhausted:
+        async for row in iterator:
+            last = row
+    if last is not first and last[2] is not sampled[-1]:
+        sampled.append(last[2])
+    return sampled
+
+
+async def lttb_list(points: List[dict], threshold: int, x: str = "t", y: str = "avg") -> List[dict]:
+    rows = _aiter((p[x], p[y], p) for p in points)
+    return await lttb(rows, len(points), threshold)
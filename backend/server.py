@@ -1,40 +1,81 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, Request, Response, WebSocket, status
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
-import os
+from pymongo.errors import DuplicateKeyError, OperationFailure
+import json
 import logging
-from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, ValidationError
+from typing import AsyncIterator, Dict, List, Literal, Optional
 import uuid
+import asyncio
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone, timedelta
-import bcrypt
-import jwt
-from openai import AsyncOpenAI
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from passwords import PasswordHasher, PasswordServiceBusy
+from tokens import TokenError, TokenVerifier
+from cache import TTLCache
+from analysis_cache import AnalysisCache, analysis_key
+from llm import LLMError, LLMGovernor
+from chat_context import ChatContextBuilder, count_tokens
+from jobs import Job, JobQueue
+from ratelimit import RateLimited, RateLimiter, TokenQuota
+import telemetry
+from indexes import ensure_indexes, explain_route_queries
+from pagination import MAX_PAGE_SIZE, Page, keyset_page
+from responses import model_projection, page_response
+from archive import HistoryArchive
+from export import export_events, gzip_stream, parse_resume
+from search import MAX_QUERY_LENGTH, SEARCH_KINDS, SearchHit, search
+from write_behind import WriteBehindBuffer
+from versions import CollectionVersions, etag_matches
+from push import Connection, PushHub
+from storage import parse_metric_value, to_utc
+from series import DEFAULT_FIELDS, bucket_pipeline, lttb, lttb_list, series_match
+from ingest import BulkIngestResult, MetricIngestor, ingest, iter_json_array, iter_ndjson
+from reminder_scheduler import ReminderScheduler, next_occurrence
+from settings import ROOT_DIR, Settings
 
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
+OPENAI_MODEL = "gpt-4o-mini"
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-
-# OpenAI client
-openai_client = AsyncOpenAI(api_key=os.environ['EMERGENT_LLM_KEY'])
+CHAT_SYSTEM_PROMPT = "You are a helpful AI health assistant. Provide informative, supportive health advice. Always remind users to consult healthcare professionals for serious concerns. Keep responses conversational and empathetic."
+SYMPTOM_SYSTEM_PROMPT = "You are a medical symptom analyzer. Provide helpful analysis but always emphasize consulting healthcare professionals."
+# Part of the analysis cache key: bump whenever SYMPTOM_SYSTEM_PROMPT or build_symptom_prompt changes
+SYMPTOM_PROMPT_VERSION = "1"
 
 # JWT Configuration
-JWT_SECRET = os.environ['JWT_SECRET']
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRATION_HOURS = 24 * 30
 
 security = HTTPBearer()
 
-# Create the main app
-app = FastAPI()
+# Opt-in orjson path for list routes (FAST_RESPONSES=validate|raw, see responses.py); set from Settings
+FAST_RESPONSES = "off"
+
+# Clients and components, built by build_services when the app starts: in the
+# worker process that serves it, inside its event loop, never at import time
+client = None
+db = None
+openai_client = None
+llm_governor: Optional[LLMGovernor] = None
+chat_context: Optional[ChatContextBuilder] = None
+token_verifier: Optional[TokenVerifier] = None
+user_cache: Optional[TTLCache] = None
+password_hasher: Optional[PasswordHasher] = None
+reminder_scheduler: Optional[ReminderScheduler] = None
+analysis_cache: Optional[AnalysisCache] = None
+job_queue: Optional[JobQueue] = None
+rate_limiter: Optional[RateLimiter] = None
+token_quota: Optional[TokenQuota] = None
+versions: Optional[CollectionVersions] = None
+write_buffer: Optional[WriteBehindBuffer] = None
+history_archive: Optional[HistoryArchive] = None
+push_hub: Optional[PushHub] = None
+
+JOB_PRIORITIES = {"symptoms": 10, "chat": 5}
+
 api_router = APIRouter(prefix="/api")
+internal_router = APIRouter()
 
 # Models
 class UserRegister(BaseModel):
@@ -53,6 +94,9 @@ class User(BaseModel):
     name: str
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class ProfileUpdate(BaseModel):
+    name: Optional[str] = Field(default=None, min_length=1)
+
 class TokenResponse(BaseModel):
     token: str
     user: User
@@ -88,6 +132,8 @@ class HealthMetricCreate(BaseModel):
     value: str
     unit: str
     notes: Optional[str] = None
+    created_at: Optional[datetime] = None  # reading time from a device sync; defaults to now
+    idempotency_key: Optional[str] = None  # client-supplied; retries with the same key are ignored
 
 class HealthMetric(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -97,8 +143,54 @@ class HealthMetric(BaseModel):
     value: str
     unit: str
     notes: Optional[str] = None
+    value_num: Optional[float] = None  # parsed from value; None for blood pressure
+    systolic: Optional[float] = None
+    diastolic: Optional[float] = None
+    idempotency_key: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class MetricSeriesPoint(BaseModel):
+    t: datetime
+    count: int = 1
+    min: float
+    max: float
+    avg: float
+
+class MetricSeries(BaseModel):
+    metric_type: str
+    field: str
+    bucket: Optional[str] = None
+    total: int  # readings in the requested range
+    points: List[MetricSeriesPoint]
+
+class LatestMetric(BaseModel):
+    id: str
+    metric_type: str
+    value: str
+    unit: str
+    value_num: Optional[float] = None
+    systolic: Optional[float] = None
+    diastolic: Optional[float] = None
+    created_at: datetime
+
+class UpcomingReminder(BaseModel):
+    id: str
+    reminder_type: str
+    title: str
+    scheduled_time: datetime
+    repeat: str = "none"
+
+class LatestSymptomReport(BaseModel):
+    id: str
+    symptoms: str
+    created_at: datetime
+
+class DashboardSummary(BaseModel):
+    latest_metrics: List[LatestMetric]  # newest reading of each metric type
+    metrics_today: Dict[str, int]  # readings per metric type since local midnight
+    upcoming_reminders: List[UpcomingReminder]
+    latest_symptom_report: Optional[LatestSymptomReport] = None
+
 class ReminderCreate(BaseModel):
     reminder_type: str  # medication or appointment
     title: str
@@ -116,43 +208,222 @@ class Reminder(BaseModel):
     scheduled_time: datetime
     repeat: str = "none"
     completed: bool = False
+    fired_at: Optional[datetime] = None  # set once a one-off reminder has gone off
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 # Auth Helper Functions
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+async def hash_password(password: str) -> str:
+    try:
+        return await password_hasher.hash(password)
+    except PasswordServiceBusy:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
 
-def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+async def verify_password(password: str, hashed: str) -> bool:
+    try:
+        return await password_hasher.verify(password, hashed)
+    except PasswordServiceBusy:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
 
 def create_token(user_id: str) -> str:
-    expiration = datetime.now(timezone.utc) + timedelta(hours=JWT_EXPIRATION_HOURS)
-    payload = {"user_id": user_id, "exp": expiration}
-    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+    return token_verifier.issue(user_id)
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
+async def get_token_claims(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
     try:
-        token = credentials.credentials
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        user_id = payload.get("user_id")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        return user_id
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.InvalidTokenError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+        return await token_verifier.verify(credentials.credentials)
+    except TokenError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+
+async def get_current_user(claims: dict = Depends(get_token_claims)) -> str:
+    return claims["user_id"]
+
+def ai_limits(name: str):
+    """Dependency for model routes: takes from the user's ``name`` bucket, then checks their token quota.
+
+    Returns the RateLimit-* and quota headers; routes returning their own Response must pass them on.
+    """
+    async def check_limits(response: Response, user_id: str = Depends(get_current_user)) -> Dict[str, str]:
+        try:
+            headers = await check_ai_limits(name, user_id)
+        except RateLimited as e:
+            raise HTTPException(status_code=e.status_code, detail=str(e), headers=e.headers)
+        response.headers.update(headers)
+        return headers
+    return check_limits
+
+async def check_ai_limits(name: str, user_id: str) -> Dict[str, str]:
+    """Rate limit and token quota headers for a model request; raises RateLimited."""
+    decision = await rate_limiter.check(name, user_id)
+    headers = decision.headers() if decision else {}
+    headers.update(await token_quota.check(user_id))
+    return headers
+
+def if_none_match(*names: str, period: Optional[int] = None):
+    """Dependency for list routes: answers 304 while If-None-Match matches the user's ``names`` versions.
+
+    ``period`` (seconds) also expires the ETag for lists that depend on the time of day. Returns
+    the ETag headers; routes returning their own Response must pass them on.
+    """
+    async def check_etag(request: Request, response: Response, user_id: str = Depends(get_current_user)) -> Dict[str, str]:
+        parts = [user_id, request.url.query]
+        if period:
+            parts.append(str(int(datetime.now(timezone.utc).timestamp() // period)))
+        etag = versions.etag(await versions.get(user_id), names, *parts)
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            raise HTTPException(status_code=304, headers=headers)
+        response.headers.update(headers)
+        return headers
+    return check_etag
 
 # Helper: call OpenAI
-async def call_openai(system_message: str, user_message: str) -> str:
-    response = await openai_client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
+async def call_openai(system_message: str, user_message: str, user_id: str) -> str:
+    return await llm_governor.complete(
+        [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": user_message},
+        ],
+        user_id,
+    )
+
+# Helper: stream OpenAI deltas as they arrive
+def stream_openai(system_message: str, user_message: str, user_id: str) -> AsyncIterator[str]:
+    return llm_governor.stream(
+        [
             {"role": "system", "content": system_message},
             {"role": "user", "content": user_message},
-        ]
+        ],
+        user_id,
+    )
+
+def llm_http_error(e: LLMError) -> HTTPException:
+    headers = {"Retry-After": str(e.retry_after)} if e.retry_after else None
+    return HTTPException(status_code=e.status_code, detail=str(e), headers=headers)
+
+def llm_error_event(e: LLMError) -> str:
+    return ndjson_event("error", detail=str(e), status=e.status_code, retry_after=e.retry_after)
+
+def build_symptom_prompt(data: SymptomCheckRequest) -> str:
+    prompt_text = f"Analyze these symptoms: {data.symptoms}"
+    if data.duration:
+        prompt_text += f" Duration: {data.duration}"
+    if data.severity:
+        prompt_text += f" Severity: {data.severity}"
+    prompt_text += "\n\nProvide: 1) Possible conditions 2) When to seek medical care 3) Self-care tips. Keep it concise and clear."
+    return prompt_text
+
+# Streaming responses are NDJSON: one {"type": "delta"} line per chunk, then a
+# final {"type": "done"} line carrying the saved document (or {"type": "error"}).
+def ndjson_event(event_type: str, **fields) -> str:
+    return json.dumps({"type": event_type, **fields}) + "\n"
+
+def ndjson_response(events: AsyncIterator[str], headers: Optional[Dict[str, str]] = None) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", **(headers or {})},
+    )
+
+# One page of a list route, serialized by FastAPI or by responses.page_response
+async def list_page(model, collection, query: dict, sort_field: str, direction: int,
+                    cursor: Optional[str], limit: int, headers: Optional[Dict[str, str]] = None,
+                    archived: bool = False):
+    raw = FAST_RESPONSES == "raw"
+    docs, next_cursor = await keyset_page(
+        collection, query, sort_field, direction, cursor, limit,
+        projection=model_projection(model) if raw else None,
+    )
+    if archived:
+        docs, next_cursor = await history_archive.merge_page(
+            docs, next_cursor, query["user_id"], collection.name, direction, cursor, limit,
+            session_id=query.get("session_id"),
+        )
+    if FAST_RESPONSES == "off":
+        return Page(items=docs, next_cursor=next_cursor)
+    return page_response(model, docs, next_cursor, raw=raw, headers=headers)
+
+def symptom_cache_key(data: SymptomCheckRequest) -> str:
+    return analysis_key(data.symptoms, data.duration, data.severity, OPENAI_MODEL, SYMPTOM_PROMPT_VERSION)
+
+# Returns (cached analysis or None, X-Cache header value)
+async def lookup_symptom_analysis(key: str, use_cache: bool):
+    if not use_cache:
+        analysis_cache.bypass()
+        return None, "BYPASS"
+    analysis = await analysis_cache.get(key)
+    return analysis, "HIT" if analysis is not None else "MISS"
+
+async def run_chat_turn(user_id: str, message: str, session_id: str, new_session: bool,
+                        message_id: Optional[str] = None) -> ChatMessageResponse:
+    context = await chat_context.load(user_id, session_id, new=new_session)
+    ai_response = await llm_governor.complete(chat_context.messages(context, CHAT_SYSTEM_PROMPT, message), user_id)
+    
+    chat_msg = ChatMessageResponse(
+        user_id=user_id,
+        session_id=session_id,
+        message=message,
+        response=ai_response
+    )
+    if message_id:
+        chat_msg.id = message_id
+    
+    msg_dict = chat_msg.model_dump()
+    await write_buffer.insert("chat_messages", msg_dict)
+    chat_context.record(context, user_id, session_id, msg_dict)
+    return chat_msg
+
+async def run_symptom_analysis(user_id: str, data: SymptomCheckRequest, use_cache: bool,
+                               report_id: Optional[str] = None):
+    key = symptom_cache_key(data)
+    analysis, cache_status = await lookup_symptom_analysis(key, use_cache)
+    if analysis is None:
+        analysis = await call_openai(
+            system_message=SYMPTOM_SYSTEM_PROMPT,
+            user_message=build_symptom_prompt(data),
+            user_id=user_id
+        )
+        await analysis_cache.set(key, analysis, OPENAI_MODEL)
+    
+    # Every request gets its own history row, cached or not
+    symptom_report = SymptomCheckResponse(
+        user_id=user_id,
+        symptoms=data.symptoms,
+        analysis=analysis
+    )
+    if report_id:
+        symptom_report.id = report_id
+    
+    report_dict = symptom_report.model_dump()
+    await write_buffer.insert("symptom_reports", report_dict)
+    return symptom_report, cache_status
+
+# Background jobs. The stored document takes the job's id, so a job re-run
+# after a crash returns what the first run stored instead of storing it twice.
+async def chat_job(job: dict) -> dict:
+    existing = await db.chat_messages.find_one({"id": job["id"]}, {"_id": 0})
+    if existing:
+        return ChatMessageResponse(**existing).model_dump(mode="json")
+    payload = job["payload"]
+    chat_msg = await run_chat_turn(job["user_id"], payload["message"], payload["session_id"], payload["new_session"], job["id"])
+    return chat_msg.model_dump(mode="json")
+
+async def symptoms_job(job: dict) -> dict:
+    existing = await db.symptom_reports.find_one({"id": job["id"]}, {"_id": 0})
+    if existing:
+        return SymptomCheckResponse(**existing).model_dump(mode="json")
+    payload = job["payload"]
+    report, _ = await run_symptom_analysis(job["user_id"], SymptomCheckRequest(**payload["request"]), payload["cache"], job["id"])
+    return report.model_dump(mode="json")
+
+async def enqueue_job(user_id: str, kind: str, payload: dict, headers: Optional[Dict[str, str]] = None) -> JSONResponse:
+    job = await job_queue.enqueue(user_id, kind, payload, priority=JOB_PRIORITIES[kind])
+    return JSONResponse(
+        status_code=202,
+        content=job.model_dump(mode="json"),
+        headers={"Location": f"/api/jobs/{job.id}", **(headers or {})},
     )
-    return response.choices[0].message.content
+
+ASYNC_QUERY = Query(False, alias="async", description="Queue the request and return a job to poll at /api/jobs/{id}")
+ARCHIVED_QUERY = Query(False, description="Also return history older than ARCHIVE_AFTER_DAYS, from the archive")
 
 # Auth Routes
 @api_router.post("/auth/register", response_model=TokenResponse)
@@ -163,134 +434,293 @@ async def register(user_data: UserRegister):
     
     user = User(email=user_data.email, name=user_data.name)
     user_dict = user.model_dump()
-    user_dict['created_at'] = user_dict['created_at'].isoformat()
-    user_dict['password_hash'] = hash_password(user_data.password)
+    user_dict['password_hash'] = await hash_password(user_data.password)
     
-    await db.users.insert_one(user_dict)
+    try:
+        await db.users.insert_one(user_dict)
+    except DuplicateKeyError:
+        # Lost a race with a concurrent registration for the same email
+        raise HTTPException(status_code=400, detail="Email already registered")
     token = create_token(user.id)
     return TokenResponse(token=token, user=user)
 
 @api_router.post("/auth/login", response_model=TokenResponse)
 async def login(credentials: UserLogin):
     user_doc = await db.users.find_one({"email": credentials.email}, {"_id": 0})
-    if not user_doc or not verify_password(credentials.password, user_doc['password_hash']):
+    if not user_doc or not await verify_password(credentials.password, user_doc['password_hash']):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    if isinstance(user_doc['created_at'], str):
-        user_doc['created_at'] = datetime.fromisoformat(user_doc['created_at'])
-    
     user = User(**{k: v for k, v in user_doc.items() if k != 'password_hash'})
     token = create_token(user.id)
     return TokenResponse(token=token, user=user)
 
+@api_router.post("/auth/logout")
+async def logout(credentials: HTTPAuthorizationCredentials = Depends(security), claims: dict = Depends(get_token_claims)):
+    await token_verifier.revoke(credentials.credentials, claims)
+    return {"message": "Logged out"}
+
 # AI Chat Routes
-@api_router.post("/chat/message", response_model=ChatMessageResponse)
-async def send_chat_message(data: ChatMessageCreate, user_id: str = Depends(get_current_user)):
+@api_router.post("/chat/message", response_model=ChatMessageResponse, responses={202: {"model": Job}})
+async def send_chat_message(
+    data: ChatMessageCreate,
+    run_async: bool = ASYNC_QUERY,
+    user_id: str = Depends(get_current_user),
+    limit_headers: Dict[str, str] = Depends(ai_limits("chat")),
+):
     session_id = data.session_id or str(uuid.uuid4())
+    if run_async:
+        payload = {"message": data.message, "session_id": session_id, "new_session": data.session_id is None}
+        return await enqueue_job(user_id, "chat", payload, limit_headers)
     
     try:
-        ai_response = await call_openai(
-            system_message="You are a helpful AI health assistant. Provide informative, supportive health advice. Always remind users to consult healthcare professionals for serious concerns. Keep responses conversational and empathetic.",
-            user_message=data.message
-        )
-        
+        return await run_chat_turn(user_id, data.message, session_id, data.session_id is None)
+    except LLMError as e:
+        raise llm_http_error(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"AI service error: {str(e)}")
+
+@api_router.post("/chat/message/stream")
+async def stream_chat_message(
+    data: ChatMessageCreate,
+    user_id: str = Depends(get_current_user),
+    limit_headers: Dict[str, str] = Depends(ai_limits("chat")),
+):
+    session_id = data.session_id or str(uuid.uuid4())
+    events = chat_stream_events(user_id, data.message, session_id, data.session_id is None)
+    return ndjson_response((json.dumps(event) + "\n" async for event in events), headers=limit_headers)
+
+# A streamed chat turn as {"type": ...} events, for the NDJSON route and the push channel
+async def chat_stream_events(user_id: str, message: str, session_id: str, new_session: bool) -> AsyncIterator[dict]:
+    parts = []
+    try:
+        context = await chat_context.load(user_id, session_id, new=new_session)
+        messages = chat_context.messages(context, CHAT_SYSTEM_PROMPT, message)
+        async for delta in llm_governor.stream(messages, user_id):
+            parts.append(delta)
+            yield {"type": "delta", "content": delta}
+
         chat_msg = ChatMessageResponse(
             user_id=user_id,
             session_id=session_id,
-            message=data.message,
-            response=ai_response
+            message=message,
+            response="".join(parts)
         )
-        
+
         msg_dict = chat_msg.model_dump()
-        msg_dict['created_at'] = msg_dict['created_at'].isoformat()
-        await db.chat_messages.insert_one(msg_dict)
-        
-        return chat_msg
+        await write_buffer.insert("chat_messages", msg_dict)
+        chat_context.record(context, user_id, session_id, msg_dict)
+
+        yield {"type": "done", "message": chat_msg.model_dump(mode="json")}
+    except LLMError as e:
+        logger.warning("Chat stream failed: %s", e)
+        yield {"type": "error", "detail": str(e), "status": e.status_code, "retry_after": e.retry_after}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"AI service error: {str(e)}")
+        logger.exception("Chat stream failed")
+        yield {"type": "error", "detail": f"AI service error: {str(e)}"}
 
-@api_router.get("/chat/history", response_model=List[ChatMessageResponse])
-async def get_chat_history(session_id: Optional[str] = None, user_id: str = Depends(get_current_user)):
+@api_router.get("/chat/history", response_model=Page[ChatMessageResponse])
+async def get_chat_history(
+    session_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    archived: bool = ARCHIVED_QUERY,
+    user_id: str = Depends(get_current_user),
+    etag_headers: Dict[str, str] = Depends(if_none_match("chat_messages")),
+):
     query = {"user_id": user_id}
     if session_id:
         query["session_id"] = session_id
     
-    messages = await db.chat_messages.find(query, {"_id": 0}).sort("created_at", 1).to_list(100)
-    
-    for msg in messages:
-        if isinstance(msg['created_at'], str):
-            msg['created_at'] = datetime.fromisoformat(msg['created_at'])
-    
-    return messages
+    return await list_page(ChatMessageResponse, db.chat_messages, query, "created_at", 1, cursor, limit, etag_headers, archived)
 
 # Symptom Checker
-@api_router.post("/symptoms/analyze", response_model=SymptomCheckResponse)
-async def analyze_symptoms(data: SymptomCheckRequest, user_id: str = Depends(get_current_user)):
+@api_router.post("/symptoms/analyze", response_model=SymptomCheckResponse, responses={202: {"model": Job}})
+async def analyze_symptoms(
+    data: SymptomCheckRequest,
+    response: Response,
+    cache: bool = Query(True, description="Set to false to skip cached analyses and ask the model again"),
+    run_async: bool = ASYNC_QUERY,
+    user_id: str = Depends(get_current_user),
+    limit_headers: Dict[str, str] = Depends(ai_limits("symptoms")),
+):
+    if run_async:
+        return await enqueue_job(user_id, "symptoms", {"request": data.model_dump(), "cache": cache}, limit_headers)
+    
     try:
-        prompt_text = f"Analyze these symptoms: {data.symptoms}"
-        if data.duration:
-            prompt_text += f" Duration: {data.duration}"
-        if data.severity:
-            prompt_text += f" Severity: {data.severity}"
-        prompt_text += "\n\nProvide: 1) Possible conditions 2) When to seek medical care 3) Self-care tips. Keep it concise and clear."
-        
-        analysis = await call_openai(
-            system_message="You are a medical symptom analyzer. Provide helpful analysis but always emphasize consulting healthcare professionals.",
-            user_message=prompt_text
-        )
-        
-        symptom_report = SymptomCheckResponse(
-            user_id=user_id,
-            symptoms=data.symptoms,
-            analysis=analysis
-        )
-        
-        report_dict = symptom_report.model_dump()
-        report_dict['created_at'] = report_dict['created_at'].isoformat()
-        await db.symptom_reports.insert_one(report_dict)
-        
+        symptom_report, response.headers["X-Cache"] = await run_symptom_analysis(user_id, data, cache)
         return symptom_report
+    except LLMError as e:
+        raise llm_http_error(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis error: {str(e)}")
 
-@api_router.get("/symptoms/history", response_model=List[SymptomCheckResponse])
-async def get_symptom_history(user_id: str = Depends(get_current_user)):
-    reports = await db.symptom_reports.find({"user_id": user_id}, {"_id": 0}).sort("created_at", -1).to_list(50)
-    
-    for report in reports:
-        if isinstance(report['created_at'], str):
-            report['created_at'] = datetime.fromisoformat(report['created_at'])
-    
-    return reports
+@api_router.post("/symptoms/analyze/stream")
+async def stream_symptom_analysis(
+    data: SymptomCheckRequest,
+    cache: bool = Query(True, description="Set to false to skip cached analyses and ask the model again"),
+    user_id: str = Depends(get_current_user),
+    limit_headers: Dict[str, str] = Depends(ai_limits("symptoms")),
+):
+    key = symptom_cache_key(data)
+    cached, cache_status = await lookup_symptom_analysis(key, cache)
+
+    async def events():
+        parts = []
+        try:
+            if cached is not None:
+                parts.append(cached)
+                yield ndjson_event("delta", content=cached)
+            else:
+                async for delta in stream_openai(SYMPTOM_SYSTEM_PROMPT, build_symptom_prompt(data), user_id):
+                    parts.append(delta)
+                    yield ndjson_event("delta", content=delta)
+                await analysis_cache.set(key, "".join(parts), OPENAI_MODEL)
+
+            symptom_report = SymptomCheckResponse(
+                user_id=user_id,
+                symptoms=data.symptoms,
+                analysis="".join(parts)
+            )
+
+            report_dict = symptom_report.model_dump()
+            await write_buffer.insert("symptom_reports", report_dict)
+
+            yield ndjson_event("done", report=symptom_report.model_dump(mode="json"))
+        except LLMError as e:
+            logger.warning("Symptom analysis stream failed: %s", e)
+            yield llm_error_event(e)
+        except Exception as e:
+            logger.exception("Symptom analysis stream failed")
+            yield ndjson_event("error", detail=f"Analysis error: {str(e)}")
+
+    return ndjson_response(events(), headers={"X-Cache": cache_status, **limit_headers})
+
+@api_router.get("/symptoms/history", response_model=Page[SymptomCheckResponse])
+async def get_symptom_history(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    archived: bool = ARCHIVED_QUERY,
+    user_id: str = Depends(get_current_user),
+    etag_headers: Dict[str, str] = Depends(if_none_match("symptom_reports")),
+):
+    return await list_page(
+        SymptomCheckResponse, db.symptom_reports, {"user_id": user_id}, "created_at", -1, cursor, limit, etag_headers, archived,
+    )
+
+# Jobs
+@api_router.get("/jobs/{job_id}", response_model=Job)
+async def get_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, le=30, description="Seconds to wait for the job to finish before answering"),
+    user_id: str = Depends(get_current_user),
+):
+    job = await job_queue.wait(job_id, user_id, wait) if wait else await job_queue.get(job_id, user_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return Job(**job)
 
 # Health Metrics
 @api_router.post("/metrics", response_model=HealthMetric)
 async def add_health_metric(data: HealthMetricCreate, user_id: str = Depends(get_current_user)):
-    metric = HealthMetric(user_id=user_id, **data.model_dump())
-    metric_dict = metric.model_dump()
-    metric_dict['created_at'] = metric_dict['created_at'].isoformat()
-    await db.health_metrics.insert_one(metric_dict)
+    metric = HealthMetric(user_id=user_id, **data.model_dump(exclude_none=True), **parse_metric_value(data.metric_type, data.value))
+    metric.created_at = to_utc(metric.created_at)
+    doc = metric.model_dump()
+    if doc["idempotency_key"] is None:
+        del doc["idempotency_key"]  # keyless readings stay out of user_idempotency_key_unique
+    try:
+        await db.health_metrics.insert_one(doc)
+        await versions.bump(user_id, "health_metrics")
+    except DuplicateKeyError:
+        if data.idempotency_key is None:
+            raise
+        # A retry of an already stored reading: return the original
+        existing = await db.health_metrics.find_one(
+            {"user_id": user_id, "idempotency_key": data.idempotency_key}, {"_id": 0}
+        )
+        if not existing:
+            raise
+        return existing
     return metric
 
-@api_router.get("/metrics", response_model=List[HealthMetric])
-async def get_health_metrics(metric_type: Optional[str] = None, user_id: str = Depends(get_current_user)):
+# Bulk ingestion for device syncs: a JSON array, or NDJSON (one record per
+# line, Content-Type: application/x-ndjson) which is processed as it streams in.
+@api_router.post("/metrics/bulk", response_model=BulkIngestResult)
+async def bulk_add_health_metrics(request: Request, user_id: str = Depends(get_current_user)):
+    ingestor = MetricIngestor(db.health_metrics, user_id, HealthMetricCreate)
+    content_type = request.headers.get("content-type", "")
+    try:
+        if "ndjson" in content_type or "jsonl" in content_type:
+            return await ingest(iter_ndjson(request.stream()), ingestor)
+
+        try:
+            records = iter_json_array(await request.body())
+            return await ingest(records, ingestor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid bulk payload: {str(e)}")
+    finally:
+        # Batches stored before a failure count too
+        if ingestor.result.inserted:
+            await versions.bump(user_id, "health_metrics")
+
+@api_router.get("/metrics", response_model=Page[HealthMetric])
+async def get_health_metrics(
+    metric_type: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    user_id: str = Depends(get_current_user),
+    etag_headers: Dict[str, str] = Depends(if_none_match("health_metrics")),
+):
     query = {"user_id": user_id}
     if metric_type:
         query["metric_type"] = metric_type
     
-    metrics = await db.health_metrics.find(query, {"_id": 0}).sort("created_at", -1).to_list(100)
-    
-    for metric in metrics:
-        if isinstance(metric['created_at'], str):
-            metric['created_at'] = datetime.fromisoformat(metric['created_at'])
-    
-    return metrics
+    return await list_page(HealthMetric, db.health_metrics, query, "created_at", -1, cursor, limit, etag_headers)
+
+DEFAULT_SERIES_POINTS = 500
+MAX_SERIES_POINTS = 5000
+
+@api_router.get("/metrics/series", response_model=MetricSeries)
+async def get_metric_series(
+    metric_type: str,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    bucket: Optional[Literal["day", "week", "month"]] = None,
+    points: Optional[int] = Query(None, ge=3, le=MAX_SERIES_POINTS),
+    field: Optional[Literal["value_num", "systolic", "diastolic"]] = None,
+    tz: str = "UTC",
+    user_id: str = Depends(get_current_user),
+):
+    field = field or DEFAULT_FIELDS.get(metric_type, "value_num")
+    match = series_match(user_id, metric_type, field, to_utc(start), to_utc(end))
+
+    if bucket:
+        try:
+            buckets = await db.health_metrics.aggregate(bucket_pipeline(match, field, bucket, tz)).to_list(None)
+        except OperationFailure as e:
+            raise HTTPException(status_code=400, detail=f"Invalid series query: {str(e)}")
+        total = sum(b["count"] for b in buckets)
+        if points:
+            buckets = await lttb_list(buckets, points)
+        return MetricSeries(metric_type=metric_type, field=field, bucket=bucket, total=total, points=buckets)
+
+    # Raw readings, downsampled in one pass over the cursor
+    total = await db.health_metrics.count_documents(match)
+    cursor = db.health_metrics.find(match, {"_id": 0, "created_at": 1, field: 1}).sort("created_at", 1).batch_size(5000)
+
+    async def rows():
+        async for doc in cursor:
+            value = doc[field]
+            yield doc["created_at"], value, {"t": doc["created_at"], "min": value, "max": value, "avg": value}
+
+    sampled = await lttb(rows(), total, points or DEFAULT_SERIES_POINTS)
+    return MetricSeries(metric_type=metric_type, field=field, total=total, points=sampled)
 
 @api_router.delete("/metrics/{metric_id}")
 async def delete_health_metric(metric_id: str, user_id: str = Depends(get_current_user)):
     result = await db.health_metrics.delete_one({"id": metric_id, "user_id": user_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Metric not found")
+    await versions.bump(user_id, "health_metrics")
     return {"message": "Metric deleted"}
 
 # Reminders
@@ -298,62 +728,231 @@ async def delete_health_metric(metric_id: str, user_id: str = Depends(get_curren
 async def create_reminder(data: ReminderCreate, user_id: str = Depends(get_current_user)):
     reminder = Reminder(user_id=user_id, **data.model_dump())
     reminder_dict = reminder.model_dump()
-    reminder_dict['created_at'] = reminder_dict['created_at'].isoformat()
-    reminder_dict['scheduled_time'] = reminder_dict['scheduled_time'].isoformat()
+    reminder_dict['scheduled_time'] = to_utc(reminder_dict['scheduled_time'])
     await db.reminders.insert_one(reminder_dict)
+    await versions.bump(user_id, "reminders")
+    reminder_scheduler.notify(reminder_dict)
     return reminder
 
-@api_router.get("/reminders", response_model=List[Reminder])
-async def get_reminders(user_id: str = Depends(get_current_user)):
-    reminders = await db.reminders.find({"user_id": user_id}, {"_id": 0}).sort("scheduled_time", 1).to_list(100)
-    
-    for reminder in reminders:
-        if isinstance(reminder['created_at'], str):
-            reminder['created_at'] = datetime.fromisoformat(reminder['created_at'])
-        if isinstance(reminder['scheduled_time'], str):
-            reminder['scheduled_time'] = datetime.fromisoformat(reminder['scheduled_time'])
-    
-    return reminders
+@api_router.get("/reminders", response_model=Page[Reminder])
+async def get_reminders(
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    user_id: str = Depends(get_current_user),
+    etag_headers: Dict[str, str] = Depends(if_none_match("reminders")),
+):
+    return await list_page(Reminder, db.reminders, {"user_id": user_id}, "scheduled_time", 1, cursor, limit, etag_headers)
 
 @api_router.patch("/reminders/{reminder_id}/complete")
 async def complete_reminder(reminder_id: str, user_id: str = Depends(get_current_user)):
-    result = await db.reminders.update_one(
+    reminder = await db.reminders.find_one(
         {"id": reminder_id, "user_id": user_id},
-        {"$set": {"completed": True}}
+        {"_id": 0, "scheduled_time": 1, "repeat": 1, "last_fired_at": 1, "last_completed_at": 1}
     )
-    if result.matched_count == 0:
+    if not reminder:
         raise HTTPException(status_code=404, detail="Reminder not found")
-    return {"message": "Reminder completed"}
+
+    # Completing a recurring reminder acknowledges the current occurrence
+    # and moves it to the next one instead of retiring it. If the scheduler
+    # already rolled it forward after firing, the schedule stays as is.
+    now = datetime.now(timezone.utc)
+    scheduled_time = to_utc(reminder['scheduled_time'])
+    last_fired, last_completed = reminder.get('last_fired_at'), reminder.get('last_completed_at')
+    already_rolled = scheduled_time > now and last_fired and (not last_completed or last_fired > last_completed)
+    following = next_occurrence(scheduled_time, reminder.get('repeat', 'none'), now)
+    if following is not None and already_rolled:
+        following = scheduled_time
+
+    if following is None:
+        await db.reminders.update_one({"id": reminder_id, "user_id": user_id}, {"$set": {"completed": True}})
+        await versions.bump(user_id, "reminders")
+        return {"message": "Reminder completed"}
+
+    await db.reminders.update_one(
+        {"id": reminder_id, "user_id": user_id},
+        {"$set": {"scheduled_time": following, "last_completed_at": now}}
+    )
+    await versions.bump(user_id, "reminders")
+    reminder_scheduler.notify({"id": reminder_id, "scheduled_time": following})
+    return {"message": "Reminder completed", "next_scheduled_time": following}
 
 @api_router.delete("/reminders/{reminder_id}")
 async def delete_reminder(reminder_id: str, user_id: str = Depends(get_current_user)):
     result = await db.reminders.delete_one({"id": reminder_id, "user_id": user_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Reminder not found")
+    await versions.bump(user_id, "reminders")
     return {"message": "Reminder deleted"}
 
+# Dashboard
+@api_router.get("/dashboard/summary", response_model=DashboardSummary, response_model_exclude_none=True)
+async def get_dashboard_summary(
+    reminders: int = Query(3, ge=1, le=20),
+    tz: str = "UTC",
+    user_id: str = Depends(get_current_user),
+    # metrics_today rolls over at local midnight; every UTC offset is a multiple of 15 minutes
+    etag_headers: Dict[str, str] = Depends(if_none_match("health_metrics", "reminders", "symptom_reports", period=900)),
+):
+    try:
+        local_now = datetime.now(ZoneInfo(tz))
+    except (ZoneInfoNotFoundError, ValueError):
+        raise HTTPException(status_code=400, detail="Unknown time zone")
+    today_start = local_now.replace(hour=0, minute=0, second=0, microsecond=0).astimezone(timezone.utc)
+
+    # Independent index-backed queries, run concurrently. The latest-per-type
+    # $sort + $group/$first matches user_type_created_id, so MongoDB answers
+    # it with a DISTINCT_SCAN instead of reading every reading.
+    latest_pipeline = [
+        {"$match": {"user_id": user_id}},
+        {"$sort": {"user_id": 1, "metric_type": 1, "created_at": -1}},
+        {"$group": {"_id": "$metric_type", "doc": {"$first": "$$ROOT"}}},
+        {"$replaceRoot": {"newRoot": "$doc"}},
+        {"$sort": {"created_at": -1}},
+    ]
+    today_pipeline = [
+        {"$match": {"user_id": user_id, "created_at": {"$gte": today_start}}},
+        {"$group": {"_id": "$metric_type", "count": {"$sum": 1}}},
+    ]
+    latest, today, upcoming, last_report = await asyncio.gather(
+        db.health_metrics.aggregate(latest_pipeline).to_list(None),
+        db.health_metrics.aggregate(today_pipeline).to_list(None),
+        db.reminders.find(
+            {"user_id": user_id, "completed": False},
+            {"_id": 0, "id": 1, "reminder_type": 1, "title": 1, "scheduled_time": 1, "repeat": 1},
+        ).sort([("scheduled_time", 1), ("id", 1)]).limit(reminders).to_list(reminders),
+        db.symptom_reports.find_one(
+            {"user_id": user_id},
+            {"_id": 0, "id": 1, "symptoms": 1, "created_at": 1},
+            sort=[("created_at", -1), ("id", -1)],
+        ),
+    )
+
+    return DashboardSummary(
+        latest_metrics=latest,
+        metrics_today={row["_id"]: row["count"] for row in today},
+        upcoming_reminders=upcoming,
+        latest_symptom_report=last_report,
+    )
+
 # User Profile
 @api_router.get("/profile", response_model=User)
 async def get_profile(user_id: str = Depends(get_current_user)):
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+
     user_doc = await db.users.find_one({"id": user_id}, {"_id": 0, "password_hash": 0})
     if not user_doc:
         raise HTTPException(status_code=404, detail="User not found")
     
-    if isinstance(user_doc['created_at'], str):
-        user_doc['created_at'] = datetime.fromisoformat(user_doc['created_at'])
-    
-    return User(**user_doc)
+    user = User(**user_doc)
+    user_cache.set(user_id, user)
+    return user
 
-# Include router
-app.include_router(api_router)
+@api_router.patch("/profile", response_model=User)
+async def update_profile(data: ProfileUpdate, user_id: str = Depends(get_current_user)):
+    update = data.model_dump(exclude_none=True)
+    if update:
+        result = await db.users.update_one({"id": user_id}, {"$set": update})
+        # After the write: a get_profile racing it could otherwise cache the old document again
+        user_cache.pop(user_id)
+        if result.matched_count == 0:
+            raise HTTPException(status_code=404, detail="User not found")
+    return await get_profile(user_id)
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Search
+MAX_SEARCH_PAGE_SIZE = 100
+
+@api_router.get("/search", response_model=Page[SearchHit])
+async def search_history(
+    q: str = Query(..., min_length=1, max_length=MAX_QUERY_LENGTH, description='Words to find; "quoted phrases" and -excluded words work too'),
+    kind: Optional[Literal["chat", "symptoms"]] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=MAX_SEARCH_PAGE_SIZE),
+    user_id: str = Depends(get_current_user),
+):
+    hits, next_cursor = await search(db, user_id, q, [kind] if kind else SEARCH_KINDS, cursor, limit)
+    return Page(items=hits, next_cursor=next_cursor)
+
+# Push channel (see push.py)
+async def push_reminder(reminder: dict):
+    push_hub.publish(reminder["user_id"], {"type": "reminder", "reminder": Reminder(**reminder).model_dump(mode="json")})
+
+async def push_job(job: Optional[dict]):
+    if job is None:
+        return  # deleted before it finished
+    push_hub.publish(job["user_id"], {"type": "job", "job": Job(**job).model_dump(mode="json")})
+
+async def push_chat(connection: Connection, request_id, data: ChatMessageCreate):
+    try:
+        await check_ai_limits("chat", connection.user_id)
+    except RateLimited as e:
+        await connection.send({
+            "type": "error", "request_id": request_id, "detail": str(e),
+            "status": e.status_code, "retry_after": e.headers.get("Retry-After"),
+        })
+        return
+    session_id = data.session_id or str(uuid.uuid4())
+    async for event in chat_stream_events(connection.user_id, data.message, session_id, data.session_id is None):
+        await connection.send({**event, "request_id": request_id})
+
+async def push_message(connection: Connection, message: dict):
+    request_id = message.get("request_id")
+    if message.get("type") != "chat":
+        connection.offer({"type": "error", "request_id": request_id, "detail": f"Unknown message type {message.get('type')!r}"})
+        return
+    try:
+        data = ChatMessageCreate(**message)
+    except ValidationError:
+        connection.offer({"type": "error", "request_id": request_id, "detail": "A chat message needs a message string"})
+        return
+    connection.spawn(push_chat(connection, request_id, data))
+
+@api_router.websocket("/ws")
+async def push_channel(websocket: WebSocket):
+    await push_hub.serve(websocket, token_verifier.verify, push_message)
+
+# Data export: every document the user has, as gzip-compressed NDJSON (see export.py).
+# Documents per batch and checkpoint; set from Settings (EXPORT_BATCH_SIZE)
+EXPORT_BATCH_SIZE = 500
+
+@api_router.get("/export")
+async def export_data(
+    resume: Optional[str] = Query(None, description="Last checkpoint of an interrupted export, to continue after it"),
+    user_id: str = Depends(get_current_user),
+):
+    if resume:
+        parse_resume(resume)  # reject a bad token with a 400 before the stream starts
+
+    async def events():
+        try:
+            async for chunk in export_events(db, user_id, resume, EXPORT_BATCH_SIZE, archive=history_archive):
+                yield chunk
+        except Exception as e:
+            logger.exception("Export failed for %s", user_id)
+            yield ndjson_event("error", detail=f"Export error: {str(e)}").encode("utf-8")
+
+    filename = f"health-export-{datetime.now(timezone.utc):%Y%m%d}.ndjson.gz"
+    return StreamingResponse(
+        gzip_stream(events()),
+        media_type="application/gzip",
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Cache-Control": "no-store",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+# Telemetry for scrapers, kept off /api (where /api/metrics means health metrics).
+# With METRICS_TOKEN set, requires "Authorization: Bearer <token>"; set from Settings
+METRICS_TOKEN: Optional[str] = None
+
+@internal_router.get("/internal/metrics", include_in_schema=False)
+async def internal_metrics(request: Request):
+    if METRICS_TOKEN and request.headers.get('authorization') != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid token")
+    body, content_type = telemetry.render()
+    return Response(content=body, media_type=content_type)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -361,6 +960,201 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
+def build_services(settings: Settings):
+    """Create this worker's clients and components from ``settings``."""
+    global client, db, openai_client, llm_governor, chat_context, token_verifier, user_cache, password_hasher
+    global reminder_scheduler, analysis_cache, job_queue, rate_limiter, token_quota, versions, write_buffer, push_hub
+    global history_archive, FAST_RESPONSES, EXPORT_BATCH_SIZE, METRICS_TOKEN
+    FAST_RESPONSES = settings.fast_responses
+    EXPORT_BATCH_SIZE = settings.export_batch_size
+    METRICS_TOKEN = settings.metrics_token
+    # The slowest imports; nothing needs them before startup
+    import httpx
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+    # MongoDB connection; the pool is per worker (MONGO_MAX_POOL_SIZE)
+    client = AsyncIOMotorClient(
+        settings.mongo_url,
+        tz_aware=True,
+        maxPoolSize=settings.mongo_max_pool_size,
+        minPoolSize=settings.mongo_min_pool_size,
+        event_listeners=[telemetry.MongoCommandMetrics()],
+    )
+    db = client[settings.db_name]
+
+    # OpenAI client (OPENAI_BASE_URL points it at a local fake LLM for testing). Every model call
+    # in the worker shares its connection pool (OPENAI_MAX_CONNECTIONS).
+    # Retries are left to llm_governor, which knows each request's deadline
+    openai_client = AsyncOpenAI(
+        api_key=settings.openai_api_key,
+        base_url=settings.openai_base_url,
+        max_retries=0,
+        http_client=DefaultAsyncHttpxClient(limits=httpx.Limits(
+            max_connections=settings.openai_max_connections,
+            max_keepalive_connections=settings.openai_max_keepalive,
+        )),
+    )
+
+    # Concurrency limits, timeouts, retries and circuit breaking for model calls (LLM_* env vars)
+    llm_governor = LLMGovernor.from_env(openai_client, OPENAI_MODEL)
+
+    # Recent turns of a chat session that fit CHAT_CONTEXT_TOKENS, older ones folded into a summary
+    chat_context = ChatContextBuilder(
+        db,
+        llm_governor,
+        OPENAI_MODEL,
+        budget=settings.chat_context_tokens,
+        cache_size=settings.chat_context_cache_size,
+    )
+
+    # Verified tokens are cached for TOKEN_CACHE_TTL seconds; revoked jti's live in db.revoked_tokens
+    token_verifier = TokenVerifier(
+        settings.jwt_secret,
+        JWT_ALGORITHM,
+        expiration=timedelta(hours=JWT_EXPIRATION_HOURS),
+        revoked=db.revoked_tokens,
+        cache_size=settings.token_cache_size,
+        cache_ttl=settings.token_cache_ttl,
+    )
+
+    # User documents by id, dropped on profile changes (other workers catch up within USER_CACHE_TTL)
+    user_cache = TTLCache(
+        maxsize=settings.user_cache_size,
+        ttl=settings.user_cache_ttl,
+    )
+
+    # bcrypt runs on a bounded worker pool (PASSWORD_HASH_* env vars)
+    password_hasher = PasswordHasher.from_env()
+
+    # Fires due reminders and rolls daily/weekly ones forward (REMINDER_SCHEDULER=false disables)
+    reminder_scheduler = ReminderScheduler(db.reminders)
+
+    # Symptom analyses shared across users with the same normalized input (SYMPTOM_CACHE_* env vars)
+    analysis_cache = AnalysisCache(
+        db.analysis_cache,
+        ttl=timedelta(hours=settings.symptom_cache_ttl_hours),
+        memory_size=settings.symptom_cache_memory_size,
+    )
+
+    # Async job mode for AI requests (?async=true); JOB_* env vars, JOB_QUEUE=false stops the workers here
+    job_queue = JobQueue.from_env(db.jobs)
+    job_queue.register("chat", chat_job, retry_on=(LLMError,))
+    job_queue.register("symptoms", symptoms_job, retry_on=(LLMError,))
+
+    # Token buckets per user for the model routes (RATE_LIMIT_* env vars; RATE_LIMIT_STORE=mongo shares them across workers)
+    rate_limiter = RateLimiter.from_env(db.rate_limits)
+
+    # Daily model tokens per user, metered from the API's reported usage (LLM_DAILY_TOKEN_QUOTA, 0 disables)
+    token_quota = TokenQuota.from_env(db.llm_usage)
+    llm_governor.subscribe(token_quota.record)
+
+    # Per-user collection version counters behind the list routes' ETags (see versions.py)
+    versions = CollectionVersions(db.collection_versions)
+    reminder_scheduler.subscribe_stored(lambda reminder: versions.bump(reminder["user_id"], "reminders"))
+
+    # Chat messages and symptom reports stored after the reply, in batches, journaled locally (WRITE_BEHIND=true)
+    write_buffer = WriteBehindBuffer.from_env(db, default_journal_dir=ROOT_DIR / "journal")
+    write_buffer.subscribe(versions.stored)
+
+    # Chat and symptom history older than ARCHIVE_AFTER_DAYS compacted into monthly compressed archives
+    # (ARCHIVE_* env vars; off by default). Archived documents stay readable through ?archived=true and /api/export
+    history_archive = HistoryArchive.from_env(db)
+    history_archive.subscribe(versions.stored)
+
+    # Reminders, finished jobs, list changes and chat replies pushed over /api/ws (PUSH_* env vars;
+    # PUSH_RELAY=mongo when several workers serve the same users)
+    push_hub = PushHub.from_env(db)
+    versions.subscribe(lambda user_id, names: push_hub.publish(user_id, {"type": "changed", "collections": names}))
+    reminder_scheduler.subscribe(push_reminder)
+    job_queue.subscribe(push_job)
+
+    telemetry.component_stats.add("password_hasher", password_hasher.stats)
+    telemetry.component_stats.add("token_cache", token_verifier.stats)
+    telemetry.component_stats.add("user_cache", user_cache.stats)
+    telemetry.component_stats.add("symptom_cache", analysis_cache.stats)
+    telemetry.component_stats.add("llm", llm_governor.stats)
+    telemetry.component_stats.add("chat_context", chat_context.stats)
+    telemetry.component_stats.add("jobs", job_queue.stats)
+    telemetry.component_stats.add("reminder_scheduler", reminder_scheduler.stats)
+    telemetry.component_stats.add("rate_limiter", rate_limiter.stats)
+    telemetry.component_stats.add("token_quota", token_quota.stats)
+    telemetry.component_stats.add("write_behind", write_buffer.stats)
+    telemetry.component_stats.add("versions", versions.stats)
+    telemetry.component_stats.add("push", push_hub.stats)
+    telemetry.component_stats.add("archive", history_archive.stats)
+
+async def prepare_database(settings: Settings):
+    # ENSURE_INDEXES=false when `python indexes.py` runs once per deploy instead of in every worker
+    if settings.ensure_indexes:
+        await ensure_indexes(db)
+    if settings.check_query_plans:
+        await explain_route_queries(db)
+
+async def start_services(settings: Settings):
+    await asyncio.gather(
+        prepare_database(settings),
+        # tiktoken loads (and on first run downloads) its BPE file; keep that off the event loop
+        asyncio.to_thread(count_tokens, "warm up", OPENAI_MODEL),
+    )
+    push_hub.start()
+    # Before the job workers, whose turns go through it
+    await write_buffer.start()
+    if settings.job_queue:
+        job_queue.start()
+    if settings.reminder_scheduler:
+        reminder_scheduler.start()
+    history_archive.start()
+
+async def stop_services():
+    await push_hub.stop()
+    await history_archive.stop()
+    await reminder_scheduler.stop()
+    await job_queue.stop()
+    await chat_context.close()
+    await token_quota.close()
+    await write_buffer.close()
+    await openai_client.close()
     client.close()
+    password_hasher.shutdown()
+
+def create_app(settings: Optional[Settings] = None) -> FastAPI:
+    """The ASGI app; its clients are created at startup, in the process that serves it.
+
+    ``uvicorn server:create_app --factory`` runs it (see README.md for several workers).
+    Routes use this module's globals, so there is one app per process.
+    """
+    settings = settings or Settings.from_env()
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        build_services(settings)
+        await start_services(settings)
+        loop_monitor = asyncio.create_task(telemetry.monitor_event_loop())
+        try:
+            yield
+        finally:
+            loop_monitor.cancel()
+            await stop_services()
+
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(api_router)
+    app.include_router(internal_router)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=settings.cors_origins,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["ETag"],
+    )
+    app.add_middleware(telemetry.TelemetryMiddleware)
+    return app
+
+def __getattr__(name: str):
+    # `uvicorn server:app` still works: the app is created on first access instead of on import
+    if name == "app":
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
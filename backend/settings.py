@@ -0,0 +1,90 @@
+"""Process settings for server.create_app, read from the environment and backend/.env.
+
+Only what is needed to build the app and its clients lives here. Components
+with their own tuning knobs (LLM_*, JOB_*, PUSH_*, ...) still read them in
+their ``from_env``. Reading settings never connects to anything. Importing
+server.py reads nothing at all, so tools and tests can import it without
+credentials.
+"""
+import os
+from pathlib import Path
+from typing import List, Optional
+
+from dotenv import load_dotenv
+from pydantic import BaseModel, ConfigDict
+
+from responses import fast_responses_mode
+
+ROOT_DIR = Path(__file__).parent
+REQUIRED = ("MONGO_URL", "DB_NAME", "JWT_SECRET", "EMERGENT_LLM_KEY")
+
+
+def _flag(name: str, default: str) -> bool:
+    return os.environ.get(name, default).lower() == 'true'
+
+
+class Settings(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    mongo_url: str
+    db_name: str
+    jwt_secret: str
+    openai_api_key: str
+    openai_base_url: Optional[str] = None  # e.g. the fake LLM in tests/fake_llm.py
+    # Per worker: N workers open up to N * mongo_max_pool_size connections
+    mongo_max_pool_size: int = 100
+    mongo_min_pool_size: int = 0
+    # The one HTTP connection pool every model call in a worker shares
+    openai_max_connections: int = 64
+    openai_max_keepalive: int = 32
+    cors_origins: List[str] = ["*"]
+    ensure_indexes: bool = True
+    check_query_plans: bool = False
+    job_queue: bool = True
+    reminder_scheduler: bool = True
+    fast_responses: str = "off"  # off | validate | raw, see responses.py
+    export_batch_size: int = 500
+    metrics_token: Optional[str] = None  # required by /internal/metrics when set
+    # Per-process caches and budgets
+    chat_context_tokens: int = 3000
+    chat_context_cache_size: int = 1000
+    token_cache_size: int = 10000
+    token_cache_ttl: float = 60.0
+    user_cache_size: int = 10000
+    user_cache_ttl: float = 300.0
+    symptom_cache_ttl_hours: float = 168.0
+    symptom_cache_memory_size: int = 1000
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        load_dotenv(ROOT_DIR / '.env')
+        missing = [name for name in REQUIRED if not os.environ.get(name)]
+        if missing:
+            raise RuntimeError(f"Missing required environment variables: {', '.join(missing)}")
+        return cls(
+            mongo_url=os.environ['MONGO_URL'],
+            db_name=os.environ['DB_NAME'],
+            jwt_secret=os.environ['JWT_SECRET'],
+            openai_api_key=os.environ['EMERGENT_LLM_KEY'],
+            openai_base_url=os.environ.get('OPENAI_BASE_URL'),
+            mongo_max_pool_size=int(os.environ.get('MONGO_MAX_POOL_SIZE', '100')),
+            mongo_min_pool_size=int(os.environ.get('MONGO_MIN_POOL_SIZE', '0')),
+            openai_max_connections=int(os.environ.get('OPENAI_MAX_CONNECTIONS', '64')),
+            openai_max_keepalive=int(os.environ.get('OPENAI_MAX_KEEPALIVE', '32')),
+            cors_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
+            ensure_indexes=_flag('ENSURE_INDEXES', 'true'),
+            check_query_plans=_flag('CHECK_QUERY_PLANS', 'false'),
+            job_queue=_flag('JOB_QUEUE', 'true'),
+            reminder_scheduler=_flag('REMINDER_SCHEDULER', 'true'),
+            fast_responses=fast_responses_mode(),
+            export_batch_size=int(os.environ.get('EXPORT_BATCH_SIZE', '500')),
+            metrics_token=os.environ.get('METRICS_TOKEN') or None,
+            chat_context_tokens=int(os.environ.get('CHAT_CONTEXT_TOKENS', '3000')),
+            chat_context_cache_size=int(os.environ.get('CHAT_CONTEXT_CACHE_SIZE', '1000')),
+            token_cache_size=int(os.environ.get('TOKEN_CACHE_SIZE', '10000')),
+            token_cache_ttl=float(os.environ.get('TOKEN_CACHE_TTL', '60')),
+            user_cache_size=int(os.environ.get('USER_CACHE_SIZE', '10000')),
+            user_cache_ttl=float(os.environ.get('USER_CACHE_TTL', '300')),
+            symptom_cache_ttl_hours=float(os.environ.get('SYMPTOM_CACHE_TTL_HOURS', '168')),
+            symptom_cache_memory_size=int(os.environ.get('SYMPTOM_CACHE_MEMORY_SIZE', '1000')),
+        )
@@ -0,0 +1,43 @@
+"""Document shaping shared by the routes and the data migrations.
+
+Timestamps are stored as native BSON datetimes (UTC) and metric readings
+carry parsed numeric fields next to the original ``value`` string:
+``value_num`` for scalar readings, ``systolic``/``diastolic`` for blood
+pressure. Unparseable readings keep ``value_num: None``.
+"""
+import re
+from datetime import datetime, timezone
+from typing import Optional
+
+BLOOD_PRESSURE_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*/\s*(\d+(?:\.\d+)?)\s*$")
+NUMBER_RE = re.compile(r"^\s*(-?\d+(?:[.,]\d+)?)")
+
+
+def to_utc(value) -> Optional[datetime]:
+    """Coerce an ISO string or datetime to an aware UTC datetime.
+
+    Truncated to milliseconds, the precision BSON stores, so the value
+    compares equal to what a later read returns.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    else:
+        value = value.astimezone(timezone.utc)
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
+
+
+def parse_metric_value(metric_type: str, value: str) -> dict:
+    if metric_type == "blood_pressure":
+        match = BLOOD_PRESSURE_RE.match(value or "")
+        if match:
+            return {"value_num": None, "systolic": float(match.group(1)), "diastolic": float(match.group(2))}
+        return {"value_num": None}
+
+    match = NUMBER_RE.match(value or "")
+    if match:
+        return {"value_num": float(match.group(1).replace(",", "."))}
+    return {"value_num": None}
@@ -0,0 +1,149 @@
+"""Prometheus telemetry: request, MongoDB, LLM and event-loop metrics.
+
+Everything here is cheap enough to leave on: a histogram observation is a
+lock and a few additions, the ASGI middleware adds no buffering (streamed
+responses are timed until their last chunk), and component stats are only
+read when the endpoint is scraped. Metrics are per process; with several
+uvicorn workers, scrape each worker or run one per container.
+"""
+import asyncio
+import logging
+import time
+from typing import Callable, Dict
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, ProcessCollector, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+REGISTRY = CollectorRegistry()
+ProcessCollector(registry=REGISTRY)  # process_resident_memory_bytes, open fds, CPU seconds
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by route template, until the last body chunk",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS, registry=REGISTRY,
+)
+HTTP_IN_PROGRESS = Gauge("http_requests_in_progress", "Requests being served", registry=REGISTRY)
+
+MONGO_LATENCY = Histogram(
+    "mongodb_command_duration_seconds", "MongoDB command round trips",
+    ["command", "collection"], buckets=MONGO_BUCKETS, registry=REGISTRY,
+)
+MONGO_FAILURES = Counter("mongodb_command_failures_total", "Failed MongoDB commands", ["command"], registry=REGISTRY)
+
+LLM_LATENCY = Histogram(
+    "llm_request_duration_seconds", "Model calls, including queueing and retries",
+    ["mode", "outcome"], buckets=LATENCY_BUCKETS, registry=REGISTRY,
+)
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens reported by the model API", ["type"], registry=REGISTRY)
+
+LOOP_LAG = Histogram(
+    "event_loop_lag_seconds", "How late a periodic timer fires; blocking code shows up here",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0), registry=REGISTRY,
+)
+
+
+def observe_llm(mode: str, outcome: str, seconds: float, usage=None):
+    LLM_LATENCY.labels(mode, outcome).observe(seconds)
+    if usage is not None:
+        LLM_TOKENS.labels("prompt").inc(usage.prompt_tokens or 0)
+        LLM_TOKENS.labels("completion").inc(usage.completion_tokens or 0)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """pymongo command listener; runs on Motor's worker threads."""
+
+    def __init__(self):
+        self._collections: Dict[tuple, str] = {}
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        if isinstance(target, str):
+            self._collections[(event.connection_id, event.request_id)] = target
+
+    def _collection(self, event) -> str:
+        return self._collections.pop((event.connection_id, event.request_id), "")
+
+    def succeeded(self, event):
+        MONGO_LATENCY.labels(event.command_name, self._collection(event)).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        MONGO_LATENCY.labels(event.command_name, self._collection(event)).observe(event.duration_micros / 1e6)
+        MONGO_FAILURES.labels(event.command_name).inc()
+
+
+class StatsCollector:
+    """Exports the numeric fields of components' ``stats()`` dicts as gauges at scrape time."""
+
+    def __init__(self):
+        self.sources: Dict[str, Callable[[], dict]] = {}
+
+    def add(self, name: str, stats: Callable[[], dict]):
+        self.sources[name] = stats
+
+    def collect(self):
+        for name, stats in self.sources.items():
+            try:
+                values = stats()
+            except Exception:
+                logger.exception("Collecting %s stats failed", name)
+                continue
+            for key, value in values.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                yield GaugeMetricFamily(f"app_{name}_{key}", f"{name} {key.replace('_', ' ')}", value=value)
+            if isinstance(values.get("breaker_state"), str):
+                family = GaugeMetricFamily(f"app_{name}_breaker_state", "Circuit breaker state", labels=["state"])
+                for state in ("closed", "open", "half_open"):
+                    family.add_metric([state], 1 if values["breaker_state"] == state else 0)
+                yield family
+
+
+component_stats = StatsCollector()
+REGISTRY.register(component_stats)
+
+
+class TelemetryMiddleware:
+    """Pure ASGI middleware timing each request by its route template (not the raw path)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        status = 500
+        HTTP_IN_PROGRESS.inc()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_PROGRESS.dec()
+            route = scope.get("route")
+            # Unmatched paths share one label so scanners cannot blow up cardinality
+            path = getattr(route, "path", None) or "unmatched"
+            HTTP_LATENCY.labels(scope["method"], path, str(status)).observe(time.perf_counter() - started)
+
+
+async def monitor_event_loop(interval: float = 0.5):
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        LOOP_LAG.observe(max(0.0, loop.time() - expected))
+
+
+def render() -> tuple:
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
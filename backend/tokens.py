@@ -0,0 +1,86 @@
+"""JWT issuing and verification with a verified-token cache and a revocation list.
+
+Verifying a bearer token costs an HMAC check plus claim parsing on every
+request. Verified claims are cached by a SHA-256 of the token for at most
+``cache_ttl`` seconds (never past the token's ``exp``), so a hot client pays
+that cost once per window. Tokens carry a ``jti``; revoking one records it in
+the ``revoked_tokens`` collection until the token would have expired anyway
+(a TTL index cleans it up) and evicts it from this process's cache. Other
+worker processes notice the revocation when their cached entry lapses.
+"""
+import hashlib
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import jwt
+
+from cache import TTLCache
+
+
+class TokenError(Exception):
+    """Raised for expired, malformed or revoked tokens; callers should answer 401."""
+
+
+def _cache_key(token: str) -> bytes:
+    return hashlib.sha256(token.encode("utf-8")).digest()
+
+
+class TokenVerifier:
+    def __init__(self, secret: str, algorithm: str = "HS256", expiration: timedelta = timedelta(days=30),
+                 revoked=None, cache_size: int = 10000, cache_ttl: float = 60.0):
+        self.secret = secret
+        self.algorithm = algorithm
+        self.expiration = expiration
+        self.revoked = revoked
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+
+    def issue(self, user_id: str) -> str:
+        now = datetime.now(timezone.utc)
+        payload = {"user_id": user_id, "jti": uuid.uuid4().hex, "iat": now, "exp": now + self.expiration}
+        return jwt.encode(payload, self.secret, algorithm=self.algorithm)
+
+    async def verify(self, token: str) -> dict:
+        key = _cache_key(token)
+        claims = self.cache.get(key)
+        if claims is not None:
+            return claims
+
+        try:
+            claims = jwt.decode(token, self.secret, algorithms=[self.algorithm])
+        except jwt.ExpiredSignatureError:
+            raise TokenError("Token expired")
+        except jwt.InvalidTokenError:
+            raise TokenError("Invalid token")
+        if not claims.get("user_id"):
+            raise TokenError("Invalid token")
+
+        # Tokens issued before jti was added cannot be revoked individually
+        jti = claims.get("jti")
+        if jti and self.revoked is not None and await self.revoked.find_one({"_id": jti}, {"_id": 1}):
+            raise TokenError("Token revoked")
+
+        self.cache.set(key, claims, ttl=claims["exp"] - time.time())
+        return claims
+
+    async def revoke(self, token: str, claims: Optional[dict] = None) -> bool:
+        """Revoke ``token``; returns False for legacy tokens without a jti."""
+        claims = claims or await self.verify(token)
+        self.cache.pop(_cache_key(token))
+        jti = claims.get("jti")
+        if not jti or self.revoked is None:
+            return False
+        await self.revoked.update_one(
+            {"_id": jti},
+            {"$setOnInsert": {
+                "user_id": claims["user_id"],
+                "expires_at": datetime.fromtimestamp(claims["exp"], timezone.utc),
+                "revoked_at": datetime.now(timezone.utc),
+            }},
+            upsert=True,
+        )
+        return True
+
+    def stats(self) -> dict:
+        return self.cache.stats()
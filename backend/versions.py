@@ -0,0 +1,85 @@
+"""Per-user collection version counters for conditional GETs.
+
+Each user has one ``collection_versions`` document holding a counter per
+collection. Every route or background task that changes a user's documents
+bumps it after the write. List routes derive a weak ETag from the counters
+they depend on and the request's query string. When the client's
+If-None-Match still matches, they answer 304 after that single _id lookup,
+without running their own queries.
+
+The counters are read before a list is queried. A write that lands in
+between can only make the ETag older than the body, which costs the client
+one extra refetch later. It can never pin a stale body under a new ETag.
+``epoch`` is set when the document is created, so a deleted and recreated
+document does not repeat old ETags.
+"""
+import hashlib
+import logging
+import uuid
+from typing import Callable, Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+
+class CollectionVersions:
+    def __init__(self, collection):
+        self.collection = collection
+        self._listeners: List[Callable[[str, List[str]], None]] = []
+        self.bumps = 0
+        self.failed_bumps = 0
+
+    def subscribe(self, listener: Callable[[str, List[str]], None]):
+        """Register a callback that receives (user_id, collection names) after each bump."""
+        self._listeners.append(listener)
+
+    async def get(self, user_id: str) -> dict:
+        return await self.collection.find_one({"_id": user_id}) or {}
+
+    async def bump(self, user_id: str, *names: str):
+        """Mark ``names`` as changed for the user; call after the write itself."""
+        await self._bump_many({user_id: list(names)})
+
+    async def stored(self, collection: str, docs: List[dict]):
+        """WriteBehindBuffer listener: one bump per user with documents in the batch."""
+        await self._bump_many({doc["user_id"]: [collection] for doc in docs})
+
+    async def _bump_many(self, changes: Dict[str, List[str]]):
+        updates = [
+            UpdateOne(
+                {"_id": user_id},
+                {"$inc": {name: 1 for name in names}, "$setOnInsert": {"epoch": uuid.uuid4().hex}},
+                upsert=True,
+            )
+            for user_id, names in changes.items()
+        ]
+        try:
+            await self.collection.bulk_write(updates, ordered=False)
+            self.bumps += len(updates)
+        except Exception:
+            # The write itself succeeded; clients holding an ETag see it after the next bump
+            self.failed_bumps += 1
+            logger.exception("Bumping collection versions failed")
+            return
+        for user_id, names in changes.items():
+            for listener in self._listeners:
+                listener(user_id, names)
+
+    @staticmethod
+    def etag(versions: dict, names: Iterable[str], *parts: str) -> str:
+        key = ":".join([versions.get("epoch", ""), *(str(versions.get(name, 0)) for name in names), *parts])
+        return f'W/"{hashlib.blake2b(key.encode("utf-8"), digest_size=8).hexdigest()}"'
+
+    def stats(self) -> dict:
+        return {"bumps": self.bumps, "failed_bumps": self.failed_bumps}
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match comparison, which is always weak (RFC 9110 13.1.2)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
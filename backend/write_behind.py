@@ -0,0 +1,275 @@
+"""Write-behind persistence for documents the API returns before storing.
+
+With WRITE_BEHIND=true, routes hand new chat messages and symptom reports
+to a WriteBehindBuffer instead of awaiting insert_one. The buffer appends
+the document to a local journal, queues it and returns. A background task
+writes queued documents with one unordered insert_many per collection.
+It runs once ``batch_size`` documents are waiting, or ``flush_interval``
+seconds after the previous flush.
+
+The journal is a series of segment files in ``journal_dir``, one Extended
+JSON line per document. A segment is deleted only after every document in
+it has been stored. A worker that crashed leaves its segments behind, and
+the next worker to start on the same directory inserts them again. Stored
+documents are skipped through the ``id_unique`` indexes. Each segment
+holds an flock while it is open, so workers sharing a directory never pick
+up each other's live segments. Lines reach the OS on every insert, so a
+killed process loses nothing. Surviving a host crash as well needs
+``fsync`` and costs a disk sync per document.
+
+Memory is bounded by ``max_pending``. Once that many documents are queued,
+``insert`` waits for the next flush. If none succeeds within ``max_wait``,
+it stores the document itself, so the route sees Mongo's own error.
+
+Until a document is flushed (``flush_interval``, 100ms by default), it is
+missing from list routes and from other workers' chat context.
+"""
+import asyncio
+import fcntl
+import logging
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from bson import json_util
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+_JSON_OPTIONS = json_util.JSONOptions(tz_aware=True)
+
+
+class _Segment:
+    """An open, flock'ed journal file."""
+
+    def __init__(self, path: Path, file):
+        self.path = path
+        self.file = file
+
+    @classmethod
+    def create(cls, directory: Path) -> "_Segment":
+        # Locked before it gets the name other workers look for
+        path = directory / f"{time.time_ns()}-{os.getpid()}-{uuid.uuid4().hex[:6]}.journal"
+        temporary = path.with_suffix(".new")
+        file = open(temporary, "ab", buffering=0)
+        fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        temporary.rename(path)
+        return cls(path, file)
+
+    @classmethod
+    def adopt(cls, path: Path) -> Optional["_Segment"]:
+        """Take over a segment nobody holds, or None while its owner is alive."""
+        file = open(path, "r+b", buffering=0)
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            file.close()
+            return None
+        return cls(path, file)
+
+    def append(self, line: bytes, fsync: bool):
+        self.file.write(line)
+        if fsync:
+            os.fsync(self.file.fileno())
+
+    def read(self) -> List[Tuple[str, dict]]:
+        entries = []
+        self.file.seek(0)
+        for line in self.file.read().splitlines():
+            try:
+                collection, doc = json_util.loads(line, json_options=_JSON_OPTIONS)
+            except ValueError:
+                logger.warning("Skipping a torn line in %s", self.path)  # the process died mid-write
+                continue
+            entries.append((collection, doc))
+        return entries
+
+    def remove(self):
+        self.path.unlink(missing_ok=True)
+        self.file.close()
+
+
+class WriteBehindBuffer:
+    def __init__(self, db, journal_dir: Path, batch_size: int = 500, flush_interval: float = 0.1,
+                 max_pending: int = 10000, max_wait: float = 5.0, fsync: bool = False, enabled: bool = True):
+        self.db = db
+        self.journal_dir = journal_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_wait = max_wait
+        self.fsync = fsync
+        self.enabled = enabled
+        self._pending: List[Tuple[str, dict]] = []
+        self._segment: Optional[_Segment] = None
+        self._closed: List[_Segment] = []  # segments whose documents are all in _pending
+        self._wake = asyncio.Event()
+        self._flushed = asyncio.Condition()
+        self._flush_lock = asyncio.Lock()
+        self._listeners: List[Callable[[str, List[dict]], Awaitable[None]]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.flushed = 0
+        self.batches = 0
+        self.failed_flushes = 0
+        self.dropped = 0
+        self.backpressure_waits = 0
+        self.overflow_writes = 0
+        self.replayed = 0
+
+    @classmethod
+    def from_env(cls, db, default_journal_dir: Path) -> "WriteBehindBuffer":
+        return cls(
+            db,
+            Path(os.environ.get('WRITE_BEHIND_JOURNAL_DIR', str(default_journal_dir))),
+            batch_size=int(os.environ.get('WRITE_BEHIND_BATCH_SIZE', '500')),
+            flush_interval=float(os.environ.get('WRITE_BEHIND_FLUSH_MS', '100')) / 1000,
+            max_pending=int(os.environ.get('WRITE_BEHIND_MAX_PENDING', '10000')),
+            fsync=os.environ.get('WRITE_BEHIND_FSYNC', 'false').lower() == 'true',
+            enabled=os.environ.get('WRITE_BEHIND', 'false').lower() == 'true',
+        )
+
+    def subscribe(self, listener: Callable[[str, List[dict]], Awaitable[None]]):
+        """Register an async callback that receives (collection, documents) once they are stored."""
+        self._listeners.append(listener)
+
+    async def _stored(self, collection: str, docs: List[dict]):
+        for listener in self._listeners:
+            try:
+                await listener(collection, docs)
+            except Exception:
+                logger.exception("Write-behind listener failed for %s", collection)
+
+    async def insert(self, collection: str, doc: dict):
+        """Store ``doc`` in ``collection``: queued and journaled when enabled, else right away."""
+        if not self.enabled or self._task is None:
+            await self.db[collection].insert_one(doc)
+            await self._stored(collection, [doc])
+            return
+        if len(self._pending) >= self.max_pending:
+            self.backpressure_waits += 1
+            self._wake.set()
+            try:
+                async with self._flushed:
+                    await asyncio.wait_for(
+                        self._flushed.wait_for(lambda: len(self._pending) < self.max_pending), self.max_wait,
+                    )
+            except asyncio.TimeoutError:
+                self.overflow_writes += 1
+                await self.db[collection].insert_one(doc)
+                await self._stored(collection, [doc])
+                return
+
+        if self._segment is None:
+            self._segment = _Segment.create(self.journal_dir)
+        self._segment.append(json_util.dumps([collection, doc]).encode("utf-8") + b"\n", self.fsync)
+        self._pending.append((collection, doc))
+        if len(self._pending) >= self.batch_size:
+            self._wake.set()
+
+    async def start(self):
+        """Queue what crashed workers left in the journal, then start flushing."""
+        if not self.enabled:
+            return
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        for path in sorted(self.journal_dir.glob("*.journal")):
+            segment = _Segment.adopt(path)
+            if segment is None:
+                continue
+            entries = segment.read()
+            if not entries:
+                segment.remove()  # nothing (or only a torn line) was written before the crash
+                continue
+            self._pending.extend(entries)
+            self._closed.append(segment)
+            self.replayed += len(entries)
+        if self.replayed:
+            logger.warning("Replaying %d journaled documents from %s", self.replayed, self.journal_dir)
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        backoff = self.flush_interval
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), backoff)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            ok = await self.flush()
+            # Back off while Mongo is unreachable instead of retrying every interval
+            backoff = self.flush_interval if ok else min(backoff * 2, 5.0)
+
+    async def flush(self) -> bool:
+        """Store everything queued so far; False if it has to be retried."""
+        async with self._flush_lock:
+            if not self._pending:
+                return True
+            batch, self._pending = self._pending, []
+            if self._segment is not None:
+                self._closed.append(self._segment)
+                self._segment = None
+            segments, self._closed = self._closed, []
+
+            by_collection: Dict[str, List[dict]] = {}
+            for collection, doc in batch:
+                by_collection.setdefault(collection, []).append(doc)
+            try:
+                for collection, docs in by_collection.items():
+                    for offset in range(0, len(docs), self.batch_size):
+                        chunk = docs[offset:offset + self.batch_size]
+                        await self._insert_many(collection, chunk)
+                        await self._stored(collection, chunk)
+            except Exception:
+                self.failed_flushes += 1
+                logger.exception("Write-behind flush of %d documents failed; will retry", len(batch))
+                # Documents already stored are skipped as duplicates on the retry
+                self._pending = batch + self._pending
+                self._closed = segments + self._closed
+                return False
+
+            for segment in segments:
+                segment.remove()
+            self.flushed += len(batch)
+            self.batches += 1
+        async with self._flushed:
+            self._flushed.notify_all()
+        return True
+
+    async def _insert_many(self, collection: str, docs: List[dict]):
+        try:
+            await self.db[collection].insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            # Duplicates were stored by an earlier attempt; anything else would fail again
+            for write_error in e.details.get("writeErrors", []):
+                if write_error.get("code") != DUPLICATE_KEY:
+                    self.dropped += 1
+                    logger.error("Write-behind dropped a %s document: %s", collection, write_error.get("errmsg"))
+
+    async def close(self):
+        """Stop the flusher and store what is queued; whatever fails stays in the journal."""
+        if self._task is None:
+            return
+        # Not cancelled: a flush interrupted part way would lose its batch until the next start
+        self._stopping = True
+        self._wake.set()
+        await self._task
+        self._task = None
+        await self.flush()
+        for segment in self._closed + ([self._segment] if self._segment else []):
+            segment.file.close()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "pending": len(self._pending),
+            "flushed": self.flushed,
+            "batches": self.batches,
+            "failed_flushes": self.failed_flushes,
+            "dropped": self.dropped,
+            "backpressure_waits": self.backpressure_waits,
+            "overflow_writes": self.overflow_writes,
+            "replayed": self.replayed,
+        }
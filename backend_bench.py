@@ -0,0 +1,974 @@
+"""Load tests and latency benchmarks for the Health Assistant API.
+
+Usage:
+    python backend_bench.py mixed --boot --mongo mongomock --concurrency 50 --duration 30 \\
+        --output bench.json --baseline bench-baseline.json
+    python backend_bench.py smoke --boot --mongo mongomock
+    python backend_bench.py login_storm --base-url http://localhost:8001
+    python backend_bench.py series --readings 1000000   # seeds MONGO_URL/DB_NAME directly
+    python backend_bench.py search --messages 50000     # seeds MONGO_URL/DB_NAME directly
+    python backend_bench.py push_idle --boot --mongo mongomock --connections 10000 --duration 60
+    python backend_bench.py startup --mongo mongomock --repeat 5
+    python backend_bench.py auth                        # in-process, no server needed
+    python backend_bench.py ratelimit                   # in-process, no server needed
+    python backend_bench.py serialize --page-size 200   # in-process, no server needed
+
+--boot starts tests/fake_llm.py and the backend (tests/bench_server.py) on free
+ports, against --mongo-url or an in-memory mongomock database, and stops them
+afterwards. Without it the scenarios target --base-url.
+
+--output writes the results as JSON; --baseline compares them with an earlier
+run and exits non-zero when a route's p95/p99 grew, or its throughput fell,
+by more than --tolerance.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import httpx
+
+ROOT_DIR = Path(__file__).resolve().parent
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def latency_stats(samples, elapsed=None, errors=0):
+    ms = [s * 1000 for s in samples]
+    result = {
+        "count": len(ms),
+        "errors": errors,
+        "p50_ms": round(percentile(ms, 50), 2),
+        "p95_ms": round(percentile(ms, 95), 2),
+        "p99_ms": round(percentile(ms, 99), 2),
+        "max_ms": round(max(ms), 2) if ms else 0.0,
+    }
+    if elapsed:
+        result["rps"] = round(len(ms) / elapsed, 2)
+    return result
+
+
+def summarize(name, result):
+    rps = f" {result['rps']:8.1f}/s" if "rps" in result else ""
+    errors = f" errors={result['errors']}" if result.get("errors") else ""
+    print(
+        f"{name:<34} n={result['count']:<6}{rps} p50={result['p50_ms']:8.1f}ms "
+        f"p95={result['p95_ms']:8.1f}ms p99={result['p99_ms']:8.1f}ms max={result['max_ms']:8.1f}ms{errors}"
+    )
+
+
+def print_routes(report):
+    for name, result in report["routes"].items():
+        if "count" in result:
+            summarize(name, result)
+    if "requests" in report:
+        print(f"{'total':<34} n={report['requests']:<6} {report['rps']:8.1f}/s errors={report['errors']}")
+
+
+class Recorder:
+    """Latency samples and error counts per route template."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.started = time.perf_counter()
+
+    async def request(self, client, method, route, path=None, expected=None, **kwargs):
+        name = f"{method} {route}"
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, path or route, **kwargs)
+        except httpx.HTTPError:
+            self.errors[name] += 1
+            return None
+        self.samples[name].append(time.perf_counter() - started)
+        if response.status_code >= 400 and response.status_code != expected:
+            self.errors[name] += 1
+        return response
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started
+        routes = {
+            name: latency_stats(self.samples.get(name, []), elapsed, self.errors.get(name, 0))
+            for name in sorted(set(self.samples) | set(self.errors))
+        }
+        requests = sum(r["count"] for r in routes.values())
+        return {
+            "elapsed_s": round(elapsed, 2),
+            "requests": requests,
+            "rps": round(requests / elapsed, 2) if elapsed else 0.0,
+            "errors": sum(r["errors"] for r in routes.values()),
+            "routes": routes,
+        }
+
+
+async def register_user(client):
+    email = f"bench_{uuid.uuid4().hex[:10]}@example.com"
+    password = "BenchPass123!"
+    response = await client.post("/api/auth/register", json={"email": email, "password": password, "name": "Bench User"})
+    response.raise_for_status()
+    return email, password, response.json()["token"]
+
+
+async def probe(client, path, headers, stop, samples, interval=0.02):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get(path, headers=headers)
+        samples.append(time.perf_counter() - started)
+        await asyncio.sleep(interval)
+
+
+async def login_storm(args):
+    """p99 of an unrelated endpoint while a burst of logins hits bcrypt."""
+    limits = httpx.Limits(max_connections=args.concurrency + 10)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60, limits=limits) as client:
+        email, password, token = await register_user(client)
+        headers = {"Authorization": f"Bearer {token}"}
+
+        idle = []
+        stop = asyncio.Event()
+        prober = asyncio.create_task(probe(client, "/api/profile", headers, stop, idle))
+        await asyncio.sleep(args.duration)
+        stop.set()
+        await prober
+
+        storm = []
+        login_latency = []
+        stop = asyncio.Event()
+        prober = asyncio.create_task(probe(client, "/api/profile", headers, stop, storm))
+
+        async def login_worker(deadline):
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                await client.post("/api/auth/login", json={"email": email, "password": password})
+                login_latency.append(time.perf_counter() - started)
+
+        deadline = time.perf_counter() + args.duration
+        await asyncio.gather(*(login_worker(deadline) for _ in range(args.concurrency)))
+        stop.set()
+        await prober
+
+    print(f"login storm: {args.concurrency} concurrent logins for {args.duration}s against {args.base_url}")
+    report = {"routes": {
+        "GET /api/profile (idle)": latency_stats(idle, args.duration),
+        "GET /api/profile (storm)": latency_stats(storm, args.duration),
+        "POST /api/auth/login": latency_stats(login_latency, args.duration),
+    }}
+    print_routes(report)
+    if idle and storm:
+        print(f"p99 inflation: {percentile(storm, 99) / max(percentile(idle, 99), 1e-9):.1f}x "
+              f"(median idle {statistics.median(idle) * 1000:.1f}ms)")
+    return report
+
+
+def seed_glucose_readings(mongo_url, db_name, user_id, readings, batch_size=10000):
+    """Insert synthetic readings spread over ~3 years straight into MongoDB."""
+    from pymongo import MongoClient
+
+    client = MongoClient(mongo_url)
+    collection = client[db_name].health_metrics
+    step = timedelta(minutes=3 * 365 * 24 * 60 / readings)
+    start = datetime.now(timezone.utc) - step * readings
+    try:
+        for offset in range(0, readings, batch_size):
+            batch = []
+            for i in range(offset, min(offset + batch_size, readings)):
+                value = round(100 + 15 * math.sin(i / 500) + random.gauss(0, 5), 1)
+                batch.append({
+                    "id": str(uuid.uuid4()),
+                    "user_id": user_id,
+                    "metric_type": "glucose",
+                    "value": str(value),
+                    "value_num": value,
+                    "unit": "mg/dL",
+                    "created_at": start + step * i,
+                })
+            collection.insert_many(batch, ordered=False)
+    finally:
+        client.close()
+
+
+async def series(args):
+    """Latency of /api/metrics/series rollups and LTTB over a large synthetic history."""
+    report = {"routes": {}}
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=300) as client:
+        _, _, token = await register_user(client)
+        headers = {"Authorization": f"Bearer {token}"}
+        user_id = (await client.get("/api/profile", headers=headers)).json()["id"]
+
+        started = time.perf_counter()
+        seed_glucose_readings(args.mongo_url, args.db_name, user_id, args.readings)
+        print(f"seeded {args.readings} glucose readings in {time.perf_counter() - started:.1f}s")
+
+        queries = {
+            "bucket=day": {"bucket": "day"},
+            "bucket=week": {"bucket": "week"},
+            "bucket=month": {"bucket": "month"},
+            "bucket=day points=365": {"bucket": "day", "points": 365},
+            "raw points=500 (LTTB)": {"points": 500},
+        }
+        for name, params in queries.items():
+            samples = []
+            size = 0
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                response = await client.get("/api/metrics/series", params={"metric_type": "glucose", **params}, headers=headers)
+                samples.append(time.perf_counter() - started)
+                response.raise_for_status()
+                size = len(response.content)
+            report["routes"][name] = latency_stats(samples)
+            summarize(name, report["routes"][name])
+            print(f"{'':<34} {len(response.json()['points'])} points, {size / 1024:.1f} KiB")
+    return report
+
+
+SEARCH_WORDS = ("headache", "migraine", "nausea", "fatigue", "dizziness", "fever", "cough", "insomnia",
+                "anxiety", "back pain", "blood pressure", "glucose", "sleep", "exercise", "diet", "hydration")
+
+
+def seed_chat_history(mongo_url, db_name, user_id, messages, batch_size=5000):
+    """Insert synthetic chat turns and a symptom report per 20 turns straight into MongoDB."""
+    from pymongo import MongoClient
+
+    client = MongoClient(mongo_url)
+    db = client[db_name]
+    rng = random.Random(1)
+    start = datetime.now(timezone.utc) - timedelta(days=365)
+    try:
+        for offset in range(0, messages, batch_size):
+            chats, reports = [], []
+            for i in range(offset, min(offset + batch_size, messages)):
+                topic, other = rng.sample(SEARCH_WORDS, 2)
+                created_at = start + timedelta(minutes=i * 10)
+                chats.append({
+                    "id": str(uuid.uuid4()),
+                    "user_id": user_id,
+                    "session_id": f"bench-{i // 50}",
+                    "message": f"I have been dealing with {topic} for a few days, could {other} be related?",
+                    "response": f"{topic.capitalize()} can have many causes. " + "Keep track of when it happens and talk to a doctor. " * 4,
+                    "created_at": created_at,
+                })
+                if i % 20 == 0:
+                    reports.append({
+                        "id": str(uuid.uuid4()),
+                        "user_id": user_id,
+                        "symptoms": f"{topic} and {other}",
+                        "analysis": f"Possible causes of {topic} with {other} include stress and poor sleep. " * 6,
+                        "created_at": created_at,
+                    })
+            db.chat_messages.insert_many(chats, ordered=False)
+            if reports:
+                db.symptom_reports.insert_many(reports, ordered=False)
+    finally:
+        client.close()
+
+
+async def search(args):
+    """Latency of /api/search over a large synthetic chat history (needs a real mongod for $text)."""
+    report = {"routes": {}}
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60) as client:
+        _, _, token = await register_user(client)
+        headers = {"Authorization": f"Bearer {token}"}
+        user_id = (await client.get("/api/profile", headers=headers)).json()["id"]
+
+        started = time.perf_counter()
+        seed_chat_history(args.mongo_url, args.db_name, user_id, args.messages)
+        print(f"seeded {args.messages} chat messages in {time.perf_counter() - started:.1f}s")
+
+        queries = {
+            "rare word": {"q": "insomnia"},
+            "common word": {"q": "doctor"},
+            "two words": {"q": "migraine nausea"},
+            "phrase": {"q": '"blood pressure"'},
+            "symptoms only": {"q": "fever", "kind": "symptoms"},
+        }
+        for name, params in queries.items():
+            samples = []
+            cursor = None
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                response = await client.get("/api/search", params={**params, "limit": 20}, headers=headers)
+                samples.append(time.perf_counter() - started)
+                response.raise_for_status()
+                cursor = response.json()["next_cursor"]
+            report["routes"][name] = latency_stats(samples)
+            summarize(name, report["routes"][name])
+            if cursor:
+                samples = []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    response = await client.get("/api/search", params={**params, "limit": 20, "cursor": cursor}, headers=headers)
+                    samples.append(time.perf_counter() - started)
+                    response.raise_for_status()
+                report["routes"][f"{name} page 2"] = latency_stats(samples)
+                summarize(f"{name} page 2", report["routes"][f"{name} page 2"])
+    return report
+
+
+async def server_rss(client):
+    """The backend's resident memory in bytes, from its Prometheus metrics."""
+    response = await client.get("/internal/metrics")
+    for line in response.text.splitlines():
+        if line.startswith("process_resident_memory_bytes "):
+            return float(line.split()[1])
+    raise SystemExit("/internal/metrics has no process_resident_memory_bytes")
+
+
+async def push_idle(args):
+    """Server memory and connect latency for --connections idle /api/ws push connections."""
+    import websockets
+
+    ws_url = args.base_url.replace("http", "ws", 1) + "/api/ws"
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60) as client:
+        tokens = [(await register_user(client))[2] for _ in range(args.users)]
+        before = await server_rss(client)
+
+        connect_latency = []
+        failures = 0
+        connections = []
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def connect(index):
+            nonlocal failures
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    # The client library answers protocol pings; the app-level ping needs a pong
+                    websocket = await websockets.connect(ws_url, open_timeout=30, max_queue=4)
+                    await websocket.send(json.dumps({"type": "auth", "token": tokens[index % len(tokens)]}))
+                    ready = json.loads(await websocket.recv())
+                    assert ready["type"] == "ready", ready
+                except Exception:
+                    failures += 1
+                    return
+                connect_latency.append(time.perf_counter() - started)
+                connections.append(websocket)
+
+        async def answer_pings(websocket):
+            async for frame in websocket:
+                if json.loads(frame).get("type") == "ping":
+                    await websocket.send('{"type": "pong"}')
+
+        started = time.perf_counter()
+        await asyncio.gather(*(connect(index) for index in range(args.connections)))
+        connect_elapsed = time.perf_counter() - started
+        responders = [asyncio.create_task(answer_pings(websocket)) for websocket in connections]
+        await asyncio.sleep(args.duration)
+        after = await server_rss(client)
+        stats = (await client.get("/internal/metrics")).text
+
+        for responder in responders:
+            responder.cancel()
+        await asyncio.gather(*(websocket.close() for websocket in connections), return_exceptions=True)
+
+    held = len(connections)
+    per_connection = (after - before) / held if held else 0.0
+    print(f"push_idle: {held}/{args.connections} connections across {args.users} users held {args.duration:g}s "
+          f"against {args.base_url}")
+    report = {"routes": {"WS /api/ws connect": latency_stats(connect_latency, connect_elapsed, failures)}}
+    print_routes(report)
+    report["routes"]["WS /api/ws idle"] = {
+        "connections": held,
+        "rss_before_mib": round(before / 2**20, 1),
+        "rss_after_mib": round(after / 2**20, 1),
+        "kib_per_connection": round(per_connection / 1024, 1),
+    }
+    print(f"server RSS {before / 2**20:.1f} MiB -> {after / 2**20:.1f} MiB: {per_connection / 1024:.1f} KiB per connection")
+    gauge = next((line for line in stats.splitlines() if line.startswith("app_push_connections ")), None)
+    if gauge:
+        print(f"server reports {gauge.split()[1]} open push connections")
+    return report
+
+
+async def startup(args):
+    """Cold start: the interpreter alone, `import server`, and launch until the backend answers."""
+    backend_dir = ROOT_DIR / "backend"
+    # Without credentials, since importing server must not need them
+    bare_env = {key: value for key, value in os.environ.items()
+                if key not in ("MONGO_URL", "DB_NAME", "JWT_SECRET", "EMERGENT_LLM_KEY")}
+
+    def run(code):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=backend_dir, env=bare_env, check=True)
+        return time.perf_counter() - started
+
+    interpreter = [run("pass") for _ in range(args.repeat)]
+    imports = [run("import server") for _ in range(args.repeat)]
+
+    ready = []
+    async with httpx.AsyncClient(timeout=1) as client:
+        for _ in range(args.repeat):
+            port = free_port()
+            env = {
+                "MONGO_URL": args.mongo_url,
+                "DB_NAME": f"bench_{uuid.uuid4().hex[:8]}",
+                "JWT_SECRET": os.environ.get("JWT_SECRET", "bench-secret"),
+                "EMERGENT_LLM_KEY": os.environ.get("EMERGENT_LLM_KEY", "bench"),
+                "BENCH_MONGO": args.mongo,
+            }
+            started = time.perf_counter()
+            process = subprocess.Popen([sys.executable, "tests/bench_server.py", "--port", str(port)],
+                                       cwd=ROOT_DIR, env={**os.environ, **env})
+            try:
+                while True:
+                    if process.poll() is not None:
+                        raise SystemExit(f"the backend exited with {process.returncode}")
+                    try:
+                        if (await client.get(f"http://127.0.0.1:{port}/internal/metrics")).status_code == 200:
+                            break
+                    except httpx.HTTPError:
+                        pass
+                    await asyncio.sleep(0.01)
+                ready.append(time.perf_counter() - started)
+            finally:
+                process.terminate()
+                process.wait()
+
+    print(f"startup: {args.repeat} runs each ({args.mongo})")
+    report = {"routes": {
+        "python -c pass": latency_stats(interpreter),
+        "python -c 'import server'": latency_stats(imports),
+        "launch to first response": latency_stats(ready),
+    }}
+    print_routes(report)
+    return report
+
+
+async def auth(args):
+    """Per-request cost of token verification: bare jwt.decode vs cold and warm TokenVerifier."""
+    sys.path.insert(0, str(ROOT_DIR / "backend"))
+    import jwt
+    from tokens import TokenVerifier
+
+    iterations = args.repeat * 10000
+    warm = TokenVerifier("bench-secret")
+    cold = TokenVerifier("bench-secret", cache_size=0)
+    tokens = [warm.issue(f"user-{i}") for i in range(100)]
+    report = {"routes": {}}
+
+    def record(name, elapsed):
+        report["routes"][name] = {"mean_us": round(elapsed / iterations * 1e6, 3)}
+        print(f"{name:<34} {elapsed / iterations * 1e6:8.2f}us/request")
+
+    started = time.perf_counter()
+    for i in range(iterations):
+        jwt.decode(tokens[i % len(tokens)], "bench-secret", algorithms=["HS256"])
+    record("jwt.decode", time.perf_counter() - started)
+
+    for name, verifier in (("TokenVerifier (no cache)", cold), ("TokenVerifier (cached)", warm)):
+        started = time.perf_counter()
+        for i in range(iterations):
+            await verifier.verify(tokens[i % len(tokens)])
+        record(name, time.perf_counter() - started)
+    print(f"cache: {warm.stats()}")
+    return report
+
+
+async def ratelimit(args):
+    """Per-request cost of the in-memory rate limiter, across many users' buckets."""
+    sys.path.insert(0, str(ROOT_DIR / "backend"))
+    from ratelimit import RateLimit, RateLimited, RateLimiter
+
+    iterations = args.repeat * 20000
+    limiter = RateLimiter({"chat": RateLimit(20, 60)})
+    users = [f"user-{i}" for i in range(args.users * 100)]
+    report = {"routes": {}}
+
+    started = time.perf_counter()
+    for i in range(iterations):
+        try:
+            await limiter.check("chat", users[i % len(users)])
+        except RateLimited:
+            pass
+    elapsed = time.perf_counter() - started
+    report["routes"]["RateLimiter.check"] = {"mean_us": round(elapsed / iterations * 1e6, 3)}
+    print(f"{'RateLimiter.check':<34} {elapsed / iterations * 1e6:8.2f}us/request")
+    print(f"limiter: {limiter.stats()}")
+    return report
+
+
+async def serialize(args):
+    """Cost of turning one /api/metrics page into a response body, per FAST_RESPONSES path."""
+    import tracemalloc
+    from bson.tz_util import utc
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_response_field
+
+    sys.path.insert(0, str(ROOT_DIR / "backend"))
+    for name, value in (("MONGO_URL", "mongodb://localhost:27017"), ("DB_NAME", "bench"),
+                        ("JWT_SECRET", "bench-secret"), ("EMERGENT_LLM_KEY", "bench")):
+        os.environ.setdefault(name, value)  # server.py needs them to import; nothing connects
+    from pagination import Page
+    from responses import page_response
+    from server import HealthMetric
+
+    now = datetime.now(utc).replace(microsecond=123000)
+    docs = [
+        {
+            "id": str(uuid.uuid4()),
+            "user_id": "bench-user",
+            "metric_type": "heart_rate",
+            "value": str(60 + i % 40),
+            "unit": "bpm",
+            "notes": None,
+            "value_num": float(60 + i % 40),
+            "systolic": None,
+            "diastolic": None,
+            "idempotency_key": uuid.uuid4().hex,
+            "created_at": now - timedelta(minutes=5 * i),
+        }
+        for i in range(args.page_size)
+    ]
+    field = create_response_field("Response_get_health_metrics", Page[HealthMetric], mode="serialization")
+
+    async def fastapi_page():
+        # What FastAPI does with the Page a route returns: dump, validate again, jsonable_encoder, json.dumps
+        content = await serialize_response(field=field, response_content=Page(items=docs))
+        return JSONResponse(content).body
+
+    async def orjson_validate():
+        return page_response(HealthMetric, docs, None).body
+
+    async def orjson_raw():
+        return page_response(HealthMetric, docs, None, raw=True).body
+
+    paths = {
+        "FAST_RESPONSES=off": fastapi_page,
+        "FAST_RESPONSES=validate": orjson_validate,
+        "FAST_RESPONSES=raw": orjson_raw,
+    }
+    bodies = {name: json.loads(await build()) for name, build in paths.items()}
+    if any(body != bodies["FAST_RESPONSES=off"] for body in bodies.values()):
+        raise SystemExit("serialization paths disagree on the response body")
+
+    iterations = args.repeat * 100
+    report = {"routes": {}}
+    print(f"one page of {args.page_size} health metrics, {len(await fastapi_page()) / 1024:.1f} KiB of JSON")
+    for name, build in paths.items():
+        started = time.perf_counter()
+        for _ in range(iterations):
+            await build()
+        elapsed = time.perf_counter() - started
+
+        tracemalloc.start()
+        await build()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        report["routes"][name] = {
+            "mean_us": round(elapsed / iterations * 1e6, 1),
+            "pages_per_s": round(iterations / elapsed, 1),
+            "peak_kib": round(peak / 1024, 1),
+        }
+        print(f"{name:<34} {elapsed / iterations * 1e6:8.0f}us/page {iterations / elapsed:8.0f} pages/s "
+              f"peak {peak / 1024:8.1f} KiB allocated")
+    return report
+
+
+# Mixed workload: each virtual user loops over these, picked by --mix weight
+
+async def login_workload(client, user, rng, recorder):
+    await recorder.request(client, "POST", "/api/auth/login", json={"email": user["email"], "password": user["password"]})
+
+
+async def chat_workload(client, user, rng, recorder):
+    """A short conversation in one session; the third turn, if any, is streamed."""
+    session_id = None
+    for turn in range(rng.randint(2, 4)):
+        body = {"message": f"Is {rng.choice(['walking', 'sleep', 'hydration', 'caffeine'])} good for headaches? ({turn})"}
+        if session_id:
+            body["session_id"] = session_id
+        if turn == 2:
+            await recorder.request(client, "POST", "/api/chat/message/stream", json=body, headers=user["headers"])
+            continue
+        response = await recorder.request(client, "POST", "/api/chat/message", json=body, headers=user["headers"])
+        if response is not None and response.status_code == 200:
+            session_id = response.json()["session_id"]
+
+
+async def sync_workload(client, user, rng, recorder):
+    """A device sync: a batch of heart-rate readings through the bulk endpoint."""
+    now = datetime.now(timezone.utc)
+    records = [
+        {
+            "metric_type": "heart_rate",
+            "value": str(rng.randint(55, 110)),
+            "unit": "bpm",
+            "created_at": (now - timedelta(minutes=5 * i)).isoformat(),
+            "idempotency_key": uuid.UUID(int=rng.getrandbits(128)).hex,
+        }
+        for i in range(rng.randint(20, 100))
+    ]
+    await recorder.request(client, "POST", "/api/metrics/bulk", json=records, headers=user["headers"])
+
+
+async def dashboard_workload(client, user, rng, recorder):
+    """The dashboard's first paint, then the lists the user opens next."""
+    await recorder.request(client, "GET", "/api/dashboard/summary", headers=user["headers"])
+    await recorder.request(client, "GET", "/api/metrics", params={"limit": 20}, headers=user["headers"])
+    await recorder.request(client, "GET", "/api/reminders", params={"limit": 20}, headers=user["headers"])
+
+
+WORKLOADS = {
+    "login": login_workload,
+    "chat": chat_workload,
+    "sync": sync_workload,
+    "dashboard": dashboard_workload,
+}
+DEFAULT_MIX = "login=1,chat=2,sync=2,dashboard=5"
+
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.strip().partition("=")
+        if name not in WORKLOADS:
+            raise SystemExit(f"Unknown workload {name!r}; choose from {', '.join(WORKLOADS)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+async def mixed(args):
+    """Closed-loop mixed workload: --concurrency virtual users for --duration seconds."""
+    weights = parse_mix(args.mix)
+    limits = httpx.Limits(max_connections=args.concurrency + 10)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=120, limits=limits) as client:
+        users = []
+        for _ in range(args.users):
+            email, password, token = await register_user(client)
+            users.append({"email": email, "password": password, "headers": {"Authorization": f"Bearer {token}"}})
+
+        recorder = Recorder()
+        deadline = time.perf_counter() + args.duration
+
+        async def virtual_user(index):
+            # Seeded per user so a run's request sequence is reproducible
+            rng = random.Random(args.seed * 1000 + index)
+            while time.perf_counter() < deadline:
+                workload = rng.choices(list(weights), weights=list(weights.values()))[0]
+                await WORKLOADS[workload](client, rng.choice(users), rng, recorder)
+
+        await asyncio.gather(*(virtual_user(i) for i in range(args.concurrency)))
+        report = recorder.report()
+
+    print(f"mixed workload ({args.mix}): {args.concurrency} virtual users over {args.users} accounts "
+          f"for {args.duration}s against {args.base_url}")
+    print_routes(report)
+    return report
+
+
+async def smoke_push(args, token, failures):
+    """Authenticate on /api/ws, answer a ping with a pong and get a list change pushed."""
+    import websockets
+
+    ws_url = args.base_url.replace("http", "ws", 1) + "/api/ws"
+    try:
+        async with websockets.connect(ws_url, open_timeout=30) as websocket:
+            await websocket.send(json.dumps({"type": "auth", "token": token}))
+            ready = json.loads(await asyncio.wait_for(websocket.recv(), 10))
+            if ready.get("type") != "ready":
+                failures.append(f"WS /api/ws: expected a ready frame, got {ready}")
+                return
+            await websocket.send(json.dumps({"type": "ping"}))
+            pong = json.loads(await asyncio.wait_for(websocket.recv(), 10))
+            if pong.get("type") != "pong":
+                failures.append(f"WS /api/ws: expected a pong, got {pong}")
+    except Exception as e:
+        failures.append(f"WS /api/ws: {e!r}")
+
+
+async def smoke(args):
+    """Every endpoint once, checking status codes and what was stored."""
+    import gzip
+
+    recorder = Recorder()
+    failures = []
+
+    def expect(condition, message):
+        if not condition:
+            failures.append(message)
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60) as client:
+        async def check(method, route, expected=200, path=None, raw=False, **kwargs):
+            response = await recorder.request(client, method, route, path, expected, **kwargs)
+            status = response.status_code if response is not None else "no response"
+            if status != expected:
+                failures.append(f"{method} {path or route}: expected {expected}, got {status}")
+                return None if raw else {}
+            if raw or status == 304:
+                return response
+            if "ndjson" in response.headers.get("content-type", ""):
+                # Streamed endpoints end with a "done" (or "error") event
+                last = json.loads(response.text.strip().splitlines()[-1])
+                if last.get("type") == "error":
+                    failures.append(f"{method} {path or route}: stream ended with {last}")
+                return last
+            return response.json()
+
+        email, password, token = await register_user(client)
+        headers = {"Authorization": f"Bearer {token}"}
+        await check("POST", "/api/auth/login", json={"email": email, "password": password})
+        await check("POST", "/api/auth/login", 401, json={"email": email, "password": "wrong"})
+        await check("GET", "/api/profile", 403)
+        await check("GET", "/api/profile", headers=headers)
+        await check("PATCH", "/api/profile", json={"name": "Smoke User"}, headers=headers)
+
+        chat = await check("POST", "/api/chat/message", json={"message": "Hello"}, headers=headers)
+        await check("POST", "/api/chat/message", json={"message": "And again", "session_id": chat.get("session_id")}, headers=headers)
+        await check("POST", "/api/chat/message/stream", json={"message": "Stream please"}, headers=headers)
+        await check("GET", "/api/chat/history", headers=headers)
+        history = await check("GET", "/api/chat/history", params={"archived": "true"}, headers=headers)
+        expect(len(history.get("items", [])) == 3, f"GET /api/chat/history?archived=true: expected 3 messages, got {history}")
+
+        symptoms = {"symptoms": "headache and fever", "duration": "2 days", "severity": "moderate"}
+        await check("POST", "/api/symptoms/analyze", json=symptoms, headers=headers)
+        await check("POST", "/api/symptoms/analyze/stream", json=symptoms, headers=headers)
+        job = await check("POST", "/api/symptoms/analyze", 202, params={"async": "true"},
+                          json={**symptoms, "severity": "mild"}, headers=headers)
+        if job:
+            await check("GET", "/api/jobs/{job_id}", path=f"/api/jobs/{job['id']}", params={"wait": 10}, headers=headers)
+        await check("GET", "/api/symptoms/history", headers=headers)
+
+        # Keyless readings are all stored; a retried key is stored once
+        metric = await check("POST", "/api/metrics", json={"metric_type": "weight", "value": "72.5", "unit": "kg"}, headers=headers)
+        await check("POST", "/api/metrics", json={"metric_type": "weight", "value": "72.4", "unit": "kg"}, headers=headers)
+        keyed = {"metric_type": "weight", "value": "72.3", "unit": "kg", "idempotency_key": "smoke-1"}
+        first = await check("POST", "/api/metrics", json=keyed, headers=headers)
+        retry = await check("POST", "/api/metrics", json=keyed, headers=headers)
+        expect(first.get("id") and first.get("id") == retry.get("id"),
+               f"POST /api/metrics: a retried idempotency_key stored a second reading ({first} / {retry})")
+        bulk = await check("POST", "/api/metrics/bulk", json=[
+            {"metric_type": "heart_rate", "value": str(60 + index), "unit": "bpm"} for index in range(5)
+        ] + [keyed], headers=headers)
+        expect(bulk.get("inserted") == 5 and bulk.get("duplicates") == [5],
+               f"POST /api/metrics/bulk: expected 5 inserted and record 5 a duplicate, got {bulk}")
+        metrics = await check("GET", "/api/metrics", headers=headers)
+        expect(len(metrics.get("items", [])) == 8, f"GET /api/metrics: expected 8 stored readings, got {len(metrics.get('items', []))}")
+        series = await check("GET", "/api/metrics/series", params={"metric_type": "heart_rate", "points": 3}, headers=headers)
+        expect(series.get("total") == 5 and len(series.get("points", [])) == 3,
+               f"GET /api/metrics/series: expected 3 points from 5 readings, got {series}")
+        if metric:
+            await check("DELETE", "/api/metrics/{metric_id}", path=f"/api/metrics/{metric['id']}", headers=headers)
+
+        when = (datetime.now(timezone.utc) + timedelta(days=1)).isoformat()
+        reminder = await check("POST", "/api/reminders", json={
+            "reminder_type": "medication", "title": "Vitamin D", "scheduled_time": when, "repeat": "daily",
+        }, headers=headers)
+        reminders = await check("GET", "/api/reminders", raw=True, headers=headers)
+        if reminders is not None:
+            await check("GET", "/api/reminders", 304, headers={**headers, "If-None-Match": reminders.headers.get("etag", "")})
+        if reminder:
+            await check("PATCH", "/api/reminders/{reminder_id}/complete",
+                        path=f"/api/reminders/{reminder['id']}/complete", headers=headers)
+            await check("DELETE", "/api/reminders/{reminder_id}", path=f"/api/reminders/{reminder['id']}", headers=headers)
+        await check("GET", "/api/dashboard/summary", headers=headers)
+
+        # mongomock has no $text, so search answers as if its index were still building
+        await check("GET", "/api/search", 503 if args.mongo == "mongomock" else 200, params={"q": "headache"}, headers=headers)
+        export = await check("GET", "/api/export", raw=True, headers=headers)
+        if export is not None:
+            events = [json.loads(line) for line in gzip.decompress(export.content).splitlines()]
+            counts = events[-1].get("counts", {}) if events else {}
+            expect(counts.get("chat_messages") == 3 and counts.get("health_metrics") == 7,
+                   f"GET /api/export: unexpected counts {events[-1] if events else None}")
+            checkpoints = [event["resume"] for event in events if event.get("type") == "checkpoint"]
+            resumed = await check("GET", "/api/export", raw=True, params={"resume": checkpoints[0]}, headers=headers) \
+                if checkpoints else None
+            if resumed is not None:
+                done = json.loads(gzip.decompress(resumed.content).splitlines()[-1])
+                expect(done.get("type") == "done" and done["counts"].get("chat_messages") == 0,
+                       f"GET /api/export?resume=: expected to continue after chat_messages, got {done}")
+        await smoke_push(args, token, failures)
+        scrape = await check("GET", "/internal/metrics", raw=True)
+        expect(scrape is None or "http_requests_in_progress" in scrape.text, "GET /internal/metrics: no request metrics in the scrape")
+
+        await check("POST", "/api/auth/logout", headers=headers)
+        await check("GET", "/api/profile", 401, headers=headers)
+
+    report = recorder.report()
+    print_routes(report)
+    for failure in failures:
+        print(f"FAILED {failure}")
+    print(f"{report['requests'] - len(failures)}/{report['requests']} checks passed")
+    report["failures"] = failures
+    return report
+
+
+SCENARIOS = {
+    "auth": auth,
+    "login_storm": login_storm,
+    "mixed": mixed,
+    "push_idle": push_idle,
+    "ratelimit": ratelimit,
+    "search": search,
+    "serialize": serialize,
+    "series": series,
+    "smoke": smoke,
+    "startup": startup,
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class LocalStack:
+    """The fake LLM and the backend as subprocesses on free ports, stopped on exit."""
+
+    def __init__(self, args):
+        self.args = args
+        self.processes = []
+
+    def _spawn(self, command, env):
+        process = subprocess.Popen(command, cwd=ROOT_DIR, env={**os.environ, **env})
+        self.processes.append(process)
+        return process
+
+    def _wait_ready(self, url, process, timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise SystemExit(f"{' '.join(process.args)} exited with {process.returncode}")
+            try:
+                if httpx.get(url, timeout=1).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        raise SystemExit(f"{url} did not come up within {timeout}s")
+
+    def __enter__(self):
+        args = self.args
+        llm_port, api_port = free_port(), free_port()
+        try:
+            llm = self._spawn(
+                [sys.executable, "-m", "uvicorn", "tests.fake_llm:app", "--port", str(llm_port), "--log-level", "warning"],
+                {"FAKE_LLM_FIRST_TOKEN_MS": str(args.llm_first_token_ms), "FAKE_LLM_TOKEN_MS": str(args.llm_token_ms)},
+            )
+            self._wait_ready(f"http://127.0.0.1:{llm_port}/docs", llm)
+
+            env = {
+                "MONGO_URL": args.mongo_url,
+                "DB_NAME": f"bench_{uuid.uuid4().hex[:8]}",
+                "JWT_SECRET": os.environ.get("JWT_SECRET", "bench-secret"),
+                "EMERGENT_LLM_KEY": os.environ.get("EMERGENT_LLM_KEY", "bench"),
+                "OPENAI_BASE_URL": f"http://127.0.0.1:{llm_port}/v1",
+                "BENCH_MONGO": args.mongo,
+            }
+            api = self._spawn([sys.executable, "tests/bench_server.py", "--port", str(api_port)], env)
+            args.base_url = f"http://127.0.0.1:{api_port}"
+            args.db_name = env["DB_NAME"]
+            self._wait_ready(f"{args.base_url}/internal/metrics", api)
+        except BaseException:
+            self.__exit__()
+            raise
+        print(f"booted backend at {args.base_url} ({args.mongo}, db {args.db_name}), fake LLM at :{llm_port} "
+              f"({args.llm_first_token_ms:g}ms to first token, {args.llm_token_ms:g}ms/token)")
+        return self
+
+    def __exit__(self, *exc):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+# (result field, True when higher is worse)
+COMPARED = (("p95_ms", True), ("p99_ms", True), ("mean_us", True), ("peak_kib", True), ("kib_per_connection", True), ("rps", False))
+
+
+def compare(report, baseline, tolerance):
+    """Print per-route changes against a baseline and return the regressions."""
+    regressions = []
+    print(f"\ncompared with the baseline from {baseline.get('recorded_at', 'an unknown date')} "
+          f"(tolerance {tolerance:.0%}):")
+    for name, current in report["routes"].items():
+        previous = baseline.get("routes", {}).get(name)
+        if not previous:
+            print(f"  {name:<34} new")
+            continue
+        changes = []
+        for key, higher_is_worse in COMPARED:
+            if key not in current or not previous.get(key):
+                continue
+            change = (current[key] - previous[key]) / previous[key]
+            worse = change > tolerance if higher_is_worse else change < -tolerance
+            if worse:
+                regressions.append(f"{name} {key}")
+            changes.append(f"{key} {previous[key]:g} -> {current[key]:g} ({change:+.0%}){' REGRESSION' if worse else ''}")
+        print(f"  {name:<34} {'; '.join(changes)}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenario", choices=sorted(SCENARIOS))
+    parser.add_argument("--base-url", default="http://localhost:8001")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db-name", default=os.environ.get("DB_NAME", "health_assistant"))
+    parser.add_argument("--readings", type=int, default=1_000_000)
+    parser.add_argument("--messages", type=int, default=50_000, help="chat messages seeded by the search scenario")
+    parser.add_argument("--connections", type=int, default=10_000, help="WebSockets opened by the push_idle scenario")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--page-size", type=int, default=200)
+    parser.add_argument("--users", type=int, default=20, help="accounts shared by the mixed workload's virtual users")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"workload weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--boot", action="store_true", help="start the fake LLM and the backend locally")
+    parser.add_argument("--mongo", choices=["mongod", "mongomock"], default="mongod", help="database for --boot")
+    parser.add_argument("--llm-first-token-ms", type=float, default=300)
+    parser.add_argument("--llm-token-ms", type=float, default=20)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args()
+
+    if args.boot:
+        with LocalStack(args):
+            report = asyncio.run(SCENARIOS[args.scenario](args))
+    else:
+        report = asyncio.run(SCENARIOS[args.scenario](args))
+
+    report = {
+        "scenario": args.scenario,
+        "recorded_at": datetime.now(timezone.utc).isoformat(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        **report,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+        print(f"results written to {args.output}")
+
+    failed = bool(report.get("failures"))
+    if args.baseline:
+        failed = bool(compare(report, json.loads(Path(args.baseline).read_text()), args.tolerance)) or failed
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,6 @@
 import React, { createContext, useContext, useState, useEffect } from 'react';
 import axios from 'axios';
+import { closePush } from '@/services/api';
 
 const AuthContext = createContext(null);
 
@@ -52,6 +53,13 @@ export const AuthProvider = ({ children }) => {
   };
 
   const logout = () => {
+    closePush();
+    if (token) {
+      // Revoke the token server-side; the local session ends either way
+      axios.post(`${API}/auth/logout`, null, {
+        headers: { Authorization: `Bearer ${token}` }
+      }).catch(() => {});
+    }
     localStorage.removeItem('token');
     setToken(null);
     setUser(null);
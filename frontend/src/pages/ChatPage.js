@@ -4,7 +4,7 @@ import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
 import { Input } from '@/components/ui/input';
 import { Heart, Send, ArrowLeft, Bot, User } from 'lucide-react';
-import { sendChatMessage, getChatHistory } from '@/services/api';
+import { streamChatMessage, getChatHistory } from '@/services/api';
 import { toast } from 'sonner';
 
 const ChatPage = () => {
@@ -12,6 +12,7 @@ const ChatPage = () => {
   const [messages, setMessages] = useState([]);
   const [input, setInput] = useState('');
   const [loading, setLoading] = useState(false);
+  const [pending, setPending] = useState(null);
   const [sessionId] = useState(() => `session-${Date.now()}`);
   const messagesEndRef = useRef(null);
 
@@ -43,12 +44,17 @@ const ChatPage = () => {
     setInput('');
     setLoading(true);
 
+    setPending({ message: userMessage, response: '' });
+
     try {
-      const response = await sendChatMessage(userMessage, sessionId);
-      setMessages([...messages, response]);
+      const response = await streamChatMessage(userMessage, sessionId, (delta) => {
+        setPending((current) => current && { ...current, response: current.response + delta });
+      });
+      setMessages((current) => [...current, response]);
     } catch (error) {
       toast.error('Failed to send message');
     } finally {
+      setPending(null);
       setLoading(false);
     }
   };
@@ -126,7 +132,30 @@ const ChatPage = () => {
               </div>
             ))}
 
-            {loading && (
+            {pending && (
+              <div className="space-y-4">
+                <div className="flex justify-end">
+                  <div className="chat-bubble chat-bubble-user flex items-start gap-3 max-w-[80%]">
+                    <div className="flex-1">
+                      <p className="text-sm">{pending.message}</p>
+                    </div>
+                    <User className="w-5 h-5 flex-shrink-0" />
+                  </div>
+                </div>
+                {pending.response && (
+                  <div className="flex justify-start">
+                    <div className="chat-bubble chat-bubble-ai flex items-start gap-3 max-w-[80%]">
+                      <Bot className="w-5 h-5 text-primary flex-shrink-0" />
+                      <div className="flex-1">
+                        <p className="text-sm whitespace-pre-wrap" data-testid="ai-response-streaming">{pending.response}</p>
+                      </div>
+                    </div>
+                  </div>
+                )}
+              </div>
+            )}
+
+            {loading && !pending?.response && (
               <div className="flex justify-start">
                 <div className="chat-bubble chat-bubble-ai flex items-center gap-3">
                   <Bot className="w-5 h-5 text-primary" />
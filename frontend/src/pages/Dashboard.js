@@ -4,7 +4,7 @@ import { useAuth } from '@/context/AuthContext';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
 import { Heart, MessageCircle, Activity, Bell, User, LogOut, TrendingUp, Calendar } from 'lucide-react';
-import { getHealthMetrics, getReminders } from '@/services/api';
+import { getDashboardSummary, subscribePush } from '@/services/api';
 import { toast } from 'sonner';
 
 const Dashboard = () => {
@@ -18,14 +18,20 @@ const Dashboard = () => {
     loadDashboardData();
   }, []);
 
+  useEffect(() => subscribePush((event) => {
+    if (event.type === 'reminder') {
+      toast(event.reminder.title, { description: event.reminder.description });
+    }
+    if (['ready', 'changed', 'reminder'].includes(event.type)) {
+      loadDashboardData();
+    }
+  }), []);
+
   const loadDashboardData = async () => {
     try {
-      const [metricsData, remindersData] = await Promise.all([
-        getHealthMetrics(),
-        getReminders()
-      ]);
-      setMetrics(metricsData.slice(0, 5));
-      setReminders(remindersData.filter(r => !r.completed).slice(0, 3));
+      const summary = await getDashboardSummary({ reminders: 3 });
+      setMetrics(summary.latest_metrics);
+      setReminders(summary.upcoming_reminders);
     } catch (error) {
       toast.error('Failed to load dashboard data');
     } finally {
@@ -7,13 +7,14 @@ import { Label } from '@/components/ui/label';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@/components/ui/select';
 import { Dialog, DialogContent, DialogHeader, DialogTitle, DialogTrigger } from '@/components/ui/dialog';
 import { Heart, ArrowLeft, TrendingUp, Trash2, Plus } from 'lucide-react';
-import { getHealthMetrics, addHealthMetric, deleteHealthMetric } from '@/services/api';
+import { getHealthMetrics, getMetricSeries, addHealthMetric, deleteHealthMetric } from '@/services/api';
 import { toast } from 'sonner';
 import { LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer } from 'recharts';
 
 const HealthMetricsPage = () => {
   const navigate = useNavigate();
   const [metrics, setMetrics] = useState([]);
+  const [series, setSeries] = useState([]);
   const [selectedType, setSelectedType] = useState('all');
   const [isDialogOpen, setIsDialogOpen] = useState(false);
   const [newMetric, setNewMetric] = useState({
@@ -30,8 +31,12 @@ const HealthMetricsPage = () => {
   const loadMetrics = async () => {
     try {
       const type = selectedType === 'all' ? null : selectedType;
-      const data = await getHealthMetrics(type);
+      const [data, trend] = await Promise.all([
+        getHealthMetrics(type),
+        type ? getMetricSeries(type, { points: 60 }) : Promise.resolve({ points: [] }),
+      ]);
       setMetrics(data);
+      setSeries(trend.points);
     } catch (error) {
       toast.error('Failed to load metrics');
     }
@@ -67,13 +72,10 @@ const HealthMetricsPage = () => {
   const getChartData = () => {
     if (selectedType === 'all') return [];
     
-    return metrics
-      .slice(0, 10)
-      .reverse()
-      .map(m => ({
-        date: new Date(m.created_at).toLocaleDateString('en-US', { month: 'short', day: 'numeric' }),
-        value: parseFloat(m.value) || 0
-      }));
+    return series.map(p => ({
+      date: new Date(p.t).toLocaleDateString('en-US', { month: 'short', day: 'numeric' }),
+      value: p.avg
+    }));
   };
 
   const metricTypes = [
@@ -8,7 +8,7 @@ import { Textarea } from '@/components/ui/textarea';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@/components/ui/select';
 import { Dialog, DialogContent, DialogHeader, DialogTitle, DialogTrigger } from '@/components/ui/dialog';
 import { Bell, ArrowLeft, Plus, Trash2, Check, Clock } from 'lucide-react';
-import { getReminders, createReminder, completeReminder, deleteReminder } from '@/services/api';
+import { getReminders, createReminder, completeReminder, deleteReminder, subscribePush } from '@/services/api';
 import { toast } from 'sonner';
 
 const RemindersPage = () => {
@@ -28,6 +28,16 @@ const RemindersPage = () => {
     loadReminders();
   }, []);
 
+  useEffect(() => subscribePush((event) => {
+    if (event.type === 'reminder') {
+      toast(event.reminder.title, { description: event.reminder.description });
+    }
+    if (event.type === 'ready' || event.type === 'reminder'
+        || (event.type === 'changed' && event.collections.includes('reminders'))) {
+      loadReminders();
+    }
+  }), []);
+
   const loadReminders = async () => {
     try {
       const data = await getReminders();
@@ -8,6 +8,164 @@ const getAuthHeaders = () => {
   return { Authorization: `Bearer ${token}` };
 };
 
+// List and dashboard responses carry an ETag. Repeat requests send it back as
+// If-None-Match; on a 304 (nothing changed) the body kept from last time is reused.
+const MAX_REVALIDATED_RESPONSES = 50;
+const revalidated = new Map();
+
+const getRevalidated = async (path, params = {}) => {
+  const headers = getAuthHeaders();
+  const key = JSON.stringify([headers.Authorization, path, params]);
+  const cached = revalidated.get(key);
+  const response = await axios.get(`${API}${path}`, {
+    headers: cached ? { ...headers, 'If-None-Match': cached.etag } : headers,
+    params,
+    validateStatus: (status) => (status >= 200 && status < 300) || status === 304,
+  });
+
+  revalidated.delete(key);
+  if (response.status === 304) {
+    revalidated.set(key, cached);
+    return cached.data;
+  }
+  if (response.headers.etag) {
+    revalidated.set(key, { etag: response.headers.etag, data: response.data });
+    if (revalidated.size > MAX_REVALIDATED_RESPONSES) {
+      revalidated.delete(revalidated.keys().next().value);
+    }
+  }
+  return response.data;
+};
+
+// List endpoints return { items, next_cursor }. The *Page helpers expose the
+// cursor; pass it back as `cursor` to fetch the next page (null when done).
+const getPage = (path, params = {}) => getRevalidated(path, params);
+
+export const getAllPages = async (fetchPage, { maxPages = Infinity } = {}) => {
+  const items = [];
+  let cursor = null;
+  for (let page = 0; page < maxPages; page += 1) {
+    const result = await fetchPage(cursor);
+    items.push(...result.items);
+    cursor = result.next_cursor;
+    if (!cursor) break;
+  }
+  return items;
+};
+
+// Reads an NDJSON stream of {type: 'delta' | 'done' | 'error'} events.
+// onDelta receives each text chunk; resolves with the final 'done' event.
+const readNdjsonStream = async (path, body, onDelta) => {
+  const response = await fetch(`${API}${path}`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', ...getAuthHeaders() },
+    body: JSON.stringify(body),
+  });
+  if (!response.ok) {
+    throw new Error(`Request failed with status ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let done = null;
+
+  const handleLine = (line) => {
+    if (!line.trim()) return;
+    const event = JSON.parse(line);
+    if (event.type === 'delta') {
+      onDelta?.(event.content);
+    } else if (event.type === 'done') {
+      done = event;
+    } else if (event.type === 'error') {
+      throw new Error(event.detail);
+    }
+  };
+
+  while (true) {
+    const { value, done: finished } = await reader.read();
+    if (finished) break;
+    buffer += decoder.decode(value, { stream: true });
+    const lines = buffer.split('\n');
+    buffer = lines.pop();
+    lines.forEach(handleLine);
+  }
+  handleLine(buffer);
+  return done;
+};
+
+// Push channel: one WebSocket per tab carrying due reminders, finished jobs,
+// list changes ({ type: 'changed', collections }) and chat replies. Events
+// sent while it was down are lost, so listeners should refetch on 'ready'.
+const PUSH_URL = `${API.replace(/^http/, 'ws')}/ws`;
+const pushListeners = new Set();
+const pushRequests = new Map();
+let pushSocket = null;
+let pushReady = false;
+let pushRetries = 0;
+let nextPushRequestId = 1;
+
+const connectPush = () => {
+  const token = localStorage.getItem('token');
+  if (!token || pushSocket) return;
+  const socket = new WebSocket(PUSH_URL);
+  pushSocket = socket;
+  socket.onopen = () => socket.send(JSON.stringify({ type: 'auth', token }));
+  socket.onmessage = ({ data }) => {
+    const event = JSON.parse(data);
+    if (event.type === 'ping') {
+      socket.send(JSON.stringify({ type: 'pong' }));
+      return;
+    }
+    if (event.type === 'ready') {
+      pushReady = true;
+      pushRetries = 0;
+    }
+    if (event.request_id !== undefined) {
+      pushRequests.get(event.request_id)?.(event);
+      return;
+    }
+    pushListeners.forEach((listener) => listener(event));
+  };
+  socket.onclose = ({ code }) => {
+    pushSocket = null;
+    pushReady = false;
+    pushRequests.forEach((handle) => handle({ type: 'error', detail: 'Connection lost' }));
+    pushRequests.clear();
+    // 4401: the token is invalid or expired; the next subscribePush after login reconnects
+    if (code === 1000 || code === 4401) return;
+    const delay = Math.min(30000, 1000 * 2 ** pushRetries) * (0.5 + Math.random() / 2);
+    pushRetries += 1;
+    setTimeout(connectPush, delay);
+  };
+};
+
+// Returns the unsubscribe function, for use as a useEffect cleanup
+export const subscribePush = (listener) => {
+  pushListeners.add(listener);
+  connectPush();
+  return () => pushListeners.delete(listener);
+};
+
+export const closePush = () => pushSocket?.close(1000);
+
+const pushChatMessage = (message, sessionId, onDelta) => new Promise((resolve, reject) => {
+  const requestId = nextPushRequestId++;
+  pushRequests.set(requestId, (event) => {
+    if (event.type === 'delta') {
+      onDelta?.(event.content);
+      return;
+    }
+    pushRequests.delete(requestId);
+    if (event.type === 'done') {
+      resolve(event.message);
+    } else {
+      reject(new Error(event.detail));
+    }
+  });
+  pushSocket.send(JSON.stringify({ type: 'chat', request_id: requestId, message, session_id: sessionId }));
+});
+
 // Chat API
 export const sendChatMessage = async (message, sessionId = null) => {
   const response = await axios.post(
@@ -18,10 +176,22 @@ export const sendChatMessage = async (message, sessionId = null) => {
   return response.data;
 };
 
+export const streamChatMessage = async (message, sessionId = null, onDelta) => {
+  if (pushReady) {
+    return pushChatMessage(message, sessionId, onDelta);
+  }
+  const event = await readNdjsonStream('/chat/message/stream', { message, session_id: sessionId }, onDelta);
+  return event.message;
+};
+
+export const getChatHistoryPage = (sessionId = null, { cursor = null, limit, archived = false } = {}) =>
+  getPage('/chat/history', {
+    session_id: sessionId || undefined, cursor: cursor || undefined, limit, archived: archived || undefined,
+  });
+
 export const getChatHistory = async (sessionId = null) => {
-  const url = sessionId ? `${API}/chat/history?session_id=${sessionId}` : `${API}/chat/history`;
-  const response = await axios.get(url, { headers: getAuthHeaders() });
-  return response.data;
+  const page = await getChatHistoryPage(sessionId);
+  return page.items;
 };
 
 // Symptom Checker API
@@ -34,9 +204,17 @@ export const analyzeSymptoms = async (symptoms, duration, severity) => {
   return response.data;
 };
 
+export const streamSymptomAnalysis = async (symptoms, duration, severity, onDelta) => {
+  const event = await readNdjsonStream('/symptoms/analyze/stream', { symptoms, duration, severity }, onDelta);
+  return event.report;
+};
+
+export const getSymptomHistoryPage = ({ cursor = null, limit, archived = false } = {}) =>
+  getPage('/symptoms/history', { cursor: cursor || undefined, limit, archived: archived || undefined });
+
 export const getSymptomHistory = async () => {
-  const response = await axios.get(`${API}/symptoms/history`, { headers: getAuthHeaders() });
-  return response.data;
+  const page = await getSymptomHistoryPage();
+  return page.items;
 };
 
 // Health Metrics API
@@ -49,9 +227,28 @@ export const addHealthMetric = async (metricData) => {
   return response.data;
 };
 
+export const getHealthMetricsPage = (metricType = null, { cursor = null, limit } = {}) =>
+  getPage('/metrics', { metric_type: metricType || undefined, cursor: cursor || undefined, limit });
+
 export const getHealthMetrics = async (metricType = null) => {
-  const url = metricType ? `${API}/metrics?metric_type=${metricType}` : `${API}/metrics`;
-  const response = await axios.get(url, { headers: getAuthHeaders() });
+  const page = await getHealthMetricsPage(metricType);
+  return page.items;
+};
+
+// Device sync: records may carry created_at and an idempotency_key so that
+// retried uploads are reported as duplicates instead of inserted twice.
+export const addHealthMetricsBulk = async (records) => {
+  const response = await axios.post(`${API}/metrics/bulk`, records, { headers: getAuthHeaders() });
+  return response.data;
+};
+
+// Chart-ready series: bucketed min/max/avg ({ bucket: 'day' | 'week' | 'month' })
+// and/or LTTB-downsampled to `points`.
+export const getMetricSeries = async (metricType, { from, to, bucket, points, field } = {}) => {
+  const response = await axios.get(`${API}/metrics/series`, {
+    headers: getAuthHeaders(),
+    params: { metric_type: metricType, from, to, bucket, points, field },
+  });
   return response.data;
 };
 
@@ -60,6 +257,32 @@ export const deleteHealthMetric = async (metricId) => {
   return response.data;
 };
 
+// Jobs API
+// Async job mode: poll a queued chat/symptom job until it finishes (long-polling up to `wait` seconds per request)
+export const getJob = async (jobId, { wait = 0 } = {}) => {
+  const response = await axios.get(`${API}/jobs/${jobId}`, {
+    headers: getAuthHeaders(),
+    params: { wait },
+  });
+  return response.data;
+};
+
+export const waitForJob = async (jobId, { timeoutMs = 120000 } = {}) => {
+  const deadline = Date.now() + timeoutMs;
+  for (;;) {
+    const job = await getJob(jobId, { wait: 25 });
+    if (job.status === 'succeeded') return job.result;
+    if (job.status === 'dead') throw new Error(job.error || 'Job failed');
+    if (Date.now() > deadline) throw new Error('Timed out waiting for job');
+  }
+};
+
+// Dashboard API
+export const getDashboardSummary = async ({ reminders = 3 } = {}) => {
+  const tz = Intl.DateTimeFormat().resolvedOptions().timeZone;
+  return getRevalidated('/dashboard/summary', { reminders, tz });
+};
+
 // Reminders API
 export const createReminder = async (reminderData) => {
   const response = await axios.post(
@@ -70,9 +293,12 @@ export const createReminder = async (reminderData) => {
   return response.data;
 };
 
+export const getRemindersPage = ({ cursor = null, limit } = {}) =>
+  getPage('/reminders', { cursor: cursor || undefined, limit });
+
 export const getReminders = async () => {
-  const response = await axios.get(`${API}/reminders`, { headers: getAuthHeaders() });
-  return response.data;
+  const page = await getRemindersPage();
+  return page.items;
 };
 
 export const completeReminder = async (reminderId) => {
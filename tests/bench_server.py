@@ -0,0 +1,94 @@
+"""Run backend/server.py for benchmarks, optionally against an in-memory MongoDB.
+
+    BENCH_MONGO=mongomock python tests/bench_server.py --port 8001
+
+With BENCH_MONGO=mongomock the Motor client is replaced by mongomock_motor
+(pip install mongomock-motor), so no mongod is needed; otherwise MONGO_URL
+is used as usual. backend_bench.py --boot starts this next to tests/fake_llm.py.
+mongomock has no $dateTrunc or $text: bucketed /api/metrics/series needs a
+real mongod, and /api/search answers 503 as if its text index were missing.
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+import uvicorn
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+
+_mongomock_patched = False
+
+
+def mongomock_client_class():
+    """mongomock_motor's client, with the mongomock gaps the backend would trip over filled in."""
+    global _mongomock_patched
+    import mongomock.collection
+    from mongomock_motor import AsyncMongoMockClient
+    from pymongo.errors import OperationFailure
+
+    class MockClient(AsyncMongoMockClient):
+        def __init__(self, *args, **kwargs):
+            kwargs.pop("event_listeners", None)  # no commands to observe
+            super().__init__(*args, **kwargs)
+
+    if _mongomock_patched:
+        return MockClient
+    _mongomock_patched = True
+
+    # mongomock's create_indexes drops partialFilterExpression, so health_metrics' partial unique
+    # index on idempotency_key would reject every keyless reading after the first. Its
+    # create_index keeps the option and enforces it; route create_indexes through that.
+    # (It also checks existing documents without the filter, so existing indexes are left alone.)
+    def create_indexes(self, indexes, session=None):
+        existing = self.index_information()
+        names = []
+        for index in indexes:
+            document = dict(index.document)
+            if document["name"] not in existing:
+                self.create_index(list(document.pop("key").items()), session=session, **document)
+            names.append(document["name"])
+        return names
+
+    mongomock.collection.Collection.create_indexes = create_indexes
+
+    # mongomock has no $text; answer like a server whose text index is not built yet (503 from /api/search)
+    aggregate = mongomock.collection.Collection.aggregate
+
+    def aggregate_without_text(self, pipeline, session=None, **kwargs):
+        try:
+            return aggregate(self, pipeline, session=session, **kwargs)
+        except NotImplementedError as e:
+            if "$text" not in str(e):
+                raise
+            raise OperationFailure("text index required for $text query", code=27)
+
+    mongomock.collection.Collection.aggregate = aggregate_without_text
+    return MockClient
+
+
+def patch_mongomock():
+    import motor.motor_asyncio
+
+    motor.motor_asyncio.AsyncIOMotorClient = mongomock_client_class()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    args = parser.parse_args()
+
+    if os.environ.get("BENCH_MONGO") == "mongomock":
+        patch_mongomock()
+    sys.path.insert(0, str(BACKEND_DIR))
+    import server
+
+    # Settings README.md recommends for the /api/ws push channel
+    uvicorn.run(server.create_app(), host=args.host, port=args.port, log_level="warning",
+                ws_per_message_deflate=False, ws_max_size=65536, ws_max_queue=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Shared fixtures: the backend app, served in-process on mongomock."""
+import asyncio
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """Run ``scenario(client, headers)`` against a fresh app and return its result.
+
+    ``client`` is an httpx.AsyncClient on the ASGI app, with startup and
+    shutdown run around the scenario. ``headers`` authorize a newly
+    registered user. Background workers are off; the model API is never
+    called. Keyword arguments to ``run`` override Settings fields.
+    """
+    pytest.importorskip("mongomock_motor")
+    import httpx
+    import motor.motor_asyncio
+
+    import server
+    from settings import Settings
+    from tests.bench_server import mongomock_client_class
+
+    monkeypatch.setattr(motor.motor_asyncio, "AsyncIOMotorClient", mongomock_client_class())
+
+    def run(scenario, **overrides):
+        settings = Settings(**{
+            "mongo_url": "mongodb://localhost:27017",
+            "db_name": f"test_{uuid.uuid4().hex[:8]}",
+            "jwt_secret": "test-secret",
+            "openai_api_key": "test-key",
+            "job_queue": False,
+            "reminder_scheduler": False,
+            **overrides,
+        })
+
+        async def main():
+            app = server.create_app(settings)
+            async with app.router.lifespan_context(app):
+                transport = httpx.ASGITransport(app=app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    response = await client.post("/api/auth/register", json={
+                        "email": f"test_{uuid.uuid4().hex[:10]}@example.com",
+                        "password": "TestPass123!",
+                        "name": "Test User",
+                    })
+                    response.raise_for_status()
+                    headers = {"Authorization": f"Bearer {response.json()['token']}"}
+                    return await scenario(client, headers)
+
+        return asyncio.run(main())
+
+    return run
@@ -0,0 +1,91 @@
+"""Local stand-in for the OpenAI chat completions API.
+
+Run it next to the backend and point the OpenAI client at it:
+
+    uvicorn tests.fake_llm:app --port 9100
+    OPENAI_BASE_URL=http://127.0.0.1:9100/v1 uvicorn server:app --port 8001
+
+FAKE_LLM_FIRST_TOKEN_MS and FAKE_LLM_TOKEN_MS control the simulated latency.
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+FIRST_TOKEN_MS = float(os.environ.get('FAKE_LLM_FIRST_TOKEN_MS', '300'))
+TOKEN_MS = float(os.environ.get('FAKE_LLM_TOKEN_MS', '20'))
+REPLY = (
+    "This is a simulated response from the fake LLM. "
+    "Please consult a healthcare professional for medical advice."
+)
+
+app = FastAPI()
+
+
+def reply_tokens(messages):
+    last = messages[-1]["content"] if messages else ""
+    words = f"You said: {last[:80]}. {REPLY}".split(" ")
+    return [w + " " for w in words[:-1]] + [words[-1]]
+
+
+def usage_for(messages, tokens):
+    prompt_tokens = sum(len(m.get("content", "").split()) for m in messages)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": len(tokens),
+        "total_tokens": prompt_tokens + len(tokens),
+    }
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    messages = body.get("messages", [])
+    model = body.get("model", "gpt-4o-mini")
+    tokens = reply_tokens(messages)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+
+    if not body.get("stream"):
+        await asyncio.sleep((FIRST_TOKEN_MS + TOKEN_MS * len(tokens)) / 1000)
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(tokens)},
+                "finish_reason": "stop",
+            }],
+            "usage": usage_for(messages, tokens),
+        }
+
+    def chunk(delta, finish_reason=None):
+        return {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+
+    async def events():
+        await asyncio.sleep(FIRST_TOKEN_MS / 1000)
+        yield f"data: {json.dumps(chunk({'role': 'assistant', 'content': ''}))}\n\n"
+        for token in tokens:
+            yield f"data: {json.dumps(chunk({'content': token}))}\n\n"
+            await asyncio.sleep(TOKEN_MS / 1000)
+        yield f"data: {json.dumps(chunk({}, 'stop'))}\n\n"
+        if (body.get("stream_options") or {}).get("include_usage"):
+            final = chunk({})
+            final["choices"] = []
+            final["usage"] = usage_for(messages, tokens)
+            yield f"data: {json.dumps(final)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
@@ -0,0 +1,41 @@
+"""API regression test: every endpoint once, with the expected status codes.
+
+    python -m pytest tests/test_api_smoke.py
+
+Runs backend_bench.py's smoke scenario against a local stack, the same one
+``backend_bench.py smoke --boot`` starts. The stack is tests/fake_llm.py and
+the backend, on an in-memory mongomock database, or on mongod with
+TEST_MONGO_URL set.
+"""
+import argparse
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+import backend_bench  # noqa: E402
+
+
+def test_every_endpoint_answers_as_expected():
+    mongo_url = os.environ.get("TEST_MONGO_URL")
+    if not mongo_url:
+        pytest.importorskip("mongomock_motor")
+    args = argparse.Namespace(
+        base_url=None,
+        db_name=None,
+        mongo="mongod" if mongo_url else "mongomock",
+        mongo_url=mongo_url or "mongodb://localhost:27017",
+        llm_first_token_ms=0,
+        llm_token_ms=0,
+    )
+
+    with backend_bench.LocalStack(args):
+        report = asyncio.run(backend_bench.smoke(args))
+
+    assert report["failures"] == []
+    assert report["requests"] > 0
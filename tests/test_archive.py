@@ -0,0 +1,114 @@
+"""backend/archive.py's compactor and merged history pages, on mongomock.
+
+    python -m pytest tests/test_archive.py
+
+Pages are read the way list_page reads them with ?archived=true: a hot
+keyset_page, merged with the archive by merge_page.
+"""
+import asyncio
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from archive import HistoryArchive  # noqa: E402
+from pagination import keyset_page  # noqa: E402
+
+OLD_MONTH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def message(index: int, created_at: datetime) -> dict:
+    return {
+        "id": f"m{index:02d}",
+        "user_id": "u1",
+        "session_id": "s1",
+        "message": f"message {index}",
+        "created_at": created_at,
+    }
+
+
+def old_messages(count: int) -> list:
+    return [message(index, OLD_MONTH + timedelta(days=index)) for index in range(count)]
+
+
+def recent_messages(count: int, first: int) -> list:
+    now = datetime.now(timezone.utc)
+    return [message(first + index, now - timedelta(hours=count - index)) for index in range(count)]
+
+
+async def setup(docs: list, **options):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    db = mongomock_motor.AsyncMongoMockClient(tz_aware=True)["test_archive"]
+    await db.chat_messages.insert_many([dict(doc) for doc in docs])
+    return db, HistoryArchive(db, older_than=timedelta(days=30), **options)
+
+
+async def read_all(db, archive: HistoryArchive, limit: int) -> list:
+    """Every page of the chat history with ?archived=true; the ids in order."""
+    ids, cursor = [], None
+    while True:
+        hot, hot_next = await keyset_page(db.chat_messages, {"user_id": "u1"}, "created_at", 1, cursor, limit)
+        docs, cursor = await archive.merge_page(hot, hot_next, "u1", "chat_messages", 1, cursor, limit)
+        ids.extend(doc["id"] for doc in docs)
+        if cursor is None:
+            return ids
+
+
+def test_compact_moves_a_month_into_one_part():
+    old = old_messages(5)
+
+    async def scenario():
+        db, archive = await setup(old + recent_messages(2, first=5))
+        report = await archive.compact()
+        hot = await db.chat_messages.find({}, {"_id": 0}).sort("created_at", 1).to_list(None)
+        parts = await db.history_archive.find({}).to_list(None)
+        return report, hot, parts
+
+    report, hot, parts = asyncio.run(scenario())
+
+    assert report["documents"] == 5
+    assert report["months"] == 1
+    assert [doc["id"] for doc in hot] == ["m05", "m06"]
+    assert len(parts) == 1
+    part = parts[0]
+    assert (part["month"], part["count"], part["session_ids"]) == ("2024-01", 5, ["s1"])
+    assert HistoryArchive.unpack(part) == old
+
+
+def test_archived_pages_cross_from_archive_to_hot():
+    async def scenario():
+        db, archive = await setup(old_messages(5) + recent_messages(3, first=5), docs_per_archive=2)
+        await archive.compact()
+        assert await db.chat_messages.count_documents({}) == 3
+        return [await read_all(db, archive, limit) for limit in (1, 2, 3, 10)]
+
+    expected = [f"m{index:02d}" for index in range(8)]
+    for ids in asyncio.run(scenario()):
+        assert ids == expected
+
+
+def test_half_finished_pass_is_archived_once():
+    old = old_messages(5)
+
+    async def scenario():
+        db, archive = await setup(old + recent_messages(2, first=5), docs_per_archive=3)
+        # A pass that wrote its first chunk and died before deleting it from the hot collection
+        await archive._store("chat_messages", "u1", OLD_MONTH, old[:3])
+        during = await read_all(db, archive, 2)
+
+        await archive.compact()
+        after = await read_all(db, archive, 2)
+        hot = await db.chat_messages.count_documents({})
+        archived = [doc["id"] async for doc in archive.iter_docs("u1", "chat_messages")]
+        return during, after, hot, archived
+
+    during, after, hot, archived = asyncio.run(scenario())
+
+    expected = [f"m{index:02d}" for index in range(7)]
+    assert during == expected
+    assert after == expected
+    assert hot == 2
+    assert archived == expected[:5]
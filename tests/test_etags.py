@@ -0,0 +1,102 @@
+"""Conditional GETs on the list routes and the dashboard, through the app.
+
+    python -m pytest tests/test_etags.py
+"""
+from datetime import datetime, timedelta, timezone
+
+import server
+
+NOON = datetime(2024, 3, 4, 12, 0, tzinfo=timezone.utc)
+
+
+class Clock(datetime):
+    """Stands in for server.datetime; ``now()`` is ``Clock.current``."""
+    current = NOON
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls.current.astimezone(tz) if tz else cls.current.replace(tzinfo=None)
+
+
+def revalidate(client, path, headers, etag, **params):
+    return client.get(path, params=params, headers={**headers, "If-None-Match": etag})
+
+
+def test_write_bumps_the_version_and_expires_the_etag(api):
+    reading = {"metric_type": "weight", "value": "72.5", "unit": "kg"}
+
+    async def scenario(client, headers):
+        first = await client.get("/api/metrics", headers=headers)
+        unchanged = await revalidate(client, "/api/metrics", headers, first.headers["etag"])
+        before = await server.versions.collection.find_one({})
+
+        created = await client.post("/api/metrics", json=reading, headers=headers)
+        after = await server.versions.collection.find_one({})
+        changed = await revalidate(client, "/api/metrics", headers, first.headers["etag"])
+        deleted = await client.delete(f"/api/metrics/{created.json()['id']}", headers=headers)
+        after_delete = await revalidate(client, "/api/metrics", headers, changed.headers["etag"])
+        return first, unchanged, before, after, changed, deleted, after_delete
+
+    first, unchanged, before, after, changed, deleted, after_delete = api(scenario)
+
+    assert first.status_code == 200
+    assert first.headers["etag"].startswith('W/"')
+    assert unchanged.status_code == 304
+    assert unchanged.content == b""
+    assert unchanged.headers["etag"] == first.headers["etag"]
+
+    assert after["health_metrics"] == (before or {}).get("health_metrics", 0) + 1
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != first.headers["etag"]
+    assert len(changed.json()["items"]) == 1
+
+    assert deleted.status_code == 200
+    assert after_delete.status_code == 200
+    assert after_delete.json()["items"] == []
+
+
+def test_etag_depends_on_the_query_and_the_collection(api):
+    async def scenario(client, headers):
+        # The user's first write creates their versions document, and its epoch
+        await client.post("/api/metrics", json={"metric_type": "weight", "value": "72.5", "unit": "kg"}, headers=headers)
+        metrics = await client.get("/api/metrics", headers=headers)
+        etag = metrics.headers["etag"]
+        other_query = await revalidate(client, "/api/metrics", headers, etag, limit=5)
+        reminder = await client.post("/api/reminders", json={
+            "reminder_type": "medication", "title": "Vitamin D",
+            "scheduled_time": (datetime.now(timezone.utc) + timedelta(days=1)).isoformat(),
+        }, headers=headers)
+        # A reminder is not a health metric: the metrics list is still current
+        unrelated_write = await revalidate(client, "/api/metrics", headers, etag)
+        star = await revalidate(client, "/api/metrics", headers, "*")
+        listed = await revalidate(client, "/api/metrics", headers, f'"other", {etag.removeprefix("W/")}')
+        return other_query, reminder, unrelated_write, star, listed
+
+    other_query, reminder, unrelated_write, star, listed = api(scenario)
+
+    assert other_query.status_code == 200
+    assert reminder.status_code == 200
+    assert unrelated_write.status_code == 304
+    assert star.status_code == 304
+    assert listed.status_code == 304
+
+
+def test_dashboard_etag_expires_every_fifteen_minutes(api, monkeypatch):
+    monkeypatch.setattr(server, "datetime", Clock)
+
+    async def scenario(client, headers):
+        Clock.current = NOON
+        first = await client.get("/api/dashboard/summary", headers=headers)
+        etag = first.headers["etag"]
+        Clock.current = NOON + timedelta(minutes=14, seconds=59)
+        within = await revalidate(client, "/api/dashboard/summary", headers, etag)
+        Clock.current = NOON + timedelta(minutes=15)
+        expired = await revalidate(client, "/api/dashboard/summary", headers, etag)
+        return first, within, expired
+
+    first, within, expired = api(scenario)
+
+    assert first.status_code == 200
+    assert within.status_code == 304
+    assert expired.status_code == 200
+    assert expired.headers["etag"] != first.headers["etag"]
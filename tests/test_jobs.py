@@ -0,0 +1,179 @@
+"""backend/jobs.py's JobQueue on mongomock, with short leases.
+
+    python -m pytest tests/test_jobs.py
+"""
+import asyncio
+import sys
+from datetime import timedelta
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import jobs  # noqa: E402
+from jobs import JobQueue, RetryableJobError  # noqa: E402
+
+LEASE = timedelta(seconds=0.2)
+
+
+def new_queue(**options) -> JobQueue:
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    collection = mongomock_motor.AsyncMongoMockClient(tz_aware=True)["test_jobs"].jobs
+    options = {"lease": LEASE, "poll_interval": 0.02, **options}
+    return JobQueue(collection, **options)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(jobs.random, "uniform", lambda low, high: 0.0)
+
+
+async def succeed(job: dict) -> dict:
+    return {"echo": job["payload"]}
+
+
+def test_expired_lease_is_requeued_and_run_by_another_worker():
+    async def scenario():
+        crashed = new_queue()
+        crashed.register("echo", succeed)
+        job = await crashed.enqueue("u1", "echo", {"n": 1})
+        claimed = await crashed._claim()  # ...and the process dies before running it
+        assert claimed["id"] == job.id
+
+        survivor = JobQueue(crashed.collection, lease=LEASE, poll_interval=0.02)
+        survivor.register("echo", succeed)
+        assert await survivor.recover() == 0  # the lease is still held
+        survivor.start()
+        try:
+            finished = await survivor.wait(job.id, "u1", timeout=5)
+        finally:
+            await survivor.stop()
+        return finished, survivor
+
+    finished, survivor = asyncio.run(scenario())
+
+    assert finished["status"] == "succeeded"
+    assert finished["result"] == {"echo": {"n": 1}}
+    assert finished["attempts"] == 2
+    assert survivor.recovered == 1
+
+
+def test_heartbeat_keeps_a_long_job_leased():
+    calls = []
+
+    async def slow(job: dict) -> dict:
+        calls.append(job["id"])
+        await asyncio.sleep(LEASE.total_seconds() * 3)
+        return {}
+
+    async def scenario():
+        queue = new_queue(workers=2)
+        queue.register("slow", slow)
+        job = await queue.enqueue("u1", "slow", {})
+        queue.start()
+        try:
+            finished = await queue.wait(job.id, "u1", timeout=5)
+        finally:
+            await queue.stop()
+        return finished, queue
+
+    finished, queue = asyncio.run(scenario())
+
+    assert finished["status"] == "succeeded"
+    assert finished["attempts"] == 1
+    assert len(calls) == 1
+    assert queue.recovered == 0
+
+
+def test_retryable_failures_are_dead_lettered_after_max_attempts():
+    calls = []
+
+    async def flaky(job: dict) -> dict:
+        calls.append(job["attempts"])
+        raise RetryableJobError("upstream busy")
+
+    async def scenario():
+        queue = new_queue(max_attempts=3)
+        queue.register("flaky", flaky)
+        job = await queue.enqueue("u1", "flaky", {})
+        queue.start()
+        try:
+            finished = await queue.wait(job.id, "u1", timeout=5)
+        finally:
+            await queue.stop()
+        return finished, queue
+
+    finished, queue = asyncio.run(scenario())
+
+    assert calls == [1, 2, 3]
+    assert finished["status"] == "dead"
+    assert finished["error"] == "upstream busy"
+    assert finished["finished_at"] is not None
+    assert (queue.retried, queue.dead) == (2, 1)
+
+
+def test_permanent_failure_is_dead_lettered_at_once():
+    async def broken(job: dict) -> dict:
+        raise ValueError("bad payload")
+
+    async def scenario():
+        queue = new_queue(max_attempts=3)
+        queue.register("broken", broken)
+        job = await queue.enqueue("u1", "broken", {})
+        queue.start()
+        try:
+            return await queue.wait(job.id, "u1", timeout=5)
+        finally:
+            await queue.stop()
+
+    finished = asyncio.run(scenario())
+
+    assert (finished["status"], finished["attempts"], finished["error"]) == ("dead", 1, "bad payload")
+
+
+def test_lease_expiring_max_attempts_times_dead_letters_the_job():
+    async def scenario():
+        queue = new_queue(max_attempts=2)
+        queue.register("echo", succeed)
+        job = await queue.enqueue("u1", "echo", {})
+        requeued = []
+        for _ in range(2):
+            assert await queue._claim() is not None  # claimed, then the worker crashes
+            await asyncio.sleep(LEASE.total_seconds() + 0.05)
+            requeued.append(await queue.recover())
+        return requeued, await queue.get(job.id, "u1"), queue
+
+    requeued, job, queue = asyncio.run(scenario())
+
+    assert requeued == [1, 0]
+    assert job["status"] == "dead"
+    assert job["error"] == "Lease expired too many times"
+    assert job["attempts"] == 2
+    assert (queue.recovered, queue.dead) == (1, 1)
+
+
+def test_higher_priority_runs_first_then_oldest_first():
+    order = []
+
+    async def record(job: dict) -> dict:
+        order.append(job["payload"]["name"])
+        return {}
+
+    async def scenario():
+        queue = new_queue(workers=1)
+        queue.register("record", record)
+        enqueued = []
+        for name, priority in [("low", 0), ("high", 10), ("mid-1", 5), ("mid-2", 5), ("urgent", 20)]:
+            enqueued.append(await queue.enqueue("u1", "record", {"name": name}, priority=priority))
+            await asyncio.sleep(0.005)  # distinct available_at, which breaks priority ties
+        queue.start()
+        try:
+            for job in enqueued:
+                await queue.wait(job.id, "u1", timeout=5)
+        finally:
+            await queue.stop()
+
+    asyncio.run(scenario())
+
+    assert order == ["urgent", "high", "mid-1", "mid-2", "low"]
@@ -0,0 +1,279 @@
+"""backend/llm.py's LLMGovernor against a scripted fake of the AsyncOpenAI client.
+
+    python -m pytest tests/test_llm.py
+"""
+import asyncio
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+from tenacity import wait_none
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import llm  # noqa: E402
+from llm import CircuitBreaker, LLMBusy, LLMGovernor, LLMTimeout, LLMUnavailable, LLMUpstreamError  # noqa: E402
+
+REQUEST = httpx.Request("POST", "https://api.example.com/v1/chat/completions")
+
+
+def status_error(cls, status: int):
+    return cls(f"HTTP {status}", response=httpx.Response(status, request=REQUEST), body=None)
+
+
+def messages(text: str = "hello") -> list:
+    return [{"role": "user", "content": text}]
+
+
+class FakeCompletions:
+    """``create`` answers with the next scripted outcome: an exception is raised, a string returned.
+
+    While ``gate`` is set to an unset Event, calls wait for it first.
+    """
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+        self.gate = None
+
+    async def create(self, model, messages, stream=False, **kwargs):
+        self.calls.append(messages)
+        if self.gate is not None:
+            await self.gate.wait()
+        outcome = self.outcomes.pop(0) if self.outcomes else "ok"
+        if isinstance(outcome, BaseException):
+            raise outcome
+        if stream:
+            return self._chunks(outcome)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=outcome))],
+            usage=SimpleNamespace(prompt_tokens=3, completion_tokens=1, total_tokens=4),
+        )
+
+    async def _chunks(self, outcome):
+        for part in outcome if isinstance(outcome, list) else [outcome]:
+            if isinstance(part, BaseException):
+                raise part
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=part))], usage=None)
+
+
+def governor(completions: FakeCompletions, **options) -> LLMGovernor:
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return LLMGovernor(client, "test-model", **options)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(llm, "wait_random_exponential", lambda **kwargs: wait_none())
+
+
+def test_identical_calls_in_flight_share_one_request():
+    completions = FakeCompletions("shared answer", "other answer")
+
+    async def scenario():
+        governed = governor(completions)
+        completions.gate = asyncio.Event()
+        calls = [
+            asyncio.create_task(governed.complete(messages(), "u1")),
+            asyncio.create_task(governed.complete(messages(), "u2")),
+            asyncio.create_task(governed.complete(messages("something else"), "u1")),
+        ]
+        await asyncio.sleep(0)
+        completions.gate.set()
+        results = await asyncio.gather(*calls)
+        # Finished calls are no longer shared
+        again = await governed.complete(messages(), "u1")
+        return results, again, governed
+
+    results, again, governed = asyncio.run(scenario())
+
+    assert results == ["shared answer", "shared answer", "other answer"]
+    assert again == "ok"
+    assert len(completions.calls) == 3
+    assert governed.coalesced == 1
+    assert governed._inflight == {}
+
+
+def test_full_queue_rejects_with_503():
+    completions = FakeCompletions()
+
+    async def scenario():
+        governed = governor(completions, max_concurrency=1, max_queue=1)
+        completions.gate = asyncio.Event()
+        running = asyncio.create_task(governed.complete(messages("first"), "u1"))
+        waiting = asyncio.create_task(governed.complete(messages("second"), "u2"))
+        await asyncio.sleep(0.01)
+        assert (governed.in_flight, governed.queued) == (1, 1)
+        with pytest.raises(LLMBusy) as rejected:
+            await governed.complete(messages("third"), "u3")
+        completions.gate.set()
+        return await asyncio.gather(running, waiting), rejected.value, governed
+
+    results, rejected, governed = asyncio.run(scenario())
+
+    assert results == ["ok", "ok"]
+    assert (rejected.status_code, rejected.retry_after) == (503, 1)
+    assert governed.rejected == 1
+    assert len(completions.calls) == 2
+    assert (governed.in_flight, governed.queued) == (0, 0)
+
+
+def test_waiting_past_the_deadline_is_busy():
+    completions = FakeCompletions()
+
+    async def scenario():
+        governed = governor(completions, max_per_user=1, timeout=0.05)
+        # The user's only slot stays taken past the call's deadline
+        async with governed._slot("u1", asyncio.get_running_loop().time() + 10):
+            with pytest.raises(LLMBusy):
+                await governed.complete(messages(), "u1")
+        return await governed.complete(messages("later"), "u1"), governed
+
+    result, governed = asyncio.run(scenario())
+
+    assert result == "ok"
+    assert governed.timeouts == 1
+    assert len(completions.calls) == 1
+
+
+def test_breaker_opens_then_probes_once_when_half_open():
+    failure = openai.APIConnectionError(request=REQUEST)
+    completions = FakeCompletions(failure, failure, "recovered")
+
+    async def scenario():
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+        governed = governor(completions, max_attempts=1, breaker=breaker)
+        for text in ("a", "b"):
+            with pytest.raises(LLMUpstreamError):
+                await governed.complete(messages(text), "u1")
+        assert breaker.state == "open"
+        with pytest.raises(LLMUnavailable) as unavailable:
+            await governed.complete(messages("c"), "u1")
+        assert len(completions.calls) == 2  # failed fast, without calling upstream
+
+        breaker.opened_at -= breaker.reset_timeout
+        assert breaker.state == "half_open"
+        completions.gate = asyncio.Event()
+        probe = asyncio.create_task(governed.complete(messages("probe"), "u1"))
+        await asyncio.sleep(0)
+        # Only the probe goes upstream while the breaker is half open
+        with pytest.raises(LLMUnavailable):
+            await governed.complete(messages("during the probe"), "u2")
+        completions.gate.set()
+        return await probe, unavailable.value, breaker, governed
+
+    result, unavailable, breaker, governed = asyncio.run(scenario())
+
+    assert (unavailable.status_code, unavailable.retry_after) == (503, 30)
+    assert result == "recovered"
+    assert breaker.state == "closed"
+    assert breaker.trips == 1
+    assert len(completions.calls) == 3
+    assert governed.stats()["breaker_state"] == "closed"
+
+
+def test_failed_probe_reopens_the_breaker():
+    failure = status_error(openai.InternalServerError, 500)
+    completions = FakeCompletions(failure, failure)
+
+    async def scenario():
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+        governed = governor(completions, max_attempts=1, breaker=breaker)
+        with pytest.raises(LLMUpstreamError):
+            await governed.complete(messages("a"), "u1")
+        breaker.opened_at -= breaker.reset_timeout
+        with pytest.raises(LLMUpstreamError):
+            await governed.complete(messages("probe"), "u1")
+        return breaker
+
+    breaker = asyncio.run(scenario())
+
+    assert breaker.state == "open"
+    assert breaker.trips == 2
+    assert breaker.probing is False
+
+
+@pytest.mark.parametrize("error", [
+    openai.APITimeoutError(request=REQUEST),
+    openai.APIConnectionError(request=REQUEST),
+    status_error(openai.RateLimitError, 429),
+    status_error(openai.InternalServerError, 503),
+    asyncio.TimeoutError(),
+], ids=lambda error: type(error).__name__)
+def test_transient_errors_are_retried(error):
+    completions = FakeCompletions(error, "second try")
+
+    async def scenario():
+        governed = governor(completions, max_attempts=3)
+        return await governed.complete(messages(), "u1"), governed
+
+    result, governed = asyncio.run(scenario())
+
+    assert result == "second try"
+    assert len(completions.calls) == 2
+    assert governed.retries == 1
+    assert governed.breaker.failures == 0
+
+
+@pytest.mark.parametrize("error, counts_against_upstream", [
+    (status_error(openai.BadRequestError, 400), False),
+    (status_error(openai.AuthenticationError, 401), True),
+    (ValueError("unexpected response"), True),
+], ids=lambda value: type(value).__name__)
+def test_permanent_errors_are_not_retried(error, counts_against_upstream):
+    completions = FakeCompletions(error)
+
+    async def scenario():
+        governed = governor(completions, max_attempts=3)
+        with pytest.raises(LLMUpstreamError) as raised:
+            await governed.complete(messages(), "u1")
+        return raised.value, governed
+
+    raised, governed = asyncio.run(scenario())
+
+    assert raised.status_code == 502
+    assert isinstance(raised.__cause__, type(error))
+    assert len(completions.calls) == 1
+    assert governed.retries == 0
+    assert governed.breaker.failures == (1 if counts_against_upstream else 0)
+
+
+def test_attempts_that_all_time_out_answer_504():
+    completions = FakeCompletions(*(asyncio.TimeoutError() for _ in range(3)))
+
+    async def scenario():
+        governed = governor(completions, max_attempts=3)
+        with pytest.raises(LLMTimeout) as raised:
+            await governed.complete(messages(), "u1")
+        return raised.value, governed
+
+    raised, governed = asyncio.run(scenario())
+
+    assert raised.status_code == 504
+    assert len(completions.calls) == 3
+    assert governed.retries == 2
+
+
+def test_stream_retries_only_before_the_first_delta():
+    failure = openai.APIConnectionError(request=REQUEST)
+    completions = FakeCompletions(failure, ["Hel", "lo"], ["par", failure])
+
+    async def scenario():
+        governed = governor(completions, max_attempts=3)
+        first = [delta async for delta in governed.stream(messages("a"), "u1")]
+        second = []
+        with pytest.raises(LLMUpstreamError):
+            async for delta in governed.stream(messages("b"), "u1"):
+                second.append(delta)
+        return first, second, governed
+
+    first, second, governed = asyncio.run(scenario())
+
+    assert first == ["Hel", "lo"]
+    assert second == ["par"]
+    assert len(completions.calls) == 3  # the broken stream was not restarted
+    assert governed.retries == 1
+    assert governed.breaker.failures == 1
@@ -0,0 +1,103 @@
+"""backend/pagination.py's cursors, and how routes answer a bad one.
+
+    python -m pytest tests/test_pagination.py
+"""
+import asyncio
+import base64
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+from fastapi import HTTPException
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from pagination import decode_cursor, encode_cursor, keyset_page  # noqa: E402
+
+
+def forge(raw: str) -> str:
+    """A cursor carrying ``raw`` Extended JSON, as a client could build one."""
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+TAMPERED = [
+    "",
+    "not a cursor!",
+    "é",
+    forge("[1]"),
+    forge("[1, 2, 3]"),
+    forge("5"),
+    forge('{"a": 1, "b": 2}'),
+    forge('[{"$date": "yesterday"}, "x"]'),
+    forge('[{"$oid": "zz"}, "x"]'),
+    forge('[{"$gt": ""}, "x"]'),
+    forge('[["2024-01-01"], "x"]'),
+    forge('["2024-01-01", "x"]'),
+    forge("[true, \"x\"]"),
+    forge('[1.5, {"$ne": null}]'),
+]
+
+
+def test_datetime_and_id_round_trip():
+    created_at = datetime(2024, 5, 1, 12, 30, 1, 123000, tzinfo=timezone.utc)
+    sort_value, doc_id = decode_cursor(encode_cursor(created_at, "3f2a-id"))
+
+    assert sort_value == created_at
+    assert sort_value.utcoffset() == timedelta(0)
+    assert doc_id == "3f2a-id"
+
+
+def test_score_round_trips():
+    assert decode_cursor(encode_cursor(0.8125, "id-1")) == (0.8125, "id-1")
+
+
+@pytest.mark.parametrize("cursor", TAMPERED)
+def test_tampered_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as raised:
+        decode_cursor(cursor or "=")
+    assert raised.value.status_code == 400
+
+
+def test_sort_types_narrow_what_is_accepted():
+    with pytest.raises(HTTPException):
+        decode_cursor(encode_cursor(0.5, "id-1"), (datetime,))
+
+
+def test_pages_split_ties_on_id():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    same_time = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    docs = [{"id": f"m{index}", "user_id": "u1", "created_at": same_time + timedelta(seconds=index // 3)}
+            for index in range(7)]
+
+    async def scenario():
+        collection = mongomock_motor.AsyncMongoMockClient(tz_aware=True)["test_pagination"].metrics
+        await collection.insert_many([dict(doc) for doc in docs])
+        ids, cursor = [], None
+        while True:
+            page, cursor = await keyset_page(collection, {"user_id": "u1"}, "created_at", -1, cursor, 2)
+            ids.extend(doc["id"] for doc in page)
+            if cursor is None:
+                return ids
+
+    assert asyncio.run(scenario()) == ["m6", "m5", "m4", "m3", "m2", "m1", "m0"]
+
+
+def test_routes_answer_400_for_a_bad_cursor(api):
+    score_cursor = encode_cursor(0.5, "id-1")
+
+    async def scenario(client, headers):
+        requests = [("/api/metrics", {"cursor": cursor}) for cursor in TAMPERED if cursor]
+        requests += [
+            ("/api/chat/history", {"cursor": forge('[{"$oid": "zz"}, "x"]')}),
+            ("/api/chat/history", {"cursor": score_cursor, "archived": "true"}),
+            ("/api/symptoms/history", {"cursor": forge('[{"$gt": ""}, "x"]'), "archived": "true"}),
+            ("/api/reminders", {"cursor": forge("[1]")}),
+            ("/api/export", {"resume": f"chat_messages.{score_cursor}"}),
+            ("/api/export", {"resume": "chat_messages.not-a-cursor"}),
+        ]
+        return [(path, params, (await client.get(path, params=params, headers=headers)).status_code)
+                for path, params in requests]
+
+    for path, params, status in api(scenario):
+        assert status == 400, (path, params, status)
@@ -0,0 +1,55 @@
+"""backend/indexes.py's plan check against a real mongod: every query shape in
+ROUTE_QUERIES must be answered from an index.
+
+    TEST_MONGO_URL=mongodb://localhost:27017 python -m pytest tests/test_query_plans.py
+
+Skipped when no server answers at TEST_MONGO_URL (mongomock has no planner).
+Each run uses, and then drops, a database of its own.
+"""
+import asyncio
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import indexes  # noqa: E402
+
+MONGO_URL = os.environ.get("TEST_MONGO_URL", "mongodb://localhost:27017")
+
+
+@pytest.fixture(scope="module")
+def mongod():
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+
+    client = MongoClient(MONGO_URL, serverSelectionTimeoutMS=1000)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        pytest.skip(f"no mongod at {MONGO_URL}")
+    finally:
+        client.close()
+    return MONGO_URL
+
+
+def test_every_route_query_uses_an_index(mongod):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    async def check():
+        client = AsyncIOMotorClient(mongod)
+        db = client[f"test_plans_{uuid.uuid4().hex[:8]}"]
+        try:
+            missing = await indexes.ensure_indexes(db)
+            unindexed = await indexes.explain_route_queries(db)
+        finally:
+            await client.drop_database(db.name)
+            client.close()
+        return missing, unindexed
+
+    missing, unindexed = asyncio.run(check())
+    assert missing == {}
+    assert unindexed == []
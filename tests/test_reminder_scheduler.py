@@ -0,0 +1,158 @@
+"""backend/reminder_scheduler.py on mongomock, with a clock the tests move by hand.
+
+    python -m pytest tests/test_reminder_scheduler.py
+"""
+import asyncio
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from reminder_scheduler import ReminderScheduler, next_occurrence  # noqa: E402
+
+MONDAY_9AM = datetime(2024, 3, 4, 9, 0, tzinfo=timezone.utc)
+
+
+class Clock:
+    def __init__(self, now: datetime):
+        self.now = now
+
+    def __call__(self) -> datetime:
+        return self.now
+
+
+def reminder(reminder_id: str, repeat: str = "none", scheduled_time: datetime = MONDAY_9AM) -> dict:
+    return {
+        "id": reminder_id,
+        "user_id": "u1",
+        "reminder_type": "medication",
+        "title": reminder_id,
+        "scheduled_time": scheduled_time,
+        "repeat": repeat,
+        "completed": False,
+        "fired_at": None,
+    }
+
+
+async def setup(*reminders):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    collection = mongomock_motor.AsyncMongoMockClient(tz_aware=True)["test_reminders"].reminders
+    if reminders:
+        await collection.insert_many([dict(doc) for doc in reminders])
+    return collection
+
+
+def scheduler(collection, clock: Clock, fired: list) -> ReminderScheduler:
+    worker = ReminderScheduler(collection, clock=clock)
+
+    async def deliver(doc: dict):
+        fired.append((worker.worker_id, doc["id"], doc["scheduled_time"]))
+
+    worker.subscribe(deliver)
+    return worker
+
+
+def test_two_workers_fire_each_occurrence_once():
+    clock = Clock(MONDAY_9AM + timedelta(seconds=5))
+    fired = []
+
+    async def scenario():
+        collection = await setup(reminder("once"), reminder("daily", "daily"))
+        workers = [scheduler(collection, clock, fired) for _ in range(2)]
+        await asyncio.gather(*(worker.run_once() for worker in workers))
+        # Nothing new is due until tomorrow
+        clock.now += timedelta(hours=1)
+        await asyncio.gather(*(worker.run_once() for worker in workers))
+        stored = {doc["id"]: doc async for doc in collection.find({}, {"_id": 0})}
+        return workers, stored
+
+    workers, stored = asyncio.run(scenario())
+
+    assert sorted(reminder_id for _, reminder_id, _ in fired) == ["daily", "once"]
+    assert sum(worker.fired for worker in workers) == 2
+    assert stored["once"]["fired_at"] == MONDAY_9AM + timedelta(seconds=5)
+    assert stored["daily"]["scheduled_time"] == MONDAY_9AM + timedelta(days=1)
+    assert all("lease_owner" not in doc for doc in stored.values())
+
+
+def test_lease_of_a_crashed_worker_expires():
+    clock = Clock(MONDAY_9AM)
+    fired = []
+
+    async def scenario():
+        collection = await setup(reminder("once"))
+        # A worker claimed it at 9:00 and died before delivering
+        await collection.update_one({"id": "once"}, {"$set": {
+            "lease_owner": "crashed", "lease_until": MONDAY_9AM + timedelta(seconds=60),
+        }})
+        survivor = scheduler(collection, clock, fired)
+        clock.now = MONDAY_9AM + timedelta(seconds=30)
+        await survivor.run_once()
+        held = len(fired)
+        clock.now = MONDAY_9AM + timedelta(seconds=61)
+        await survivor.run_once()
+        return held
+
+    held = asyncio.run(scenario())
+
+    assert held == 0
+    assert [reminder_id for _, reminder_id, _ in fired] == ["once"]
+
+
+@pytest.mark.parametrize("repeat, interval", [("daily", timedelta(days=1)), ("weekly", timedelta(weeks=1))])
+def test_recurring_reminders_roll_forward(repeat, interval):
+    clock = Clock(MONDAY_9AM + timedelta(minutes=5))
+    fired = []
+
+    async def scenario():
+        collection = await setup(reminder("r", repeat))
+        worker = scheduler(collection, clock, fired)
+        times = []
+        for _ in range(3):
+            await worker.run_once()
+            doc = await collection.find_one({"id": "r"})
+            times.append(doc["scheduled_time"])
+            clock.now += interval
+        return times, doc
+
+    times, doc = asyncio.run(scenario())
+
+    assert [when for _, _, when in fired] == [MONDAY_9AM, MONDAY_9AM + interval, MONDAY_9AM + 2 * interval]
+    assert times == [MONDAY_9AM + interval, MONDAY_9AM + 2 * interval, MONDAY_9AM + 3 * interval]
+    assert doc["fired_at"] is None
+
+
+def test_occurrences_missed_by_more_than_an_hour_are_skipped():
+    # The workers were down from Monday 9:00 until Thursday 11:00
+    clock = Clock(MONDAY_9AM + timedelta(days=3, hours=2))
+    fired = []
+
+    async def scenario():
+        collection = await setup(
+            reminder("daily", "daily"),
+            reminder("once"),
+            reminder("recent", scheduled_time=clock.now - timedelta(minutes=30)),
+        )
+        worker = scheduler(collection, clock, fired)
+        await worker.run_once()
+        stored = {doc["id"]: doc async for doc in collection.find({}, {"_id": 0})}
+        return worker, stored
+
+    worker, stored = asyncio.run(scenario())
+
+    assert [reminder_id for _, reminder_id, _ in fired] == ["recent"]
+    assert (worker.fired, worker.skipped) == (1, 2)
+    # Rolled to the first occurrence after now instead of replaying Tuesday to Thursday
+    assert stored["daily"]["scheduled_time"] == MONDAY_9AM + timedelta(days=4)
+    assert stored["once"]["fired_at"] == clock.now
+
+
+def test_next_occurrence():
+    now = MONDAY_9AM + timedelta(days=2, hours=3)
+    assert next_occurrence(MONDAY_9AM, "daily", now) == MONDAY_9AM + timedelta(days=3)
+    assert next_occurrence(MONDAY_9AM, "weekly", now) == MONDAY_9AM + timedelta(weeks=1)
+    assert next_occurrence(MONDAY_9AM, "daily", MONDAY_9AM) == MONDAY_9AM + timedelta(days=1)
+    assert next_occurrence(MONDAY_9AM, "none", now) is None
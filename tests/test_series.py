@@ -0,0 +1,72 @@
+"""backend/series.py's LTTB downsampling.
+
+    python -m pytest tests/test_series.py
+"""
+import asyncio
+import math
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from series import lttb, lttb_list  # noqa: E402
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def readings(count: int) -> list:
+    return [{"t": START + timedelta(minutes=index), "avg": math.sin(index / 7) * 10 + index % 3}
+            for index in range(count)]
+
+
+def downsample(points: list, threshold: int) -> list:
+    return asyncio.run(lttb_list(points, threshold))
+
+
+@pytest.mark.parametrize("count, threshold", [(10, 3), (100, 10), (1000, 37), (1001, 500), (7, 6)])
+def test_keeps_the_ends_and_returns_threshold_points(count, threshold):
+    points = readings(count)
+    sampled = downsample(points, threshold)
+
+    assert len(sampled) == threshold
+    assert sampled[0] is points[0]
+    assert sampled[-1] is points[-1]
+    times = [point["t"] for point in sampled]
+    assert times == sorted(set(times))
+
+
+def test_keeps_a_spike():
+    points = readings(500)
+    points[250]["avg"] = 1000.0
+    assert points[250] in downsample(points, 20)
+
+
+@pytest.mark.parametrize("count", [0, 1, 2, 10, 20])
+def test_short_input_comes_back_unchanged(count):
+    points = readings(count)
+    assert downsample(points, 20) == points
+
+
+@pytest.mark.parametrize("threshold", [0, 1, 2])
+def test_threshold_below_three_returns_every_point(threshold):
+    points = readings(50)
+    assert downsample(points, threshold) == points
+
+
+def test_consumes_an_async_iterator_once():
+    points = readings(300)
+    consumed = []
+
+    async def rows():
+        for point in points:
+            consumed.append(point)
+            yield point["t"], point["avg"], point
+
+    sampled = asyncio.run(lttb(rows(), len(points), 30))
+
+    assert consumed == points
+    assert len(sampled) == 30
+    assert sampled[-1] is points[-1]
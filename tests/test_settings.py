@@ -0,0 +1,72 @@
+"""backend/settings.py: what Settings.from_env reads, and the app using it.
+
+    python -m pytest tests/test_settings.py
+"""
+import sys
+from datetime import timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import server  # noqa: E402
+import settings  # noqa: E402
+from settings import Settings  # noqa: E402
+
+REQUIRED = {
+    "MONGO_URL": "mongodb://db.example:27017",
+    "DB_NAME": "health",
+    "JWT_SECRET": "secret",
+    "EMERGENT_LLM_KEY": "key",
+}
+
+
+def from_env(monkeypatch, **env) -> Settings:
+    monkeypatch.setattr(settings, "load_dotenv", lambda path: None)  # no backend/.env in the way
+    for name in ("METRICS_TOKEN", "CHAT_CONTEXT_TOKENS", "TOKEN_CACHE_TTL", "USER_CACHE_SIZE",
+                 "SYMPTOM_CACHE_TTL_HOURS", "SYMPTOM_CACHE_MEMORY_SIZE"):
+        monkeypatch.delenv(name, raising=False)
+    for name, value in {**REQUIRED, **env}.items():
+        monkeypatch.setenv(name, value)
+    return Settings.from_env()
+
+
+def test_defaults(monkeypatch):
+    read = from_env(monkeypatch, METRICS_TOKEN="")
+
+    assert read.metrics_token is None
+    assert (read.chat_context_tokens, read.token_cache_ttl, read.user_cache_size) == (3000, 60.0, 10000)
+    assert (read.symptom_cache_ttl_hours, read.symptom_cache_memory_size) == (168.0, 1000)
+
+
+def test_tuning_variables_are_read(monkeypatch):
+    read = from_env(
+        monkeypatch,
+        METRICS_TOKEN="scrape-me",
+        CHAT_CONTEXT_TOKENS="1200",
+        TOKEN_CACHE_TTL="15",
+        USER_CACHE_SIZE="50",
+        SYMPTOM_CACHE_TTL_HOURS="2.5",
+        SYMPTOM_CACHE_MEMORY_SIZE="7",
+    )
+
+    assert read.metrics_token == "scrape-me"
+    assert (read.chat_context_tokens, read.token_cache_ttl, read.user_cache_size) == (1200, 15.0, 50)
+    assert (read.symptom_cache_ttl_hours, read.symptom_cache_memory_size) == (2.5, 7)
+
+
+def test_services_and_metrics_token_come_from_settings(api):
+    async def scenario(client, headers):
+        anonymous = await client.get("/internal/metrics")
+        wrong = await client.get("/internal/metrics", headers={"Authorization": "Bearer nope"})
+        scraped = await client.get("/internal/metrics", headers={"Authorization": "Bearer scrape-me"})
+        return anonymous, wrong, scraped
+
+    anonymous, wrong, scraped = api(
+        scenario, metrics_token="scrape-me", chat_context_tokens=1200, user_cache_ttl=30.0,
+        symptom_cache_ttl_hours=2.0, symptom_cache_memory_size=7,
+    )
+
+    assert (anonymous.status_code, wrong.status_code, scraped.status_code) == (401, 401, 200)
+    assert server.chat_context.budget == 1200
+    assert server.user_cache.ttl == 30.0
+    assert server.analysis_cache.ttl == timedelta(hours=2)
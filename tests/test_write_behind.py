@@ -0,0 +1,65 @@
+"""backend/write_behind.py's journal replay after a crash, on mongomock.
+
+    python -m pytest tests/test_write_behind.py
+
+A worker that dies before flushing leaves its journal segment behind. The
+next worker on the same directory must store every journaled document
+exactly once, including documents the dead worker had already stored, and
+bump their owners' collection versions.
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from versions import CollectionVersions  # noqa: E402
+from write_behind import WriteBehindBuffer  # noqa: E402
+
+
+def crash(buffer: WriteBehindBuffer):
+    """Stop ``buffer`` the way a killed process does: no flush, locks released."""
+    buffer._task.cancel()
+    buffer._segment.file.close()
+
+
+def test_journal_is_replayed_exactly_once_after_a_crash(tmp_path):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+
+    async def scenario():
+        db = mongomock_motor.AsyncMongoMockClient()["test_write_behind"]
+        await db.chat_messages.create_index("id", name="id_unique", unique=True)
+        versions = CollectionVersions(db.collection_versions)
+        docs = [{"id": f"m{index}", "user_id": f"u{index % 2}", "message": str(index)} for index in range(5)]
+
+        # Long interval: nothing is flushed before the crash
+        first = WriteBehindBuffer(db, tmp_path, flush_interval=60)
+        first.subscribe(versions.stored)
+        await first.start()
+        for doc in docs:
+            await first.insert("chat_messages", dict(doc))
+        # One document reached Mongo before the crash, its segment did not go away
+        await db.chat_messages.insert_one(dict(docs[0]))
+        crash(first)
+        assert await db.chat_messages.count_documents({}) == 1
+        assert len(list(tmp_path.glob("*.journal"))) == 1
+
+        second = WriteBehindBuffer(db, tmp_path, flush_interval=60)
+        second.subscribe(versions.stored)
+        await second.start()
+        assert second.replayed == 5
+        await second.close()
+
+        stored = await db.chat_messages.find({}, {"_id": 0}).sort("id", 1).to_list(None)
+        counters = {user_id: await versions.get(user_id) for user_id in ("u0", "u1")}
+        return stored, counters, second
+
+    stored, counters, second = asyncio.run(scenario())
+
+    assert [doc["id"] for doc in stored] == ["m0", "m1", "m2", "m3", "m4"]
+    assert second.dropped == 0
+    assert list(tmp_path.glob("*.journal")) == []
+    assert counters["u0"].get("chat_messages") == 1
+    assert counters["u1"].get("chat_messages") == 1